@@ -0,0 +1,102 @@
+# benchmarks/audio_bench.py
+"""Audio pipeline costs: codec time and bitrate per 20 ms frame, plus a
+simulated network run through the jitter buffer.
+
+Run from LanPToPAppPython/:  python benchmarks/audio_bench.py [--loss 0.05] [--jitter-ms 30] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import audio_pipeline  # noqa: E402
+
+RATE = 16000
+FRAME = 320
+
+
+def bench(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def codec_results(number):
+    frame = (np.sin(np.arange(FRAME) * 2 * np.pi * 440 / RATE) * 12000).astype(np.int16)
+    decoded = np.zeros(FRAME, dtype=np.int16)
+    results = []
+    for name in audio_pipeline.CODEC_NAMES:
+        codec = audio_pipeline.get_codec(name)
+        payload = np.zeros(FRAME * codec.bytes_per_sample, dtype=np.uint8)
+        codec.encode(frame, payload)
+        codec.decode(payload, decoded)
+        packet_bytes = audio_pipeline.HEADER.size + len(payload)
+        results.append({
+            "codec": name,
+            "packet_bytes": packet_bytes,
+            "kbps": round(packet_bytes * 8 * RATE / FRAME / 1000, 1),
+            "encode_us": bench(lambda: codec.encode(frame, payload), number),
+            "decode_us": bench(lambda: codec.decode(payload, decoded), number),
+            "max_error": int(np.max(np.abs(frame.astype(np.int32) - decoded))),
+        })
+    return results
+
+
+def simulate(seconds, loss, jitter_ms, seed):
+    """Feed a jittery, lossy packet schedule through the jitter buffer on a virtual clock"""
+    rng = random.Random(seed)
+    codec = audio_pipeline.get_codec("mulaw")
+    buffer = audio_pipeline.JitterBuffer(FRAME, RATE)
+    payload = np.zeros(FRAME, dtype=np.uint8)
+    out = np.zeros(FRAME, dtype=np.int16)
+    period = FRAME / RATE
+    frames = int(seconds / period)
+
+    arrivals = sorted(
+        (seq * period + rng.expovariate(1000 / jitter_ms) if jitter_ms else seq * period, seq)
+        for seq in range(frames) if rng.random() >= loss
+    )
+    index = 0
+    for tick in range(frames + audio_pipeline.MAX_DELAY_FRAMES):
+        now = tick * period
+        while index < len(arrivals) and arrivals[index][0] <= now:
+            arrival, seq = arrivals[index]
+            buffer.put(seq, seq * FRAME, payload, codec, arrival)
+            index += 1
+        buffer.pop(out)
+    return {"seconds": seconds, "loss": loss, "jitter_ms": jitter_ms, **buffer.stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--loss", type=float, default=0.05)
+    parser.add_argument("--jitter-ms", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="emit results as JSON")
+    args = parser.parse_args()
+
+    codecs = codec_results(args.number)
+    network = simulate(args.seconds, args.loss, args.jitter_ms, args.seed)
+
+    if args.json:
+        print(json.dumps({"codecs": codecs, "jitter_buffer": network}, indent=2))
+        return
+
+    print(f"{'codec':<8}{'bytes':>7}{'kbps':>8}{'enc us':>9}{'dec us':>9}{'max err':>9}")
+    for r in codecs:
+        print(f"{r['codec']:<8}{r['packet_bytes']:>7}{r['kbps']:>8}"
+              f"{r['encode_us']:>9.2f}{r['decode_us']:>9.2f}{r['max_error']:>9}")
+    print()
+    print(f"jitter buffer, {args.seconds:.0f}s at {args.loss:.0%} loss / {args.jitter_ms} ms jitter:")
+    for key, value in network.items():
+        print(f"  {key:<16}{value}")
+
+
+if __name__ == "__main__":
+    main()
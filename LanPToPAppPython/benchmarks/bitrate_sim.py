@@ -0,0 +1,161 @@
+# benchmarks/bitrate_sim.py
+"""Replay synthetic link traces through the bitrate controller.
+
+Each second of virtual time the sender transmits at the controller's
+target, a single-bottleneck link model queues, delays or drops the
+excess, and a receiver report goes back into SessionTuner, the same
+object a live call uses. Reports whether the target converges onto the
+link capacity and how often the resolution ladder switches.
+
+Run from LanPToPAppPython/:  python benchmarks/bitrate_sim.py [--trace all|NAME|file.json] [--json]
+
+A trace file is a JSON list of segments:
+    [{"seconds": 30, "capacity_kbps": 1500, "rtt_ms": 20, "loss": 0.0, "delay_jitter_ms": 0}, ...]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.bitrate import KIND_VIDEO, ReceiverReport, SessionTuner  # noqa: E402
+from services.media_manager import MediaConfig  # noqa: E402
+
+QUEUE_LIMIT_KBIT = 300     # bottleneck buffer; beyond this the link drops
+SETTLE_SECONDS = 5         # the target must stay in band this long to count as converged
+BAND = (0.6, 1.0)          # converged = target within this fraction of capacity
+
+
+def segment(seconds, capacity, rtt=20, loss=0.0, delay_jitter=0):
+    return {"seconds": seconds, "capacity_kbps": capacity, "rtt_ms": rtt,
+            "loss": loss, "delay_jitter_ms": delay_jitter}
+
+
+TRACES = {
+    "step_down_up": [segment(30, 2000), segment(30, 500), segment(30, 2000)],
+    "random_loss": [segment(30, 1500, loss=0.03), segment(30, 1500, loss=0.15), segment(30, 1500)],
+    "oscillating": [segment(15, 800), segment(15, 1600)] * 4,
+    "jittery": [segment(30, 1200, delay_jitter=10), segment(30, 1200, delay_jitter=60), segment(30, 1200)],
+    "wifi_fade": [segment(20, 3000, rtt=5), segment(20, 1200, rtt=10, loss=0.02),
+                  segment(20, 300, rtt=30, loss=0.05), segment(20, 3000, rtt=5)],
+}
+
+
+def expand(trace):
+    for index, seg in enumerate(trace):
+        for _ in range(int(seg["seconds"])):
+            yield index, seg
+
+
+def simulate(trace, seed=1, start_kbps=1000):
+    rng = random.Random(seed)
+    tuner = SessionTuner(MediaConfig(video_width=1280, video_height=720, video_fps=30, quality=80),
+                         start_kbps=start_kbps)
+    queue_kbit = 0.0
+    last_queue_ms = 0.0
+    samples = []
+    for t, (index, seg) in enumerate(expand(trace)):
+        capacity = seg["capacity_kbps"]
+        send = tuner.controller.target_kbps
+
+        # Bottleneck queue: whatever the link can't carry this second waits,
+        # and anything beyond the buffer is dropped
+        backlog = queue_kbit + send
+        delivered = min(backlog, capacity)
+        queue_kbit = backlog - delivered
+        overflow = max(0.0, queue_kbit - QUEUE_LIMIT_KBIT)
+        queue_kbit -= overflow
+        random_loss = sum(rng.random() < seg["loss"] for _ in range(100)) / 100
+        delivered *= 1 - random_loss
+        loss = min(1.0, (overflow + (backlog - overflow - queue_kbit) * random_loss) / send) if send else 0.0
+
+        queue_ms = queue_kbit / capacity * 1000
+        spike = rng.uniform(0, seg["delay_jitter_ms"])
+        jitter = abs(queue_ms - last_queue_ms) / 2 + spike / 2
+        last_queue_ms = queue_ms
+        rtt = seg["rtt_ms"] + queue_ms + spike
+
+        expected = 1000
+        report = ReceiverReport(KIND_VIDEO, round(expected * (1 - loss)), expected,
+                                int(delivered * 1000 / 8), jitter, 0, 0, 1000)
+        tuner.on_report(report, rtt, now=float(t))
+        samples.append({"t": t, "segment": index, "capacity": capacity, "target": tuner.controller.target_kbps,
+                        "delivered": delivered, "loss": loss, "rtt": rtt, "rung": tuner.rung})
+    return samples, tuner
+
+
+def summarize(name, samples, tuner):
+    # Convergence: seconds from each segment start until the target sits in band for SETTLE_SECONDS
+    changes = [0] + [i for i in range(1, len(samples)) if samples[i]["segment"] != samples[i - 1]["segment"]]
+    convergence = []
+    for n, start in enumerate(changes):
+        end = changes[n + 1] if n + 1 < len(changes) else len(samples)
+        streak, settled = 0, None
+        for s in samples[start:end]:
+            low, high = BAND[0] * s["capacity"], BAND[1] * s["capacity"]
+            streak = streak + 1 if low <= s["target"] <= high else 0
+            if streak >= SETTLE_SECONDS:
+                settled = s["t"] - start - SETTLE_SECONDS + 1
+                break
+        convergence.append(settled)
+
+    rung_moves = [b["rung"] - a["rung"] for a, b in zip(samples, samples[1:]) if b["rung"] != a["rung"]]
+    reversals = sum(1 for a, b in zip(rung_moves, rung_moves[1:]) if (a > 0) != (b > 0))
+    return {
+        "trace": name,
+        "seconds": len(samples),
+        "utilisation": round(sum(min(s["delivered"], s["capacity"]) / s["capacity"] for s in samples) / len(samples), 3),
+        "mean_loss": round(sum(s["loss"] for s in samples) / len(samples), 4),
+        "mean_rtt_ms": round(sum(s["rtt"] for s in samples) / len(samples), 1),
+        "convergence_s": convergence,
+        "converged": all(c is not None for c in convergence),
+        "ladder_switches": tuner.switches,
+        "ladder_reversals": reversals,
+        "final": tuner.stats()["config"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", default="all", help="built-in trace name, 'all', or a JSON trace file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--start-kbps", type=float, default=1000)
+    parser.add_argument("--timeline", action="store_true", help="print the per-second samples too")
+    parser.add_argument("--json", action="store_true", help="emit results as JSON")
+    args = parser.parse_args()
+
+    if args.trace == "all":
+        traces = TRACES
+    elif args.trace in TRACES:
+        traces = {args.trace: TRACES[args.trace]}
+    else:
+        with open(args.trace) as f:
+            traces = {os.path.basename(args.trace): json.load(f)}
+
+    results = []
+    for name, trace in traces.items():
+        samples, tuner = simulate(trace, args.seed, args.start_kbps)
+        result = summarize(name, samples, tuner)
+        if args.timeline:
+            result["timeline"] = samples
+        results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'trace':<14}{'util':>6}{'loss':>7}{'rtt ms':>8}{'switch':>8}{'revers':>8}  convergence (s per segment)")
+    for r in results:
+        convergence = ", ".join("-" if c is None else str(c) for c in r["convergence_s"])
+        print(f"{r['trace']:<14}{r['utilisation']:>6}{r['mean_loss']:>7}{r['mean_rtt_ms']:>8}"
+              f"{r['ladder_switches']:>8}{r['ladder_reversals']:>8}  {convergence}")
+        if args.timeline:
+            for s in r["timeline"]:
+                print(f"    t={s['t']:>3} cap={s['capacity']:>5} target={s['target']:>7.0f} "
+                      f"loss={s['loss']:.3f} rtt={s['rtt']:>6.1f} rung={s['rung']}")
+
+
+if __name__ == "__main__":
+    main()
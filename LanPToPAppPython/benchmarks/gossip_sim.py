@@ -0,0 +1,94 @@
+# benchmarks/gossip_sim.py
+"""Coverage and traffic of the chat gossip relay on a simulated lossy LAN.
+
+N in-memory nodes, each running the real GossipRelay over a full peer
+table, exchange chat messages; every datagram is lost independently with
+the given probability. Reports the fraction of (message, node) pairs
+delivered and datagrams sent per node per message, for each fanout,
+against the no-relay baseline (ttl 0).
+
+Run from LanPToPAppPython/:  python benchmarks/gossip_sim.py [--nodes 50] [--loss 0.2] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.gossip import GossipRelay  # noqa: E402
+
+
+class StaticPeers:
+    """Stands in for PeerTable: every other node, always online"""
+
+    def __init__(self, me, n):
+        self.peers = [{"id": str(i)} for i in range(n) if i != me]
+
+    def select(self, keys=None):
+        return self.peers
+
+
+def simulate(n, fanout, ttl, loss, messages, seed):
+    rng = random.Random(seed)
+    random.seed(seed)  # GossipRelay samples relay targets from the global RNG
+    wire = deque()
+    sent = [0] * n
+    nodes = []
+    for i in range(n):
+        def transmit(message, keys, i=i):
+            for key in keys:
+                sent[i] += 1
+                if rng.random() >= loss:
+                    wire.append((int(key), message, str(i)))
+        nodes.append(GossipRelay(i, f"{i:016x}", StaticPeers(i, n), transmit, fanout, ttl))
+
+    delivered = 0
+    for m in range(messages):
+        author = m % n
+        message = nodes[author].originate({"type": "chat", "message": f"m{m}"})
+        nodes[author].transmit(message, [p["id"] for p in nodes[author].peers.select()])
+        while wire:
+            node, message, via = wire.popleft()
+            if nodes[node].accept(message, via):
+                delivered += 1
+
+    return {
+        "fanout": fanout,
+        "ttl": ttl,
+        "coverage": round(delivered / (messages * (n - 1)), 4),
+        "sent_per_node_per_message": round(sum(sent) / n / messages, 2),
+        "duplicates": sum(node.counters["duplicates"] for node in nodes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=50)
+    parser.add_argument("--loss", type=float, default=0.2, help="per-datagram loss probability")
+    parser.add_argument("--fanouts", default="1,2,3,4,6,0", help="0 relays to every peer")
+    parser.add_argument("--ttl", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="emit results as JSON")
+    args = parser.parse_args()
+
+    results = [simulate(args.nodes, 0, 0, args.loss, args.messages, args.seed)]
+    results += [simulate(args.nodes, int(f), args.ttl, args.loss, args.messages, args.seed)
+                for f in args.fanouts.split(",")]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.nodes} nodes, {args.loss:.0%} datagram loss, {args.messages} messages")
+    print(f"{'fanout':>7}{'ttl':>5}{'coverage':>10}{'sent/node/msg':>15}{'duplicates':>12}")
+    for r in results:
+        fanout = "all" if r["fanout"] == 0 else r["fanout"]
+        print(f"{fanout:>7}{r['ttl']:>5}{r['coverage']:>10}{r['sent_per_node_per_message']:>15}{r['duplicates']:>12}")
+
+
+if __name__ == "__main__":
+    main()
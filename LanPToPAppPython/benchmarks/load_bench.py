@@ -0,0 +1,318 @@
+# benchmarks/load_bench.py
+"""End-to-end load and latency of a local multi-node LAN.
+
+Launches N nodes through test_launcher (without --reload), meshes them
+with /api/peer/add, then drives them with synthetic WebSocket clients and
+a synthetic UDP peer:
+
+  chat       one client per node; node 1's client sends chat at --rate and
+             every client times its arrival (same node and over UDP)
+  signaling  node 1 sends a webrtc offer, node 2's client answers at once;
+             round trip as seen by node 1's client
+  broadcast  a UDP peer floods node 1 with chat at --udp-rate while K
+             clients are attached; deliveries per second against K
+
+CPU and RSS of every node process are sampled over each phase. The
+clients run in this process, so at high client counts the harness itself
+may be the bottleneck; its own CPU is reported alongside.
+
+Run from LanPToPAppPython/:  python benchmarks/load_bench.py [--nodes 3] [--clients 1,10,50] [--json]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test_launcher import node_ports, start_test_node  # noqa: E402
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))], 3)  # noqa: E731
+    return {"count": len(samples), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99),
+            "max": round(samples[-1], 3), "mean": round(statistics.mean(samples), 3)}
+
+
+class ProcessSampler:
+    """CPU time and peak RSS of a set of pids between start() and stop()"""
+
+    def __init__(self, pids):
+        self.pids = pids
+        self.task = None
+
+    @staticmethod
+    def _read(pid):
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, int(fields[21]) * PAGE_SIZE
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.cpu = {pid: self._read(pid)[0] for pid in self.pids}
+        self.peak = {pid: self._read(pid)[1] for pid in self.pids}
+        self.task = asyncio.create_task(self._poll())
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(0.2)
+            for pid in self.pids:
+                self.peak[pid] = max(self.peak[pid], self._read(pid)[1])
+
+    def stop(self):
+        self.task.cancel()
+        elapsed = time.perf_counter() - self.started
+        return [{"pid": pid,
+                 "cpu_percent": round((self._read(pid)[0] - self.cpu[pid]) / elapsed * 100, 1),
+                 "rss_mb": round(self.peak[pid] / 2 ** 20, 1)} for pid in self.pids]
+
+
+class Client:
+    """A WebSocket client that answers pings and timestamps bench messages"""
+
+    def __init__(self, node_id):
+        self.node_id = node_id
+        self.arrivals = {}       # bench token -> perf_counter at arrival
+        self.received = 0
+        self.on_signal = None
+
+    async def connect(self):
+        self.ws = await websockets.connect(f"ws://127.0.0.1:{node_ports(self.node_id)['web']}/ws/chat",
+                                           max_queue=None)
+        self.task = asyncio.create_task(self._read())
+
+    async def _read(self):
+        async for frame in self.ws:
+            now = time.perf_counter()
+            message = json.loads(frame)
+            for m in message["messages"] if message.get("type") == "batch" else [message]:
+                self._handle(m, now)
+
+    def _handle(self, m, now):
+        kind = m.get("type")
+        if kind == "ping":
+            asyncio.create_task(self.ws.send(json.dumps({"type": "pong", "t": m.get("t")})))
+        elif kind in ("chat", "udp_message") and str(m.get("message", "")).startswith("bench:"):
+            self.received += 1
+            self.arrivals.setdefault(m["message"], now)
+        elif kind == "webrtc_signal" and self.on_signal:
+            self.on_signal(m["signal"], now)
+
+    async def send(self, message):
+        await self.ws.send(json.dumps(message))
+
+    async def close(self):
+        await self.ws.close()
+        self.task.cancel()
+
+
+async def wait_ready(client, node_ids, timeout=30):
+    deadline = time.monotonic() + timeout
+    for node_id in node_ids:
+        while True:
+            try:
+                await client.get(f"http://127.0.0.1:{node_ports(node_id)['web']}/api/status")
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Node {node_id} did not start")
+                await asyncio.sleep(0.2)
+
+
+async def mesh(client, node_ids):
+    for a in node_ids:
+        for b in node_ids:
+            if a != b:
+                ports = node_ports(b)
+                await client.post(f"http://127.0.0.1:{node_ports(a)['web']}/api/peer/add",
+                                  data={"peer_ip": "127.0.0.1", "peer_port": ports["web"],
+                                        "peer_udp_port": ports["udp"]})
+
+
+async def chat_phase(node_ids, rate, seconds):
+    clients = [Client(n) for n in node_ids]
+    for c in clients:
+        await c.connect()
+    await asyncio.sleep(0.5)
+    sent = {}
+    interval = 1 / rate
+    deadline = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        token = f"bench:chat:{i}"
+        sent[token] = time.perf_counter()
+        await clients[0].send({"type": "chat", "message": token})
+        deadline += interval
+        await asyncio.sleep(max(0.0, deadline - time.perf_counter()))
+    await asyncio.sleep(1.0)
+    for c in clients:
+        await c.close()
+
+    local = [(c.arrivals[t] - sent[t]) * 1000 for c in clients[:1] for t in sent if t in c.arrivals]
+    remote = [(c.arrivals[t] - sent[t]) * 1000 for c in clients[1:] for t in sent if t in c.arrivals]
+    return {"sent": len(sent), "rate": rate,
+            "local_ms": percentiles(local),
+            "remote_ms": percentiles(remote),
+            "remote_delivery": round(len(remote) / (len(sent) * (len(clients) - 1)), 4) if len(clients) > 1 else None}
+
+
+async def signaling_phase(rounds):
+    caller, callee = Client(1), Client(2)
+    await caller.connect()
+    await callee.connect()
+    await asyncio.sleep(0.5)
+    answered = {}
+
+    def answer(signal, now):
+        if signal.get("type") == "offer":
+            asyncio.create_task(callee.send({"type": "webrtc_signal",
+                                             "signal": {"type": "answer", "id": signal.get("id")}}))
+
+    def got_answer(signal, now):
+        if signal.get("type") == "answer" and signal.get("id") is not None:
+            answered.setdefault(signal["id"], now)
+
+    callee.on_signal, caller.on_signal = answer, got_answer
+    rtts = []
+    for i in range(rounds):
+        started = time.perf_counter()
+        await caller.send({"type": "webrtc_signal", "signal": {"type": "offer", "id": i, "sdp": "v=0"}})
+        while i not in answered and time.perf_counter() - started < 2:
+            await asyncio.sleep(0.001)
+        if i in answered:
+            rtts.append((answered[i] - started) * 1000)
+        await asyncio.sleep(0.02)
+    await caller.close()
+    await callee.close()
+    return {"rounds": rounds, "rtt_ms": percentiles(rtts)}
+
+
+async def broadcast_phase(n_clients, udp_rate, seconds):
+    clients = [Client(1) for _ in range(n_clients)]
+    await asyncio.gather(*(c.connect() for c in clients))
+    await asyncio.sleep(0.5)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    target = ("127.0.0.1", node_ports(1)["udp"])
+    origin = uuid.uuid4().hex
+    total = int(udp_rate * seconds)
+    started = time.perf_counter()
+    deadline = started
+    for i in range(total):
+        # "origin" keeps the node from mistaking a loopback datagram for its own echo
+        sock.sendto(json.dumps({"type": "chat", "message": f"bench:udp:{i}", "from_node": 99,
+                                "udp_port": sock.getsockname()[1], "origin": origin}).encode(), target)
+        if i % 20 == 19:
+            deadline += 20 / udp_rate
+            await asyncio.sleep(max(0.0, deadline - time.perf_counter()))
+    await asyncio.sleep(1.0)
+    elapsed = time.perf_counter() - started
+    sock.close()
+    received = [c.received for c in clients]
+    for c in clients:
+        await c.close()
+    return {"clients": n_clients, "udp_sent": total, "udp_rate": udp_rate,
+            "delivered_per_client": round(statistics.mean(received) / total, 4),
+            "deliveries_per_s": round(sum(received) / elapsed)}
+
+
+async def measured(pids, coroutine):
+    sampler = ProcessSampler(pids + [os.getpid()])
+    sampler.start()
+    result = await coroutine
+    usage = sampler.stop()
+    result["nodes"], result["harness"] = usage[:-1], usage[-1]
+    return result
+
+
+async def run(args, procs):
+    node_ids = list(range(1, args.nodes + 1))
+    pids = [p.pid for p in procs]
+    async with httpx.AsyncClient(timeout=5) as client:
+        await wait_ready(client, node_ids)
+        await mesh(client, node_ids)
+    await asyncio.sleep(1.0)
+
+    idle = ProcessSampler(pids)
+    idle.start()
+    await asyncio.sleep(1.0)
+    results = {"nodes": args.nodes, "idle": idle.stop()}
+    results["chat"] = await measured(pids, chat_phase(node_ids, args.rate, args.seconds))
+    if args.nodes > 1:
+        results["signaling"] = await measured(pids, signaling_phase(args.rounds))
+    results["broadcast"] = [await measured(pids, broadcast_phase(int(k), args.udp_rate, args.seconds))
+                            for k in args.clients.split(",")]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=50, help="chat messages per second in the chat phase")
+    parser.add_argument("--rounds", type=int, default=50, help="signaling round trips")
+    parser.add_argument("--clients", default="1,10,50", help="comma-separated client counts for the broadcast phase")
+    parser.add_argument("--udp-rate", type=float, default=500, help="UDP chat datagrams per second in the broadcast phase")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--logs", help="directory for node logs (default: discarded)")
+    parser.add_argument("--json", action="store_true", help="emit results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="metal52-bench-")
+    procs = []
+    try:
+        for node_id in range(1, args.nodes + 1):
+            out = open(os.path.join(args.logs, f"node{node_id}.log"), "w") if args.logs else subprocess.DEVNULL
+            with contextlib.redirect_stdout(sys.stderr):  # keep --json output clean
+                procs.append(start_test_node(node_id, reload=False, stdout=out, stderr=subprocess.STDOUT, extra_env={
+                    "HISTORY_DIR": os.path.join(workdir, f"history-{node_id}"),
+                    "FILES_DIR": os.path.join(workdir, f"files-{node_id}"),
+                    # Keep the per-client rate limiter out of the measured fan-out
+                    "WS_RATE": str(max(20, args.rate * 2)),
+                    "WS_BURST": str(max(40, args.rate * 2)),
+                }))
+        results = asyncio.run(run(args, procs))
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    chat = results["chat"]
+    print(f"{args.nodes} nodes")
+    for name in ("local_ms", "remote_ms"):
+        p = chat[name]
+        if p:
+            print(f"chat {name[:-3]:<7} p50 {p['p50']:>7} ms  p95 {p['p95']:>7} ms  p99 {p['p99']:>7} ms  (n={p['count']})")
+    if "signaling" in results and results["signaling"]["rtt_ms"]:
+        p = results["signaling"]["rtt_ms"]
+        print(f"signaling rtt p50 {p['p50']:>7} ms  p95 {p['p95']:>7} ms  p99 {p['p99']:>7} ms  (n={p['count']})")
+    print(f"{'clients':>8}{'deliveries/s':>14}{'delivered':>11}{'node1 cpu%':>12}{'node1 MB':>10}{'harness cpu%':>14}")
+    for r in results["broadcast"]:
+        print(f"{r['clients']:>8}{r['deliveries_per_s']:>14}{r['delivered_per_client']:>11}"
+              f"{r['nodes'][0]['cpu_percent']:>12}{r['nodes'][0]['rss_mb']:>10}{r['harness']['cpu_percent']:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# benchmarks/relay_bench.py
+"""CPU cost and latency of the media relay as a call grows.
+
+Runs a real MediaRelay on loopback with N synthetic participants. Each one
+sends a quiet 20 ms mu-law tone through its own socket and receives on
+another, like a node in a relayed call; participant 0 periodically sends
+a loud frame instead, and the others time how long it takes to reach them
+(through the jitter buffer and mix tick in mix mode). Relay CPU is the
+time spent inside its handlers per second of call.
+
+Run from LanPToPAppPython/:  python benchmarks/relay_bench.py [--participants 3,4,8] [--seconds 5] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.audio_pipeline import HEADER, MAGIC, VERSION, get_codec, parse_packet  # noqa: E402
+from services.media_envelope import is_relayed, unwrap, wrap_header  # noqa: E402
+from services.media_relay import MediaRelay  # noqa: E402
+from services.udp_transport import open_udp_endpoint  # noqa: E402
+
+FRAME = 320
+RATE = 16000
+IMPULSE_EVERY = 25          # frames between loud frames from participant 0
+LOUD = 20000
+THRESHOLD = 10000           # N quiet tones stay well below this even when mixed
+
+
+class Participant:
+    def __init__(self, pid, relay_port, recv_port, codec):
+        self.pid = pid
+        self.relay = ("127.0.0.1", relay_port)
+        self.recv_port = recv_port
+        self.codec = codec
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.seq = 0
+        t = np.arange(FRAME) / RATE
+        self.quiet = (200 * np.sin(2 * np.pi * (200 + 50 * pid) * t)).astype(np.int16)
+        self.loud = np.full(FRAME, LOUD, dtype=np.int16)
+        self.payload = np.zeros(FRAME * codec.bytes_per_sample, dtype=np.uint8)
+        self.received = 0
+        self.heard = {}         # impulse number -> arrival time
+        self.transport = None
+
+    def send(self, loud=False):
+        self.codec.encode(self.loud if loud else self.quiet, self.payload)
+        header = HEADER.pack(MAGIC, VERSION, self.codec.codec_id, self.seq, self.seq * FRAME, FRAME)
+        self.sock.sendto(wrap_header(self.pid) + header + self.payload.tobytes(), self.relay)
+        self.seq += 1
+
+    def on_batch(self, batch):
+        now = time.perf_counter()
+        for data, _ in batch:
+            if is_relayed(data):
+                data = unwrap(data)[1]
+            packet = parse_packet(data)
+            if packet is None:
+                continue
+            self.received += 1
+            codec, seq, _, samples, payload = packet
+            frame = np.zeros(samples, dtype=np.int16)
+            codec.decode(payload, frame)
+            # Mixed packets don't carry the impulse's seq, so number loud bursts in
+            # arrival order; concealment may repeat a loud frame, hence the debounce
+            if frame.max() > THRESHOLD and (not self.heard or now - max(self.heard.values()) > 0.2):
+                self.heard[len(self.heard)] = now
+
+
+async def run(n, mode, seconds, base_port):
+    codec = get_codec("mulaw")
+    relay = MediaRelay(base_port, base_port + 1, mode, FRAME, RATE)
+    await relay.start()
+    participants = []
+    for pid in range(n):
+        p = Participant(pid, base_port, base_port + 10 + pid, codec)
+        p.transport, _ = await open_udp_endpoint(p.recv_port, p.on_batch, "127.0.0.1")
+        relay.join(pid, "127.0.0.1", p.recv_port)
+        participants.append(p)
+
+    sent_at = []
+    interval = FRAME / RATE
+    frames = int(seconds / interval)
+    cpu_start = time.process_time()
+    started = time.perf_counter()
+    deadline = time.monotonic()
+    for frame in range(frames):
+        impulse = frame % IMPULSE_EVERY == IMPULSE_EVERY - 1
+        for p in participants:
+            p.send(loud=impulse and p.pid == 0)
+        if impulse:
+            sent_at.append(time.perf_counter())
+        deadline += interval
+        await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+    await asyncio.sleep(0.3)
+    elapsed = time.perf_counter() - started
+    process_cpu = time.process_time() - cpu_start
+
+    latencies = []
+    for p in participants[1:]:
+        for impulse, arrived in p.heard.items():
+            if impulse < len(sent_at):
+                latencies.append((arrived - sent_at[impulse]) * 1000)
+    stats = relay.stats()
+    relay.stop()
+    for p in participants:
+        p.transport.close()
+        p.sock.close()
+
+    latencies.sort()
+    return {
+        "participants": n,
+        "mode": mode,
+        "relay_cpu_percent": round(relay.busy / elapsed * 100, 2),
+        "process_cpu_percent": round(process_cpu / elapsed * 100, 2),
+        "relay_us_per_frame": round(relay.busy / frames * 1e6, 1),
+        "packets_out_per_s": round((stats["forwarded"] + stats["mixed_frames"] * n) / elapsed),
+        "rx_packets_per_participant_s": round(statistics.mean(p.received for p in participants) / elapsed),
+        "latency_ms_median": round(statistics.median(latencies), 2) if latencies else None,
+        "latency_ms_p95": round(latencies[int(len(latencies) * 0.95) - 1], 2) if latencies else None,
+        "impulses_heard": f"{len(latencies)}/{len(sent_at) * (n - 1)}",
+        "clipped_mixes": stats["clipped_mixes"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", default="3,4,6,8,12,16", help="comma-separated call sizes")
+    parser.add_argument("--modes", default="forward,mix")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=7400, help="first of a block of loopback ports")
+    parser.add_argument("--json", action="store_true", help="emit results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for n in [int(x) for x in args.participants.split(",")]:
+        for mode in args.modes.split(","):
+            results.append(asyncio.run(run(n, mode, args.seconds, args.port)))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'N':>3} {'mode':<8}{'relay cpu%':>11}{'us/frame':>10}{'pkts out/s':>11}{'rx/s each':>10}"
+          f"{'lat med ms':>11}{'lat p95':>9}  heard")
+    for r in results:
+        print(f"{r['participants']:>3} {r['mode']:<8}{r['relay_cpu_percent']:>11}{r['relay_us_per_frame']:>10}"
+              f"{r['packets_out_per_s']:>11}{r['rx_packets_per_participant_s']:>10}"
+              f"{str(r['latency_ms_median']):>11}{str(r['latency_ms_p95']):>9}  {r['impulses_heard']}")
+
+
+if __name__ == "__main__":
+    main()
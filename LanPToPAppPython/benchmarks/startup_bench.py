@@ -0,0 +1,151 @@
+# benchmarks/startup_bench.py
+"""Cold start and time to first byte of a node, as test_launcher restarts it.
+
+  import     `import main` in a fresh interpreter
+  start      spawn through test_launcher until GET / first answers 200
+  index      GET / right after start, then warm, then revalidated (304)
+  static     app.js as sent: identity vs compressed bytes, cache headers
+
+Run from LanPToPAppPython/:  python benchmarks/startup_bench.py [--runs 5] [--reload] [--json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_bench import percentiles  # noqa: E402
+from test_launcher import node_ports, start_test_node  # noqa: E402
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NODE_ID = 1
+IMPORT_PROBE = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def node_env(workdir):
+    return {
+        "HISTORY_DIR": os.path.join(workdir, "history"),
+        "FILES_DIR": os.path.join(workdir, "files"),
+        "IPC_SOCKET": os.path.join(workdir, "ipc.sock"),
+        "LOG_LEVEL": "warning",
+    }
+
+
+def import_ms(workdir):
+    env = {**os.environ, **node_env(workdir)}
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=APP_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1]) * 1000
+
+
+def timed_get(client, url, **kwargs):
+    started = time.perf_counter()
+    response = client.get(url, **kwargs)
+    return (time.perf_counter() - started) * 1000, response
+
+
+def start_run(args, workdir):
+    base = f"http://127.0.0.1:{node_ports(NODE_ID)['web']}"
+    with contextlib.redirect_stdout(sys.stderr):  # keep --json output clean
+        started = time.perf_counter()
+        proc = start_test_node(NODE_ID, reload=args.reload, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.STDOUT, extra_env=node_env(workdir))
+    try:
+        with httpx.Client(timeout=5) as client:
+            deadline = started + 30
+            while True:
+                try:
+                    first_ms, response = timed_get(client, base + "/")
+                    if response.status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.perf_counter() > deadline:
+                    raise RuntimeError("node did not start")
+                time.sleep(0.005)
+            ready_ms = (time.perf_counter() - started) * 1000
+            warm = [timed_get(client, base + "/")[0] for _ in range(args.requests)]
+            etag = response.headers.get("etag")
+            revalidated = [timed_get(client, base + "/", headers={"If-None-Match": etag})
+                           for _ in range(args.requests)] if etag else []
+            plain = client.get(base + "/", headers={"Accept-Encoding": "identity"})
+            # The versioned URL the page links to, as a browser would request it
+            match = re.search(r'/static/app\.js[^"]*', plain.text)
+            static_url = base + (match.group(0) if match else "/static/app.js")
+            static = client.get(static_url)
+            static_plain = client.get(static_url, headers={"Accept-Encoding": "identity"})
+            return {
+                "ready_ms": ready_ms,
+                "first_index_ms": first_ms,
+                "warm_index_ms": warm,
+                "revalidated_ms": [ms for ms, _ in revalidated],
+                "revalidated_status": revalidated[0][1].status_code if revalidated else None,
+                "index_bytes": {"identity": plain.num_bytes_downloaded,
+                                "encoded": response.num_bytes_downloaded,
+                                "encoding": response.headers.get("content-encoding")},
+                "static_bytes": {"identity": static_plain.num_bytes_downloaded,
+                                 "encoded": static.num_bytes_downloaded,
+                                 "encoding": static.headers.get("content-encoding")},
+                "static_cache_control": static.headers.get("cache-control"),
+            }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=100, help="warm requests per run")
+    parser.add_argument("--reload", action="store_true", help="start nodes with --reload, like test_launcher's default")
+    parser.add_argument("--json", action="store_true", help="emit results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="metal52-bench-")
+    try:
+        imports = [import_ms(workdir) for _ in range(args.runs)]
+        runs = [start_run(args, workdir) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    last = runs[-1]
+    results = {
+        "reload": args.reload,
+        "import_ms": percentiles(imports),
+        "ready_ms": percentiles([r["ready_ms"] for r in runs]),
+        "first_index_ms": percentiles([r["first_index_ms"] for r in runs]),
+        "warm_index_ms": percentiles([ms for r in runs for ms in r["warm_index_ms"]]),
+        "revalidated_ms": percentiles([ms for r in runs for ms in r["revalidated_ms"]]),
+        "revalidated_status": last["revalidated_status"],
+        "index_bytes": last["index_bytes"],
+        "static_bytes": last["static_bytes"],
+        "static_cache_control": last["static_cache_control"],
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.runs} runs{' with --reload' if args.reload else ''}")
+    for name in ("import_ms", "ready_ms", "first_index_ms", "warm_index_ms", "revalidated_ms"):
+        p = results[name]
+        if not p:
+            continue
+        print(f"{name[:-3]:<16} p50 {p['p50']:>8} ms  max {p['max']:>8} ms  (n={p['count']})")
+    for name in ("index_bytes", "static_bytes"):
+        b = results[name]
+        print(f"{name[:-6]:<16} {b['identity']} B identity, {b['encoded']} B {b['encoding'] or 'unencoded'}")
+    print(f"revalidation status {results['revalidated_status']}, static cache-control: {results['static_cache_control']}")
+
+
+if __name__ == "__main__":
+    main()
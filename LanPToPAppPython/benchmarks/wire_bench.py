@@ -0,0 +1,96 @@
+# benchmarks/wire_bench.py
+"""Compare the JSON signaling path against the binary wire format.
+
+Run from LanPToPAppPython/:  python benchmarks/wire_bench.py [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import wire  # noqa: E402
+
+ORIGIN = uuid.uuid4().hex[:16]
+
+SDP = "\r\n".join(
+    ["v=0", "o=- 4611731400430051336 2 IN IP4 127.0.0.1", "s=-", "t=0 0",
+     "a=group:BUNDLE 0 1", "a=msid-semantic: WMS stream"]
+    + [f"a=candidate:{i} 1 udp 2122260223 192.168.1.{i} 5{i:04d} typ host generation 0" for i in range(12)]
+    + [f"a=rtpmap:{96 + i} opus/48000/2" for i in range(20)]
+    + ["a=fingerprint:sha-256 " + ":".join(["AB"] * 32)] * 2
+)
+
+
+def base(msg_type, **fields):
+    return {
+        "type": msg_type,
+        **fields,
+        "from_node": 1,
+        "origin": ORIGIN,
+        "udp_port": 9002,
+        "web_port": 8001,
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
+SAMPLES = {
+    "heartbeat": base("heartbeat", caps=[wire.CAPABILITY]),
+    "chat": base("chat", message="Hello from node 1, are you receiving this?"),
+    "ice-candidate": base("webrtc_signal", signal={
+        "type": "ice-candidate",
+        "candidate": {
+            "candidate": "candidate:842163049 1 udp 1677729535 203.0.113.7 46154 typ srflx raddr 0.0.0.0 rport 0 generation 0",
+            "sdpMid": "0", "sdpMLineIndex": 0,
+        },
+        "from": "peer-1",
+    }),
+    "offer": base("webrtc_signal", signal={
+        "type": "offer", "offer": {"type": "offer", "sdp": SDP}, "from": "peer-1", "to": "peer-2",
+    }),
+}
+
+
+def bench(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--json", action="store_true", help="emit results as JSON")
+    args = parser.parse_args()
+
+    codec = wire.WireCodec(1, ORIGIN, 9002, 8001)
+    results = []
+    for name, message in SAMPLES.items():
+        number = args.number if name != "offer" else args.number // 10
+        json_bytes = json.dumps(message).encode("utf-8")
+        bin_bytes = codec.encode(message)
+        results.append({
+            "message": name,
+            "json_bytes": len(json_bytes),
+            "binary_bytes": len(bin_bytes),
+            "json_encode_us": bench(lambda: json.dumps(message).encode("utf-8"), number),
+            "binary_encode_us": bench(lambda: codec.encode(message), number),
+            "json_decode_us": bench(lambda: json.loads(json_bytes.decode("utf-8")), number),
+            "binary_decode_us": bench(lambda: wire.decode(bin_bytes), number),
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'message':<14}{'json B':>8}{'bin B':>8}{'json enc':>10}{'bin enc':>10}{'json dec':>10}{'bin dec':>10}  (us)")
+    for r in results:
+        print(f"{r['message']:<14}{r['json_bytes']:>8}{r['binary_bytes']:>8}"
+              f"{r['json_encode_us']:>10.2f}{r['binary_encode_us']:>10.2f}"
+              f"{r['json_decode_us']:>10.2f}{r['binary_decode_us']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
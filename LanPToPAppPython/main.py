@@ -2,205 +2,495 @@
 import os
 import json
 import asyncio
-import socket
+import tempfile
 import threading
-import base64
-import hashlib
+import time
 from datetime import datetime
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Query, Form
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Query, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from contextlib import asynccontextmanager
-from typing import Dict, Set
+from typing import Dict, List, Optional
 import uuid
 
+from routers import files, history, media, tcp, udp
+from services import ipc_bus, metrics, secure, socket_tuning, tcp_helper, websocket_manager
+from services.chat_history import ChatHistory
+from services.config import AppConfig
+from services.discovery import DISCOVERY_PORT, MULTICAST_GROUP, Discovery
+from services.fanout import TokenBucket
+from services.file_transfer import FileStore
+from services.fragments import FRAGMENT_MTU, Fragmenter, Reassembler
+from services.fragments import CAPABILITY as FRAGMENT_CAPABILITY
+from services.media_manager import MediaConfig, MediaManager
+from services.gossip import DEFAULT_FANOUT, DEFAULT_TTL, GossipRelay
+from services.log import get_logger
+from services.netinfo import get_local_addresses
+from services.peers import HEARTBEAT_INTERVAL, STALE_AFTER, PeerTable
+from services.reliable import CAPABILITY as RELIABLE_CAPABILITY
+from services.reliable import CallSetupTracker, ReliabilityLayer
+from services.static_assets import Encoded, StaticAssets
+from services.transport import Packet, Transport, dropped_messages
+from services.wire import CAPABILITY, WireCodec, supports_binary
+
 # Configuration
 NODE_ID = int(os.getenv('NODE_ID', '0'))
 WEB_PORT = int(os.getenv('WEB_PORT', '8000'))
 UDP_PORT = int(os.getenv('UDP_PORT', '9001'))
 AUDIO_PORT = int(os.getenv('AUDIO_PORT', '5060'))
 VIDEO_PORT = int(os.getenv('VIDEO_PORT', '5056'))
+# Where this node listens when it relays a 3+ node call
+RELAY_AUDIO_PORT = int(os.getenv('RELAY_AUDIO_PORT', str(MediaConfig.relay_audio_port)))
+RELAY_VIDEO_PORT = int(os.getenv('RELAY_VIDEO_PORT', str(MediaConfig.relay_video_port)))
+TCP_PORT = int(os.getenv('TCP_PORT', str(tcp_helper.TCP_PORT)))
+FILES_DIR = os.getenv('FILES_DIR', os.path.join('uploads', f'node-{NODE_ID}'))
+HISTORY_DIR = os.getenv('HISTORY_DIR', os.path.join('history', f'node-{NODE_ID}'))
+# Most messages sent to a (re)connecting client; older ones are paged via /api/history
+REPLAY_LIMIT = 500
+# Inbound WebSocket frames per second per client (sustained, burst); a client
+# that keeps going after WS_MAX_LIMITED dropped frames in a row is closed
+WS_RATE = float(os.getenv('WS_RATE', '20'))
+WS_BURST = float(os.getenv('WS_BURST', '40'))
+WS_MAX_LIMITED = 200
+# With uvicorn --workers N, the worker holding this socket's lock owns the UDP/TCP
+# sockets and node state; the others serve WebSockets and reach it over the bus
+IPC_SOCKET = os.getenv('IPC_SOCKET', os.path.join(tempfile.gettempdir(), f'metal52-{UDP_PORT}.sock'))
+# Chat relay: peers each node forwards a new message to (0 = all), and max hops
+GOSSIP_FANOUT = int(os.getenv('GOSSIP_FANOUT', str(DEFAULT_FANOUT)))
+GOSSIP_TTL = int(os.getenv('GOSSIP_TTL', str(DEFAULT_TTL)))
+# "binary" speaks the compact framing to peers that advertise it; "json" never does
+WIRE_FORMAT = os.getenv('WIRE_FORMAT', 'binary')
+# Peer encryption (needs the cryptography package): "prefer" seals traffic to
+# peers that advertise it, "require" also refuses plaintext other than
+# heartbeats, "off" never seals. Nodes sharing SECURE_PSK authenticate each
+# other; without it sealing only keeps passive listeners out.
+SECURE_MODE = os.getenv('SECURE_MODE', 'prefer')
+SECURE_PSK = os.getenv('SECURE_PSK', '')
+
+# Unique per process; carried in every outbound message for self-echo filtering
+NODE_INSTANCE = uuid.uuid4().hex[:16]
+
+# Multicast discovery; every node on the LAN must use the same group and port
+DISCOVERY_GROUP = os.getenv('DISCOVERY_GROUP', MULTICAST_GROUP)
+DISCOVERY_PORT = int(os.getenv('DISCOVERY_PORT', str(DISCOVERY_PORT)))
+
+# Socket tuning profiles (buffers, DSCP, priority, busy-poll) and overrides
+CONFIG_FILE = os.getenv('CONFIG_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json'))
+
+# Legacy loopback port range, only used to bootstrap discovery via heartbeats
+# when multicast is unavailable
+BOOTSTRAP_UDP_PORTS = [9001, 9002, 9003, 9004, 9005]
 
 # Global state
-active_connections: Dict[str, WebSocket] = {}
+app_config = AppConfig.load(CONFIG_FILE, create=False)
+socket_tuning.profiles = app_config.profiles()
+socket_tuning.enabled = app_config.socket_tuning
+ws_hub = websocket_manager.hub
+active_connections: Dict[str, WebSocket] = ws_hub.connections
 peer_nodes: Dict[str, Dict] = {}
-udp_server_running = False
-main_event_loop = None
+peer_table = PeerTable(peer_nodes)
+call_peer: Optional[str] = None  # peer key of the remote party in the current call
+wire_codec = WireCodec(NODE_ID, NODE_INSTANCE, UDP_PORT, WEB_PORT)
+node_caps = ([CAPABILITY] if WIRE_FORMAT == "binary" else []) + [FRAGMENT_CAPABILITY, RELIABLE_CAPABILITY]
+if SECURE_MODE == "require" and not secure.AVAILABLE:
+    raise RuntimeError("SECURE_MODE=require needs the cryptography package")
+keyring = secure.KeyRing(SECURE_PSK.encode()) if secure.AVAILABLE and SECURE_MODE != "off" else None
+secure.keyring = keyring
+secure.required = SECURE_MODE == "require"
+if keyring:
+    node_caps.append(secure.CAPABILITY)
+call_setup = CallSetupTracker()
+media.manager = MediaManager(MediaConfig(audio_port=AUDIO_PORT, video_port=VIDEO_PORT,
+                                         relay_audio_port=RELAY_AUDIO_PORT,
+                                         relay_video_port=RELAY_VIDEO_PORT), keyring)
+media.peers = peer_table
 message_fragments: Dict[str, Dict] = {}
+fragmenter = Fragmenter(NODE_INSTANCE)
+reassembler = Reassembler(buffers=message_fragments)
+local_addresses = get_local_addresses()
+
+log = get_logger("METAL-52")
+udp_log = get_logger("UDP")
+ws_log = get_logger("WS")
+
+udp_messages_out = metrics.counter("metal52_udp_messages_sent_total", "Messages sent to peers, by type", ["type"])
+dropped_ws_rate_limited = dropped_messages.labels("ws_rate_limited")
+dropped_plaintext = dropped_messages.labels("plaintext")
 
 def get_local_ip():
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-            s.connect(("8.8.8.8", 80))
-            return s.getsockname()[0]
-    except Exception:
-        return "127.0.0.1"
-
-async def broadcast_to_websockets(message: Dict):
-    if not active_connections:
-        return
-        
-    disconnected = []
-    for conn_id, websocket in active_connections.items():
-        try:
-            await websocket.send_text(json.dumps(message))
-        except Exception as e:
-            print(f"[WS] Failed to send to {conn_id}: {e}")
-            disconnected.append(conn_id)
+    return local_addresses.primary_ip
+
+def is_self_echo(parsed, addr) -> bool:
+    # Prefer the per-process origin tag so loopback multi-node setups work;
+    # untagged (legacy) datagrams fall back to the cached interface set.
+    if isinstance(parsed, dict) and "origin" in parsed:
+        return parsed["origin"] == NODE_INSTANCE
+    return local_addresses.is_local(addr[0])
+
+def admit_packet(packet: Packet) -> bool:
+    """Transport filter: drops echoes and plaintext, and records the sender"""
+    parsed, addr = packet.message, packet.addr
+    if is_self_echo(parsed, addr):
+        return False
+    
+    if not packet.sealed and SECURE_MODE == "require" and not (parsed and parsed.get("type") == "heartbeat"):
+        dropped_plaintext.inc()
+        return False
     
-    for conn_id in disconnected:
-        del active_connections[conn_id]
+    if parsed is None:
+        return True
+    peer = None
+    if isinstance(parsed.get("udp_port"), int):
+        peer, came_online = peer_table.observe(
+            addr[0], parsed["udp_port"], parsed.get("web_port"),
+            parsed.get("from_node"), parsed.get("caps"), origin=parsed.get("origin")
+        )
+        if came_online:
+            peer_came_online(peer)
+        learn_key(peer, parsed.get("pk"), packet.sealed)
+        if packet.sealed and parsed.get("echo"):
+            send_to_peers(heartbeat(), [peer])  # prove our new key to a peer that pinned the old one
+    packet.peer = peer
+    if "gossip" in parsed and not gossip.accept(parsed, peer["id"] if peer else None):
+        return False  # already seen, possibly via another relay
+    if peer and "rel" in parsed and parsed.get("type") != "ack":
+        # Delivered in order through deliver_reliable()
+        reliable.receive(peer["id"], parsed)
+        return False
+    return True
 
-def thread_safe_broadcast(message_dict: Dict):
-    global main_event_loop
-    if main_event_loop and not main_event_loop.is_closed():
-        try:
-            future = asyncio.run_coroutine_threadsafe(
-                broadcast_to_websockets(message_dict), 
-                main_event_loop
-            )
-            return True
-        except Exception as e:
-            print(f"[UDP] Thread-safe broadcast failed: {e}")
-            return False
-    return False
+def handle_text_datagram(packet: Packet) -> Optional[Dict]:
+    addr, raw_message = packet.addr, packet.text
+    if packet.message is None and raw_message.startswith("CALL_REQUEST:"):
+        # Legacy format handling
+        parts = raw_message.split(":")
+        if len(parts) < 3:
+            return None
+        return {
+            "type": "call_request",
+            "call_type": parts[2],
+            "caller": parts[1],
+            "caller_ip": addr[0],
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    # Regular message
+    return {
+        "type": "udp_message",
+        "message": raw_message,
+        "sender": f"Network@{addr[0]}",
+        "timestamp": datetime.now().isoformat()
+    }
 
-def start_udp_listener():
-    global udp_server_running
-    udp_server_running = True
+def remember_call_peer(peer: Optional[Dict]):
+    global call_peer
+    if peer:
+        # Replies for this call go back to this node only
+        call_peer = peer["id"]
+
+def handle_webrtc_signal(parsed: Dict, addr, peer: Optional[Dict]) -> Dict:
+    remember_call_peer(peer)
+    signal = parsed.get("signal", {})
+    signal_type = signal.get("type", "unknown")
+    from_node = parsed.get("from_node", "unknown")
     
-    def udp_listener():
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.settimeout(1.0)
-        
-        try:
-            sock.bind(("0.0.0.0", UDP_PORT))
-            print(f"[UDP] Node {NODE_ID} listening on port {UDP_PORT}")
-            
-            while udp_server_running:
-                try:
-                    data, addr = sock.recvfrom(4096)  # Increased buffer for WebRTC messages
-                    raw_message = data.decode('utf-8')
-                    
-                    if addr[0] == get_local_ip():
-                        continue
-                    
-                    try:
-                        parsed = json.loads(raw_message)
-                        
-                        if parsed.get("type") == "webrtc_signal":
-                            signal = parsed.get("signal", {})
-                            signal_type = signal.get("type", "unknown")
-                            from_node = parsed.get("from_node", "unknown")
-                            
-                            print(f"[UDP] WebRTC signal received: {signal_type} from Node {from_node}")
-                            
-                            # CRITICAL: Forward to WebSocket clients immediately
-                            thread_safe_broadcast({
-                                "type": "webrtc_signal",
-                                "signal": signal,
-                                "from_node": from_node,
-                                "sender_ip": addr[0],
-                                "timestamp": datetime.now().isoformat()
-                            })
-                            
-                        elif parsed.get("type") == "call_request":
-                            call_type = parsed.get("call_type", "audio")
-                            caller = parsed.get("caller", "unknown")
-                            from_node = parsed.get("from_node", "unknown")
-                            
-                            print(f"[UDP] Call request: {call_type} from {caller} (Node {from_node})")
-                            
-                            thread_safe_broadcast({
-                                "type": "call_request",
-                                "call_type": call_type,
-                                "caller": caller,
-                                "from_node": from_node,
-                                "caller_ip": addr[0],
-                                "timestamp": datetime.now().isoformat()
-                            })
-                            
-                        else:
-                            # Regular message
-                            thread_safe_broadcast({
-                                "type": "udp_message",
-                                "message": raw_message,
-                                "sender": f"Network@{addr[0]}",
-                                "timestamp": datetime.now().isoformat()
-                            })
-                            
-                    except json.JSONDecodeError:
-                        # Legacy format handling
-                        if raw_message.startswith("CALL_REQUEST:"):
-                            parts = raw_message.split(":")
-                            if len(parts) >= 3:
-                                caller_node = parts[1]
-                                call_type = parts[2]
-                                thread_safe_broadcast({
-                                    "type": "call_request",
-                                    "call_type": call_type,
-                                    "caller": caller_node,
-                                    "caller_ip": addr[0],
-                                    "timestamp": datetime.now().isoformat()
-                                })
-                        else:
-                            thread_safe_broadcast({
-                                "type": "udp_message",
-                                "message": raw_message,
-                                "sender": f"Network@{addr[0]}",
-                                "timestamp": datetime.now().isoformat()
-                            })
-                        
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    if udp_server_running:
-                        print(f"[UDP] Listener error: {e}")
-                        
-        except Exception as e:
-            print(f"[UDP] Failed to start listener: {e}")
-        finally:
-            sock.close()
+    udp_log.debug("WebRTC signal received: %s from Node %s", signal_type, from_node)
+    if signal_type == "answer":
+        call_setup.complete()
+    
+    return {
+        "type": "webrtc_signal",
+        "signal": signal,
+        "from_node": from_node,
+        "sender_ip": addr[0],
+        "timestamp": datetime.now().isoformat()
+    }
+
+def handle_call_request(parsed: Dict, addr, peer: Optional[Dict]) -> Dict:
+    remember_call_peer(peer)
+    call_type = parsed.get("call_type", "audio")
+    caller = parsed.get("caller", "unknown")
+    from_node = parsed.get("from_node", "unknown")
     
-    thread = threading.Thread(target=udp_listener, daemon=True)
-    thread.start()
+    udp_log.info("Call request: %s from %s (Node %s)", call_type, caller, from_node)
     
-def broadcast_udp_message(message: str):
-    try:
-        udp_ports = [9001, 9002, 9003, 9004, 9005]
+    return {
+        "type": "call_request",
+        "call_type": call_type,
+        "caller": caller,
+        "from_node": from_node,
+        "caller_ip": addr[0],
+        "timestamp": datetime.now().isoformat()
+    }
+
+def handle_chat(parsed: Dict, addr, peer: Optional[Dict]) -> Dict:
+    from_node = parsed.get("from_node", "unknown")
+    sender = f"Node-{from_node}@{addr[0]}"
+    author = (parsed.get("gossip") or {}).get("node", from_node)
+    if author != from_node:
+        sender = f"Node-{author} via {sender}"
+    return {
+        "type": "udp_message",
+        "message": parsed.get("message", ""),
+        "sender": sender,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def handle_ack(parsed: Dict, addr, peer: Optional[Dict]) -> None:
+    if peer:
+        reliable.on_ack(peer["id"], parsed.get("ack") or {})
+
+def learn_key(peer: Dict, pk, sealed: bool = False):
+    # The public key rides along in heartbeats and announcements. A plaintext
+    # one can't replace a key the peer is still sealing traffic under, so an
+    # unauthenticated heartbeat can't redirect a live session; a peer that
+    # restarted with a new key is asked to echo a heartbeat sealed under it,
+    # and keys that arrive sealed are taken as is
+    if not (keyring and isinstance(pk, str) and pk != peer.get("pk") and keyring.learn(pk)):
+        return
+    if not sealed and peer.get("pk") and keyring.opened_since(peer["pk"], time.monotonic() - STALE_AFTER):
+        send_to_peers(heartbeat(echo=True), [{**peer, "pk": pk}])
+        return
+    peer["pk"] = pk
+
+def peer_came_online(peer: Dict):
+    # Answer right away so discovery doesn't wait a full heartbeat interval;
+    # a restarted peer starts its streams over, so ours to it do too
+    reliable.forget(peer["id"])
+    send_to_peers(heartbeat(), [peer], seal=False)
+
+def handle_announcement(parsed: Dict, addr):
+    if is_self_echo(parsed, addr) or not isinstance(parsed.get("udp_port"), int):
+        return
+    # A node on this host is reached over loopback, like peers added by hand
+    ip = "127.0.0.1" if local_addresses.is_local(addr[0]) else addr[0]
+    peer, came_online = peer_table.observe(
+        ip, parsed["udp_port"], parsed.get("web_port"),
+        parsed.get("from_node"), parsed.get("caps"), parsed.get("every"), parsed.get("origin")
+    )
+    for field in ("tcp_port", "audio_port", "video_port"):
+        if isinstance(parsed.get(field), int):
+            peer[field] = parsed[field]
+    if came_online:
+        peer_came_online(peer)
+    learn_key(peer, parsed.get("pk"))
+
+transport = Transport(UDP_PORT, websocket_manager.publish, keyring, reassembler, profile="signaling", role="udp")
+transport.add_filter(admit_packet)
+transport.fallback = handle_text_datagram
+transport.on("heartbeat", lambda parsed, addr, peer: None)  # the filter already recorded the peer
+transport.on("ack", handle_ack)
+transport.on("webrtc_signal", handle_webrtc_signal)
+transport.on("call_request", handle_call_request)
+transport.on("chat", handle_chat)
+udp.transport = transport
+tcp.port = TCP_PORT
+    
+def bootstrap_targets():
+    return [("127.0.0.1", port) for port in BOOTSTRAP_UDP_PORTS if port != UDP_PORT]
+
+def send_to_peers(message: Dict, peers: List[Dict], extra_targets=(), seal: bool = True) -> int:
+    # Group targets by (binary, fragmentable, sealed) so each encoding happens once;
+    # sealed targets then get their own ciphertext each
+    groups: Dict[tuple, List] = {(False, False, False): list(extra_targets)}
+    for peer in peers:
+        binary = CAPABILITY in node_caps and supports_binary(peer)
+        fragmentable = FRAGMENT_CAPABILITY in peer.get("caps", ())
+        sealed = bool(seal and keyring and peer.get("pk") and secure.CAPABILITY in peer.get("caps", ()))
+        groups.setdefault((binary, fragmentable, sealed), []).append(peer)
+    if seal and SECURE_MODE == "require":
+        # Only heartbeats (seal=False) go out in the clear
+        groups = {key: targets for key, targets in groups.items() if key[2]}
+    
+    encoded: Dict[bool, bytes] = {}
+    sent_count = 0
+    for (binary, fragmentable, sealed), targets in groups.items():
+        if not targets:
+            continue
+        if binary not in encoded:
+            encoded[binary] = wire_codec.encode(message) if binary else json.dumps(message).encode('utf-8')
+        data = encoded[binary]
+        frames = fragmenter.split(data) if fragmentable and len(data) > FRAGMENT_MTU else [data]
         
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            sock.settimeout(2.0)
-            
-            sent_count = 0
-            for port in udp_ports:
-                if port != UDP_PORT:
-                    try:
-                        sock.sendto(message.encode('utf-8'), ("127.0.0.1", port))
-                        sent_count += 1
-                    except Exception:
-                        pass
-                        
-        print(f"[UDP] Broadcast sent to {sent_count} targets")
-        return True
-    except Exception as e:
-        print(f"[UDP] Broadcast failed: {e}")
+        if sealed:
+            for peer in targets:
+                target = (peer["ip"], peer["udp_port"])
+                sent_count += min(transport.send(keyring.seal(peer["pk"], secure.CH_UDP, frame), target)
+                                  for frame in frames)
+            continue
+        targets = [t if isinstance(t, tuple) else (t["ip"], t["udp_port"]) for t in targets]
+        sent_count += min(transport.send_many(frame, targets) for frame in frames)
+    return sent_count
+
+def send_udp_message(message: Dict, peer_keys: Optional[List[str]] = None) -> bool:
+    """Unicast to the given peers, or to every live peer when none are given"""
+    peers = peer_table.select(peer_keys)
+    extra_targets = []
+    if not peers and peer_keys is None and not peer_table:
+        # Nothing discovered yet; fall back to the legacy loopback range
+        extra_targets = bootstrap_targets()
+    
+    sent_count = send_to_peers(message, peers, extra_targets)
+    udp_messages_out.labels(message.get('type')).inc()
+    udp_log.debug("%s sent to %d targets", message.get('type'), sent_count)
+    return sent_count > 0
+
+def send_signaling(message: Dict, peer_keys: Optional[List[str]] = None) -> bool:
+    """Like send_udp_message, but ACKed and ordered for peers that support it"""
+    peers = peer_table.select(peer_keys)
+    plain = [peer for peer in peers if RELIABLE_CAPABILITY not in peer.get("caps", ())]
+    extra_targets = []
+    if not peers and peer_keys is None and not peer_table:
+        extra_targets = bootstrap_targets()
+    
+    sent_count = 0
+    for peer in peers:
+        if RELIABLE_CAPABILITY in peer.get("caps", ()):
+            reliable.send(message, peer["id"])
+            sent_count += 1
+    if plain or extra_targets:
+        sent_count += send_to_peers(message, plain, extra_targets)
+    udp_messages_out.labels(message.get('type')).inc()
+    udp_log.debug("%s sent to %d targets", message.get('type'), sent_count)
+    return sent_count > 0
+
+def transmit_reliable(message: Dict, peer_key: str):
+    peer = peer_table.get(peer_key)
+    if not peer:
+        return
+    if "origin" not in message:
+        fields = {k: v for k, v in message.items() if k != "type"}
+        message = node_message(message["type"], **fields)
+    send_to_peers(message, [peer])
+
+def deliver_reliable(peer_key: str, message: Dict):
+    peer = peer_table.get(peer_key)
+    if not peer:
+        return
+    ws_message = transport.dispatch(message, (peer["ip"], peer["udp_port"]), peer)
+    if ws_message:
+        websocket_manager.publish(ws_message)
+
+reliable = ReliabilityLayer(transmit_reliable, deliver_reliable)
+peer_table.on_remove = lambda peer: reliable.forget(peer["id"])
+
+def transmit_gossip(message: Dict, peer_keys: List[str]):
+    # Re-stamp the node fields so receivers attribute the datagram to us, the relay
+    fields = {k: v for k, v in message.items() if k not in ("type", "seq", "mono_ms")}
+    send_to_peers(node_message(message["type"], **fields), peer_table.select(peer_keys))
+
+gossip = GossipRelay(NODE_ID, NODE_INSTANCE, peer_table, transmit_gossip, GOSSIP_FANOUT, GOSSIP_TTL)
+
+def node_message(msg_type: str, **fields) -> Dict:
+    return {
+        "type": msg_type,
+        **fields,
+        "from_node": NODE_ID,
+        "origin": NODE_INSTANCE,
+        "udp_port": UDP_PORT,
+        "web_port": WEB_PORT,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def key_fields() -> Dict:
+    return {"pk": keyring.public_b64} if keyring else {}
+
+def heartbeat(**fields) -> Dict:
+    return node_message("heartbeat", caps=node_caps, **key_fields(), **fields)
+
+def announcement(interval: float) -> Dict:
+    return node_message("announce", caps=node_caps, tcp_port=TCP_PORT, audio_port=AUDIO_PORT,
+                        video_port=VIDEO_PORT, every=round(interval, 1), **key_fields())
+
+discovery = Discovery(announcement, handle_announcement, lambda: len(peer_table.select()),
+                      DISCOVERY_GROUP, DISCOVERY_PORT)
+
+async def send_heartbeats():
+    while True:
+        try:
+            peer_table.sweep()
+            reassembler.expire()
+            peers = peer_table.select(include_offline=True)
+            extra_targets = []
+            if not discovery.running:
+                known = {(peer["ip"], peer["udp_port"]) for peer in peers}
+                extra_targets = [t for t in bootstrap_targets() if t not in known]
+            # Peers heard through multicast are kept alive by announcements both
+            # ways, so only the others need a unicast heartbeat
+            peers = [peer for peer in peers if not peer_table.announced(peer["id"])]
+            send_to_peers(heartbeat(), peers, extra_targets, seal=False)
+        except Exception as e:
+            udp_log.warning("Heartbeat failed: %s", e)
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+owner_tasks: List[asyncio.Task] = []
+
+async def start_owner():
+    """Bind the node's sockets and run its background work (owner worker only)"""
+    await transport.start()
+    files.store.register()
+    history.store = websocket_manager.history = ChatHistory(HISTORY_DIR)
+    await tcp_helper.start_server(TCP_PORT)
+    await discovery.start()
+    bus = ipc_bus.BusServer(IPC_SOCKET, handle_ws_message, websocket_manager.publish)
+    await bus.start()
+    ipc_bus.bus = websocket_manager.bus = bus
+    owner_tasks.extend([
+        asyncio.create_task(send_heartbeats()),
+        asyncio.create_task(reliable.run()),
+    ])
+
+async def stop_owner():
+    for task in owner_tasks:
+        task.cancel()
+    owner_tasks.clear()
+    await ipc_bus.bus.stop()
+    discovery.stop()
+    transport.stop()
+    await media.manager.stop_all_media()
+    await tcp_helper.stop_server()
+    websocket_manager.history.close()
+
+async def take_ownership() -> bool:
+    # Called by a worker whose owner went away; the first to grab the lock takes over
+    global ownership_lock
+    ownership_lock = ipc_bus.acquire_ownership(IPC_SOCKET)
+    if ownership_lock is None:
         return False
+    log.info("Worker %d taking over as owner", os.getpid())
+    await start_owner()
+    return True
+
+ownership_lock: Optional[int] = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global main_event_loop
-    main_event_loop = asyncio.get_running_loop()
+    global ownership_lock
     
-    print(f"[METAL-52] Node {NODE_ID} starting on {get_local_ip()}:{WEB_PORT}")
-    start_udp_listener()
+    local_addresses.start()
+    log.info("Node %s starting on %s:%d", NODE_ID, get_local_ip(), WEB_PORT)
+    # Render the index page off the loop now rather than on the first request
+    asyncio.get_running_loop().run_in_executor(None, render_index)
+    files.store = FileStore(FILES_DIR)
+    ownership_lock = ipc_bus.acquire_ownership(IPC_SOCKET)
+    bus_task = None
+    if ownership_lock is not None:
+        await start_owner()
+    else:
+        # Another worker owns the sockets: relay its events to our WebSockets
+        ipc_bus.bus = websocket_manager.bus = ipc_bus.BusClient(IPC_SOCKET, ws_hub.publish, take_ownership)
+        bus_task = asyncio.create_task(ipc_bus.bus.run())
+    ws_heartbeat_task = asyncio.create_task(ws_hub.heartbeat())
     yield
     
-    global udp_server_running
-    udp_server_running = False
+    ws_heartbeat_task.cancel()
+    if bus_task:
+        bus_task.cancel()
+    if ipc_bus.is_owner():
+        await stop_owner()
+    else:
+        await ipc_bus.bus.stop()
+    local_addresses.stop()
 
 app = FastAPI(
     title=f"Metal-52 Node {NODE_ID}",
@@ -209,150 +499,301 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="static")
+app.include_router(tcp.router, prefix="/api/tcp")
+app.include_router(files.router, prefix="/api/files")
+app.include_router(history.router, prefix="/api/history")
+app.include_router(udp.router, prefix="/api/udp")
+app.include_router(media.router, prefix="/api/media")
+static_assets = StaticAssets("static")
+templates = None  # jinja2 is imported on the first page load, not at startup
+index_page: Optional[tuple] = None  # (cache key, rendered page)
+index_lock = threading.Lock()  # a request arriving mid-render waits for it instead of rendering again
+
+@app.api_route("/static/{name:path}", methods=["GET", "HEAD"])
+async def get_static(name: str, request: Request):
+    return static_assets.response(name, request)
+
+def index_key() -> tuple:
+    # The page only changes with our address or the files behind it
+    return (get_local_ip(), static_assets.url("index.html"), static_assets.url("webrtc.js"),
+            static_assets.url("app.js"))
+
+def render_index() -> Encoded:
+    global templates, index_page
+    with index_lock:
+        key = index_key()
+        if index_page is None or index_page[0] != key:
+            if templates is None:
+                import jinja2
+                # Compiled templates are cached on disk, so restarted nodes skip the compile
+                templates = jinja2.Environment(loader=jinja2.FileSystemLoader("static"), autoescape=True,
+                                               bytecode_cache=jinja2.FileSystemBytecodeCache())
+            html = templates.get_template("index.html").render(
+                node_id=NODE_ID,
+                local_ip=key[0],
+                static_url=static_assets.url,
+                ports={
+                    "web": WEB_PORT,
+                    "udp": UDP_PORT,
+                    "tcp": TCP_PORT,
+                    "audio": AUDIO_PORT,
+                    "video": VIDEO_PORT
+                }
+            )
+            index_page = (key, Encoded(html.encode("utf-8"), "text/html"))
+        return index_page[1]
 
 @app.get("/", response_class=HTMLResponse)
-def get_root(request: Request):
-    peer_nodes_list = []
-    if NODE_ID > 0:
-        for i in range(1, 4):
-            if i != NODE_ID:
-                peer_nodes_list.append({
-                    "id": i,
-                    "web_port": 8000 + i,
-                    "audio_port": 5060 + i,
-                    "video_port": 5056 + i,
-                    "ip": "127.0.0.1"
-                })
-
-    return templates.TemplateResponse("index.html", {
-        "request": request,
-        "node_id": NODE_ID,
-        "local_ip": get_local_ip(),
-        "peer_nodes": peer_nodes_list,
-        "ports": {
-            "web": WEB_PORT,
-            "udp": UDP_PORT,
-            "audio": AUDIO_PORT,
-            "video": VIDEO_PORT
-        }
-    })
+async def get_root(request: Request):
+    page = index_page
+    if page is None or page[0] != index_key():
+        page = (None, await run_in_threadpool(render_index))
+    return page[1].response(request)
+
+@ipc_bus.owner_call("history_replay", threadpool=True)
+def history_replay(since: Optional[int]) -> Dict:
+    """What a connecting client missed: everything after ``since`` (its last
+    seen seq), or just the recent messages for a fresh page load"""
+    store = websocket_manager.history
+    reset = since is not None and since > store.last_seq  # our history was wiped
+    if since is None or reset or store.last_seq - since > REPLAY_LIMIT:
+        messages = store.page(limit=REPLAY_LIMIT)
+    else:
+        messages = store.since(since, REPLAY_LIMIT)
+    return {
+        "type": "history",
+        "messages": messages,
+        # Some of what the client missed is only reachable through /api/history
+        "truncated": since is not None and not reset and bool(messages) and messages[0]["seq"] > since + 1,
+        "reset": reset,
+        "last_seq": store.last_seq,
+    }
+
+def parse_ws_frame(message: str) -> Dict:
+    try:
+        data = json.loads(message)
+    except json.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        # Plain text message
+        data = {"message": message}
+    data.setdefault("message", message)
+    return data
+
+def handle_ws_message(connection_id: str, data: Dict):
+    """Act on one parsed WebSocket frame; runs in the owner worker"""
+    global call_peer
+    if data.get("type") == "webrtc_signal":
+        # CRITICAL: Enhanced WebRTC signaling
+        signal_type = data["signal"].get("type", "unknown")
+        
+        # Unicast to the remote party once the call has one
+        webrtc_message = node_message("webrtc_signal", signal=data["signal"])
+        targets = [call_peer] if call_peer in peer_nodes else None
+        
+        success = send_signaling(webrtc_message, targets)
+        ws_log.debug("WebRTC signal %s sent: %s", signal_type, success)
+        
+        # Also broadcast locally for debugging
+        websocket_manager.publish({
+            "type": "webrtc_signal_sent",
+            "signal_type": signal_type,
+            "success": success,
+            "timestamp": datetime.now().isoformat()
+        })
+        
+    elif data.get("type") == "call_request":
+        # Enhanced call request handling
+        call_type = data.get("call_type", "audio")
+        caller = data.get("caller", f"node-{NODE_ID}")
+        
+        call_message = node_message("call_request", call_type=call_type, caller=caller)
+        
+        # A new call: whoever accepts becomes the remote party
+        call_peer = None
+        call_setup.start()
+        success = send_signaling(call_message)
+        ws_log.info("Call request broadcast: %s, success: %s", call_type, success)
+        
+    else:
+        # Regular chat message
+        send_udp_message(gossip.originate(node_message("chat", message=data["message"])))
+        
+        websocket_manager.publish({
+            "type": "chat",
+            "message": data["message"],
+            "sender": f"Node-{NODE_ID} (You)",
+            "timestamp": datetime.now().isoformat()
+        })
 
 @app.websocket("/ws/chat")
-async def websocket_chat_endpoint(websocket: WebSocket):
+async def websocket_chat_endpoint(websocket: WebSocket, since: Optional[int] = Query(None)):
     await websocket.accept()
     connection_id = str(uuid.uuid4())
-    active_connections[connection_id] = websocket
+    limiter = TokenBucket(WS_RATE, WS_BURST)
     
-    print(f"[WS] Client {connection_id} connected (Total: {len(active_connections)})")
+    def attach(replay: Dict):
+        # Runs with nothing published in between, so replay and live messages never overlap
+        ws_hub.add(connection_id, websocket)
+        ws_hub.send(connection_id, {
+            "type": "system",
+            "message": f"Connected to Metal-52 Node {NODE_ID}",
+            "timestamp": datetime.now().isoformat()
+        })
+        ws_hub.send(connection_id, replay)
     
-    await websocket.send_text(json.dumps({
-        "type": "system",
-        "message": f"Connected to Metal-52 Node {NODE_ID}",
-        "timestamp": datetime.now().isoformat()
-    }))
+    try:
+        if ipc_bus.is_owner():
+            attach(history_replay.__wrapped__(since))
+        else:
+            # Attached from the bus reader, ahead of any event that follows the reply
+            await ipc_bus.bus.call("history_replay", {"since": since}, on_result=attach)
+    except HTTPException as e:
+        ws_log.warning("Refusing client %s: %s", connection_id, e.detail)
+        await websocket.close(code=1013)
+        return
+    ws_log.info("Client %s connected", connection_id, total=len(active_connections))
     
+    limited = 0
     try:
         while True:
             message = await websocket.receive_text()
+            ws_hub.touch(connection_id)
             
-            try:
-                data = json.loads(message)
-                
-                if data.get("type") == "webrtc_signal":
-                    # CRITICAL: Enhanced WebRTC signaling
-                    signal_type = data["signal"].get("type", "unknown")
-                    print(f"[WS] WebRTC Signal: {signal_type} from Node {NODE_ID}")
-                    
-                    # Broadcast to UDP with enhanced format
-                    webrtc_message = {
-                        "type": "webrtc_signal",
-                        "signal": data["signal"],
-                        "from_node": NODE_ID,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    
-                    success = broadcast_udp_message(json.dumps(webrtc_message))
-                    print(f"[WS] WebRTC signal broadcast success: {success}")
-                    
-                    # Also broadcast locally for debugging
-                    await broadcast_to_websockets({
-                        "type": "webrtc_signal_sent",
-                        "signal_type": signal_type,
-                        "success": success,
+            if not limiter.allow():
+                limited += 1
+                dropped_ws_rate_limited.inc()
+                if limited == 1:
+                    ws_hub.send(connection_id, {
+                        "type": "system",
+                        "message": "Sending too fast; messages are being dropped",
                         "timestamp": datetime.now().isoformat()
                     })
-                    
-                elif data.get("type") == "call_request":
-                    # Enhanced call request handling
-                    call_type = data.get("call_type", "audio")
-                    caller = data.get("caller", f"node-{NODE_ID}")
-                    
-                    call_message = {
-                        "type": "call_request",
-                        "call_type": call_type,
-                        "caller": caller,
-                        "from_node": NODE_ID,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    
-                    success = broadcast_udp_message(json.dumps(call_message))
-                    print(f"[WS] Call request broadcast: {call_type}, success: {success}")
-                    
+                if limited > WS_MAX_LIMITED:
+                    ws_log.warning("Closing client %s: rate limit exceeded", connection_id)
+                    await websocket.close(code=1008)
+                    break
+                continue
+            limited = 0
+            
+            # One bad frame must not take the connection down
+            try:
+                data = parse_ws_frame(message)
+                if data.get("type") == "pong":
+                    ws_hub.pong(connection_id, data.get("t"))
+                elif ipc_bus.is_owner():
+                    handle_ws_message(connection_id, data)
                 else:
-                    # Regular chat message
-                    chat_message = f"Node-{NODE_ID}: {data.get('message', message)}"
-                    broadcast_udp_message(chat_message)
-                    
-                    await broadcast_to_websockets({
-                        "type": "chat",
-                        "message": data.get("message", message),
-                        "sender": f"Node-{NODE_ID} (You)",
-                        "timestamp": datetime.now().isoformat()
-                    })
-                    
-            except json.JSONDecodeError:
-                # Plain text message
-                chat_message = f"Node-{NODE_ID}: {message}"
-                broadcast_udp_message(chat_message)
-                
-                await broadcast_to_websockets({
-                    "type": "chat",
-                    "message": message,
-                    "sender": f"Node-{NODE_ID} (You)",
-                    "timestamp": datetime.now().isoformat()
-                })
+                    ipc_bus.bus.forward_ws(connection_id, data)
+            except Exception as e:
+                ws_log.warning("Failed to handle message from %s: %s", connection_id, e)
                 
     except WebSocketDisconnect:
-        del active_connections[connection_id]
-        print(f"[WS] Client {connection_id} disconnected")
+        ws_log.info("Client %s disconnected", connection_id)
+    except Exception as e:
+        # e.g. the socket was closed under us by the heartbeat or a slow-client eviction
+        ws_log.info("Client %s dropped: %s", connection_id, e)
+    finally:
+        ws_hub.remove(connection_id)
         
 @app.get("/api/status")
+@ipc_bus.owner_call("status")
 def get_status():
     return {
         "node_id": NODE_ID,
         "active_connections": len(active_connections),
-        "udp_server_running": udp_server_running,
+        "websocket_queues": ws_hub.queue_depths(),
+        "websockets": ws_hub.stats(),
+        "ipc": ipc_bus.bus.stats(),
+        "udp_server_running": transport.running,
+        "udp_sender": transport.sender.stats() if transport.sender else None,
+        "fragments": reassembler.stats(),
+        "history": websocket_manager.history.stats(),
+        "reliability": reliable.stats(),
+        "gossip": gossip.stats(),
+        "discovery": discovery.stats(),
+        "call_setup": call_setup.stats(),
+        "tcp": tcp_helper.stats(),
+        "media": media.manager.get_stats(),
+        "secure": {**keyring.stats(), "mode": SECURE_MODE} if keyring else {"enabled": False, "mode": SECURE_MODE},
         "ports": {
             "web": WEB_PORT,
             "udp": UDP_PORT,
+            "tcp": TCP_PORT,
             "audio": AUDIO_PORT,
             "video": VIDEO_PORT
         }
     }
 
+def peer_counts() -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for peer in peer_nodes.values():
+        counts[peer["status"]] = counts.get(peer["status"], 0) + 1
+    return counts
+
+def queue_depths() -> Dict[str, int]:
+    depths = list(ws_hub.queue_depths().values())
+    return {"total": sum(depths), "max": max(depths, default=0)}
+
+# Read from the counters the services already keep, at scrape time
+metrics.gauge_fn("metal52_ws_clients", "Connected WebSocket clients", lambda: len(ws_hub))
+metrics.gauge_fn("metal52_ws_queue_depth", "Messages waiting in WebSocket send queues", queue_depths, ["stat"])
+metrics.counter_fn("metal52_ws_dropped_total", "Messages dropped from full WebSocket send queues", lambda: ws_hub.dropped)
+metrics.counter_fn("metal52_ws_evicted_total", "Slow or unresponsive WebSocket clients disconnected", lambda: ws_hub.evicted)
+metrics.counter_fn("metal52_udp_datagrams_sent_total", "UDP datagrams sent", lambda: transport.sender.datagrams_sent)
+metrics.counter_fn("metal52_udp_bytes_sent_total", "UDP payload bytes sent", lambda: transport.sender.bytes_sent)
+metrics.counter_fn("metal52_udp_send_failures_total", "UDP sends that failed, by reason",
+                   lambda: {"error": transport.sender.send_errors, "buffer_full": transport.sender.dropped}, ["reason"])
+metrics.counter_fn("metal52_fragments_total", "Fragment reassembly events", lambda: reassembler.counters, ["event"])
+metrics.gauge_fn("metal52_fragments_buffered_bytes", "Bytes held by incomplete fragmented messages", lambda: reassembler.total_bytes)
+metrics.counter_fn("metal52_discovery_announcements_total", "Multicast discovery announcements",
+                   lambda: discovery.counters, ["event"])
+metrics.gauge_fn("metal52_discovery_interval_seconds", "Current interval between this node's announcements",
+                 lambda: discovery.interval() if discovery.running else None)
+metrics.counter_fn("metal52_secure_packets_total", "Peer encryption events",
+                   lambda: keyring.counters if keyring else None, ["event"])
+metrics.counter_fn("metal52_gossip_messages_total", "Chat gossip relay events", lambda: gossip.counters, ["event"])
+metrics.counter_fn("metal52_reliable_messages_total", "Reliable signaling events", lambda: reliable.counters, ["event"])
+metrics.gauge_fn("metal52_peer_srtt_seconds", "Smoothed signaling round-trip time per peer",
+                 lambda: {key: c.srtt for key, c in reliable.channels.items()}, ["peer"])
+metrics.gauge_fn("metal52_peers", "Known peers by status", peer_counts, ["status"])
+metrics.counter_fn("metal52_socket_drops_total", "Datagrams the kernel dropped per tuned UDP socket",
+                   lambda: {role: s["kernel"]["drops"] for role, s in socket_tuning.report()["sockets"].items()
+                            if s["kernel"]}, ["socket"])
+metrics.counter_fn("metal52_udp_kernel_errors_total", "Host-wide UDP errors from /proc/net/snmp",
+                   lambda: {name: value for name, value in socket_tuning.udp_counters().items()
+                            if name.endswith("Errors")}, ["counter"])
+metrics.gauge_fn("metal52_history_last_seq", "Sequence number of the newest chat message",
+                 lambda: websocket_manager.history.last_seq)
+metrics.gauge_fn("metal52_history_pending_writes", "Chat messages not yet written to disk",
+                 lambda: len(websocket_manager.history.pending))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+@ipc_bus.owner_call("metrics")
+def get_metrics():
+    """Prometheus text exposition of the owner worker's metrics"""
+    return metrics.registry.render()
+
+@app.get("/api/diagnostics/sockets")
+@ipc_bus.owner_call("sockets")
+def get_socket_diagnostics():
+    """Requested and effective options of the node's tuned sockets, with
+    the kernel's queue and drop counters for them"""
+    return socket_tuning.report()
+
+@app.get("/api/peers")
+@ipc_bus.owner_call("peers")
+def list_peers():
+    peer_table.sweep()
+    return {"peers": list(peer_nodes.values()), "call_peer": call_peer}
+
 @app.post("/api/peer/add")
-def add_peer(peer_ip: str = Form(...), peer_port: int = Form(8000)):
-    peer_id = f"{peer_ip}:{peer_port}"
-    peer_nodes[peer_id] = {
-        "id": peer_id,
-        "ip": peer_ip,
-        "port": peer_port,
-        "status": "connecting",
-        "last_seen": datetime.now().isoformat()
-    }
-    return {"status": "peer_added", "peer": peer_nodes[peer_id]}
+@ipc_bus.owner_call("peer_add")
+def add_peer(peer_ip: str = Form(...), peer_port: int = Form(8000), peer_udp_port: Optional[int] = Form(None)):
+    # Without an explicit UDP port assume the peer uses the same web/UDP offset as us
+    udp_port = peer_udp_port if peer_udp_port else UDP_PORT - WEB_PORT + peer_port
+    peer = peer_table.add(peer_ip, peer_port, udp_port)
+    return {"status": "peer_added", "peer": peer}
 
 if __name__ == "__main__":
     import uvicorn
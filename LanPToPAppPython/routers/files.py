@@ -0,0 +1,54 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from services import tcp_helper
+from services.file_transfer import FileStore, TransferError
+
+router = APIRouter()
+store: FileStore = None  # set by main.py at startup
+
+
+def _get(file_id: str):
+    try:
+        return store.get(file_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown file")
+
+@router.get("")
+def list_files():
+    store.refresh()
+    return {"files": [store.describe(meta) for meta in store.files.values()]}
+
+@router.post("")
+def create_file(name: str, size: int):
+    try:
+        return store.describe(store.create(name, size))
+    except TransferError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.put("/{file_id}")
+async def upload_file(file_id: str, request: Request, offset: int = 0):
+    _get(file_id)
+    try:
+        return await store.write_stream(file_id, offset, request.stream())
+    except TransferError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/{file_id}/status")
+def file_status(file_id: str):
+    return store.describe(_get(file_id))
+
+@router.get("/{file_id}")
+def download_file(file_id: str):
+    meta = _get(file_id)
+    if not meta["complete"]:
+        raise HTTPException(status_code=409, detail="File is incomplete")
+    return FileResponse(store.path(file_id), filename=meta["name"])
+
+@router.post("/{file_id}/send")
+async def send_file(file_id: str, host: str, port: int = tcp_helper.TCP_PORT, streams: int = 4):
+    _get(file_id)
+    try:
+        return await store.send_to_peer(file_id, host, port, streams)
+    except (TransferError, OSError, ConnectionError) as e:
+        raise HTTPException(status_code=502, detail=str(e))
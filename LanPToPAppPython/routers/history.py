@@ -0,0 +1,29 @@
+from typing import Optional
+
+from fastapi import APIRouter, Query
+
+from services import ipc_bus
+from services.chat_history import PAGE_LIMIT, ChatHistory
+
+router = APIRouter()
+store: ChatHistory = None  # set by main.py at startup
+
+
+@router.get("")
+@ipc_bus.owner_call("history_page", threadpool=True)
+def get_history(before: Optional[int] = None, since: Optional[int] = None,
+                limit: int = Query(50, ge=1, le=PAGE_LIMIT)):
+    """Page backwards with ``before`` (the oldest seq already shown), or
+    forwards with ``since`` (the newest seq already shown)"""
+    if since is not None:
+        messages = store.since(since, limit)
+        has_more = bool(messages) and messages[-1]["seq"] < store.last_seq
+    else:
+        messages = store.page(before, limit)
+        has_more = bool(messages) and messages[0]["seq"] > store.first_seq
+    return {
+        "messages": messages,
+        "has_more": has_more,
+        "first_seq": store.first_seq,
+        "last_seq": store.last_seq,
+    }
@@ -0,0 +1,59 @@
+from typing import Dict, List
+
+from fastapi import APIRouter, HTTPException, Query
+
+from services import ipc_bus, secure
+from services.media_manager import MediaManager
+from services.peers import PeerTable
+
+router = APIRouter()
+manager: MediaManager = None  # set by main.py at startup
+peers: PeerTable = None
+
+
+def _peer(key: str) -> Dict:
+    peer = peers.get(key)
+    if peer is None:
+        raise HTTPException(status_code=404, detail=f"Unknown peer {key}")
+    return peer
+
+
+@router.post("/call")
+@ipc_bus.owner_call("media_call")
+async def start_call(peer: str, video: bool = False, synthetic: bool = False):
+    """Native audio (and video) call with a known peer, sent to the media
+    ports it announced; sealed when the peer advertised a key"""
+    target = _peer(peer)
+    pk = target.get("pk") if secure.CAPABILITY in target.get("caps", ()) else None
+    if secure.required and not pk:
+        raise HTTPException(status_code=403, detail="Peer has no key (SECURE_MODE=require)")
+    return await manager.start_call(target["ip"], target.get("audio_port"), target.get("video_port"),
+                                    video, pk, synthetic, target["id"])
+
+
+@router.post("/relay")
+@ipc_bus.owner_call("media_relay")
+async def start_relay(peer: List[str] = Query(...), mode: str = "forward"):
+    """Relay a 3+ node call for the given peers; participant ids follow
+    the order given, starting at 1"""
+    if secure.required:
+        raise HTTPException(status_code=403, detail="Relayed media is plaintext (SECURE_MODE=require)")
+    participants = {}
+    for n, key in enumerate(peer, 1):
+        target = _peer(key)
+        participants[n] = (target["ip"], target.get("audio_port") or manager.config.audio_port,
+                           target.get("video_port") or manager.config.video_port)
+    return await manager.start_relay(participants, mode)
+
+
+@router.post("/stop")
+@ipc_bus.owner_call("media_stop")
+async def stop_media():
+    await manager.stop_all_media()
+    return {"status": "stopped"}
+
+
+@router.get("/status")
+@ipc_bus.owner_call("media_status")
+def media_status():
+    return manager.get_stats()
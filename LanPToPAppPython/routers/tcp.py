@@ -1,12 +1,19 @@
 from fastapi import APIRouter
-from services import tcp_helper
+from services import ipc_bus, tcp_helper
 
 router = APIRouter()
+port: int = tcp_helper.TCP_PORT  # set by main.py at startup
 
 @router.get("/start-server")
-def start_tcp_server():
-    return tcp_helper.start_server()
+@ipc_bus.owner_call("tcp_start")
+async def start_tcp_server():
+    return await tcp_helper.start_server(port)
 
 @router.post("/send-data")
-def send_data(data: str):
-    return tcp_helper.send_data(data)
\ No newline at end of file
+async def send_data(data: str, host: str = "127.0.0.1", port: int = tcp_helper.TCP_PORT):
+    return await tcp_helper.send_data(data, host, port)
+
+@router.get("/status")
+@ipc_bus.owner_call("tcp_status")
+def tcp_status():
+    return tcp_helper.stats()
\ No newline at end of file
@@ -0,0 +1,22 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+
+from services import ipc_bus, secure
+from services.transport import Transport
+
+router = APIRouter()
+transport: Transport = None  # set by main.py at startup
+
+@router.post("/send-data")
+@ipc_bus.owner_call("udp_send")
+def send_data(data: str, port: Optional[int] = None):
+    """Broadcast raw text to the LAN, as legacy nodes expect it"""
+    if secure.required:
+        raise HTTPException(status_code=403, detail="Plaintext broadcast refused (SECURE_MODE=require)")
+    return transport.broadcast(data.encode("utf-8"), port)
+
+@router.get("/status")
+@ipc_bus.owner_call("udp_status")
+def udp_status():
+    return transport.stats()
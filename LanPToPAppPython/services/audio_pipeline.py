@@ -0,0 +1,750 @@
+# services/audio_pipeline.py
+import asyncio
+import math
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .bitrate import KIND_AUDIO, REPORT_INTERVAL, ReceiverReport, ReportProtocol, ReportWindow, SendLog
+from . import socket_tuning
+from .log import get_logger
+from .media_envelope import is_relayed, unwrap, wrap_header
+from .secure import is_sealed
+from .udp_transport import Datagram, open_udp_endpoint
+
+log = get_logger("AUDIO")
+
+# Packet layout: magic(2) version(1) codec(1) seq(4) timestamp(4) samples(2) | payload
+MAGIC = b"MA"
+VERSION = 1
+HEADER = struct.Struct("!2sBBIIH")
+
+CODEC_PCM16 = 0
+CODEC_MULAW = 1
+
+JITTER_CAPACITY = 64     # frames held by the receive buffer
+MIN_DELAY_FRAMES = 2
+MAX_DELAY_FRAMES = 15
+PLC_MAX_FRAMES = 5       # conceal at most this many consecutive losses, then play silence
+PLC_FADE = 0.6
+STREAM_TIMEOUT = 10.0    # forget a source after this long without packets
+
+
+# Codecs
+
+def _mulaw_tables() -> Tuple[np.ndarray, np.ndarray]:
+    """G.711 μ-law lookup tables: encode is indexed by the int16 sample's bit
+    pattern (as uint16), decode by the 8-bit code."""
+    samples = np.arange(65536, dtype=np.uint32).astype(np.uint16).view(np.int16).astype(np.int32)
+    sign = (samples < 0).astype(np.int32) << 7
+    magnitude = np.minimum(np.abs(samples), 32635) + 0x84
+    exponent = np.clip(np.floor(np.log2(magnitude)).astype(np.int32) - 7, 0, 7)
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    encode = (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    magnitude = (((codes & 0x0F) << 3) + 0x84 << exponent) - 0x84
+    decode = np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+    return encode, decode
+
+
+class PCM16Codec:
+    codec_id = CODEC_PCM16
+    bytes_per_sample = 2
+
+    def encode(self, samples: np.ndarray, out: np.ndarray):
+        np.copyto(out.view("<i2"), samples, casting="unsafe")
+
+    def decode(self, payload: np.ndarray, out: np.ndarray):
+        np.copyto(out, payload.view("<i2"), casting="unsafe")
+
+
+class MulawCodec:
+    """8-bit G.711 μ-law: half the bandwidth of PCM16, table lookups only"""
+    codec_id = CODEC_MULAW
+    bytes_per_sample = 1
+    encode_table, decode_table = _mulaw_tables()
+
+    def encode(self, samples: np.ndarray, out: np.ndarray):
+        np.take(self.encode_table, samples.view(np.uint16), out=out)
+
+    def decode(self, payload: np.ndarray, out: np.ndarray):
+        np.take(self.decode_table, payload, out=out)
+
+
+CODECS = {codec.codec_id: codec for codec in (PCM16Codec(), MulawCodec())}
+CODEC_NAMES = {"pcm16": CODEC_PCM16, "mulaw": CODEC_MULAW}
+
+
+def get_codec(name: str):
+    try:
+        return CODECS[CODEC_NAMES[name]]
+    except KeyError:
+        raise ValueError(f"Unknown audio codec {name!r} (expected one of {sorted(CODEC_NAMES)})")
+
+
+def parse_packet(data: bytes) -> Optional[Tuple[object, int, int, int, np.ndarray]]:
+    """Returns ``(codec, seq, timestamp, samples, payload)`` or None if malformed"""
+    if len(data) < HEADER.size:
+        return None
+    magic, version, codec_id, seq, timestamp, samples = HEADER.unpack_from(data)
+    codec = CODECS.get(codec_id)
+    if magic != MAGIC or version != VERSION or codec is None or not samples:
+        return None
+    payload = np.frombuffer(data, dtype=np.uint8, offset=HEADER.size)
+    if len(payload) != samples * codec.bytes_per_sample:
+        return None
+    return codec, seq, timestamp, samples, payload
+
+
+# Buffers
+
+class SampleRing:
+    """Preallocated int16 ring buffer. Writers and readers copy in and out
+    with slice assignment, so the audio callbacks never allocate."""
+
+    def __init__(self, capacity: int):
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.read_pos = 0
+        self.available = 0
+
+    def write(self, samples: np.ndarray) -> int:
+        """Append samples, overwriting the oldest ones if full; returns samples dropped"""
+        count = len(samples)
+        if count > self.capacity:
+            samples = samples[-self.capacity:]
+            count = self.capacity
+        overflow = max(0, self.available + count - self.capacity)
+        if overflow:
+            self.read_pos = (self.read_pos + overflow) % self.capacity
+            self.available -= overflow
+
+        start = (self.read_pos + self.available) % self.capacity
+        first = min(count, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:count - first] = samples[first:]
+        self.available += count
+        return overflow
+
+    def read_into(self, out: np.ndarray) -> bool:
+        count = len(out)
+        if count > self.available:
+            return False
+        first = min(count, self.capacity - self.read_pos)
+        out[:first] = self.buffer[self.read_pos:self.read_pos + first]
+        out[first:] = self.buffer[:count - first]
+        self.read_pos = (self.read_pos + count) % self.capacity
+        self.available -= count
+        return True
+
+
+class JitterBuffer:
+    """Adaptive playout buffer for fixed-size audio frames.
+
+    Frames are decoded straight into a preallocated ``[capacity, frame]``
+    array slot chosen by sequence number. The playout delay tracks the
+    RFC 3550 interarrival jitter estimate; when the buffer runs deeper than
+    the target, a frame is discarded to claw the latency back, and when the
+    next frame is missing with little queued behind it, playout holds its
+    position to add delay. Missing frames are concealed by repeating the last
+    good frame with a decaying gain.
+    """
+
+    def __init__(self, frame_samples: int, sample_rate: int, capacity: int = JITTER_CAPACITY,
+                 min_delay: int = MIN_DELAY_FRAMES, max_delay: int = MAX_DELAY_FRAMES):
+        self.frame_samples = frame_samples
+        self.sample_rate = sample_rate
+        self.frame_seconds = frame_samples / sample_rate
+        self.capacity = capacity
+        self.min_delay = min_delay
+        self.max_delay = min(max_delay, capacity - 1)
+
+        self.frames = np.zeros((capacity, frame_samples), dtype=np.int16)
+        self.seqs = np.full(capacity, -1, dtype=np.int64)
+        self.last_frame = np.zeros(frame_samples, dtype=np.int16)
+        self._scratch = np.zeros(frame_samples, dtype=np.float32)
+        self.lock = threading.Lock()
+
+        self.next_seq: Optional[int] = None
+        self.highest_seq = -1
+        self.target_delay = min_delay
+        self.jitter = 0.0
+        self._last_transit: Optional[float] = None
+        self.playing = False
+        self.concealed_run = 0
+        self.counters = {
+            "received": 0,
+            "played": 0,
+            "concealed": 0,
+            "late": 0,
+            "duplicates": 0,
+            "discarded": 0,
+            "stretched": 0,
+            "underruns": 0,
+            "resets": 0,
+        }
+
+    def depth(self) -> int:
+        if self.next_seq is None:
+            return 0
+        return max(0, self.highest_seq - self.next_seq + 1)
+
+    def put(self, seq: int, timestamp: int, payload: np.ndarray, codec, arrival: Optional[float] = None):
+        arrival = arrival if arrival is not None else time.monotonic()
+        with self.lock:
+            transit = arrival - timestamp / self.sample_rate
+            if self._last_transit is not None:
+                self.jitter += (abs(transit - self._last_transit) - self.jitter) / 16
+            self._last_transit = transit
+            self.target_delay = min(self.max_delay, max(
+                self.min_delay, math.ceil(3 * self.jitter / self.frame_seconds) + 1))
+
+            if self.next_seq is not None and -self.capacity <= seq - self.next_seq < 0:
+                self.counters["late"] += 1
+                return
+            if self.next_seq is None or abs(seq - self.next_seq) >= self.capacity:
+                # First packet, or the sequence jumped (sender restart, long outage)
+                if self.next_seq is not None:
+                    self.counters["resets"] += 1
+                    self.seqs.fill(-1)
+                    self.playing = False
+                self.next_seq = seq
+                self.highest_seq = seq - 1
+
+            slot = seq % self.capacity
+            if self.seqs[slot] == seq:
+                self.counters["duplicates"] += 1
+                return
+            codec.decode(payload, self.frames[slot])
+            self.seqs[slot] = seq
+            self.highest_seq = max(self.highest_seq, seq)
+            self.counters["received"] += 1
+
+    def pop(self, out: np.ndarray) -> bool:
+        """Fill ``out`` with the next frame to play; returns False for silence"""
+        with self.lock:
+            if not self.playing:
+                if self.next_seq is None or self.depth() < self.target_delay:
+                    out[:] = 0
+                    return False
+                self.playing = True
+
+            # Too much queued relative to the current jitter: skip a frame
+            if self.depth() > self.target_delay + 2:
+                self.seqs[self.next_seq % self.capacity] = -1
+                self.next_seq += 1
+                self.counters["discarded"] += 1
+
+            slot = self.next_seq % self.capacity
+            if self.seqs[slot] == self.next_seq:
+                out[:] = self.frames[slot]
+                self.last_frame[:] = out
+                self.seqs[slot] = -1
+                self.concealed_run = 0
+                self.counters["played"] += 1
+            elif self.depth() < self.target_delay:
+                # Probably late rather than lost: conceal without advancing,
+                # which grows the playout delay toward the target
+                self._conceal(out)
+                self.counters["stretched"] += 1
+                self.next_seq -= 1
+            else:
+                self._conceal(out)
+            self.next_seq += 1
+
+            if self.depth() == 0 and self.concealed_run >= PLC_MAX_FRAMES:
+                # Stream stalled: stop and rebuffer up to the target delay
+                self.playing = False
+                self.counters["underruns"] += 1
+            return True
+
+    def _conceal(self, out: np.ndarray):
+        self.concealed_run += 1
+        self.counters["concealed"] += 1
+        if self.concealed_run > PLC_MAX_FRAMES:
+            out[:] = 0
+            return
+        np.multiply(self.last_frame, PLC_FADE ** self.concealed_run, out=self._scratch)
+        np.copyto(out, self._scratch, casting="unsafe")
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "depth": self.depth(),
+            "target_delay_ms": round(self.target_delay * self.frame_seconds * 1000, 1),
+            "jitter_ms": round(self.jitter * 1000, 2),
+        }
+
+
+# Capture and playback devices
+
+class ClockedDevice:
+    """Calls ``tick()`` once per frame period on a background thread.
+    Stands in for a sound card clock in tests and headless nodes."""
+
+    def __init__(self, frame_samples: int, sample_rate: int):
+        self.frame_samples = frame_samples
+        self.period = frame_samples / sample_rate
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def _run(self):
+        deadline = time.perf_counter()
+        while self._running:
+            self.tick()
+            deadline += self.period
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -10 * self.period:
+                deadline = time.perf_counter()  # fell far behind: don't burst to catch up
+
+    def tick(self):
+        raise NotImplementedError
+
+    def _start_clock(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+
+class ToneSource(ClockedDevice):
+    """Synthetic capture: a sine tone, optionally with noise"""
+
+    def __init__(self, frame_samples: int, sample_rate: int, frequency: float = 440.0,
+                 amplitude: float = 0.3, noise: float = 0.0):
+        super().__init__(frame_samples, sample_rate)
+        self.frequency = frequency
+        self.amplitude = amplitude
+        self.noise = noise
+        self.sample_rate = sample_rate
+        self.phase = 0
+        self.frame = np.zeros(frame_samples, dtype=np.int16)
+        self._t = np.arange(frame_samples, dtype=np.float64)
+        self._wave = np.zeros(frame_samples, dtype=np.float64)
+        self._rng = np.random.default_rng()
+        self.callback: Optional[Callable[[np.ndarray], None]] = None
+
+    def start(self, callback: Callable[[np.ndarray], None]):
+        self.callback = callback
+        self._start_clock()
+
+    def tick(self):
+        np.add(self._t, self.phase, out=self._wave)
+        np.multiply(self._wave, 2 * math.pi * self.frequency / self.sample_rate, out=self._wave)
+        np.sin(self._wave, out=self._wave)
+        np.multiply(self._wave, self.amplitude * 32767, out=self._wave)
+        if self.noise:
+            self._wave += self._rng.normal(0, self.noise * 32767, self.frame_samples)
+        np.clip(self._wave, -32768, 32767, out=self._wave)
+        np.copyto(self.frame, self._wave, casting="unsafe")
+        self.phase += self.frame_samples
+        self.callback(self.frame)
+
+
+class RecordingSink(ClockedDevice):
+    """Synthetic playback: pulls frames on the clock and keeps the most
+    recent ``seconds`` of output in a ring for inspection."""
+
+    def __init__(self, frame_samples: int, sample_rate: int, seconds: float = 10.0):
+        super().__init__(frame_samples, sample_rate)
+        self.ring = SampleRing(int(sample_rate * seconds))
+        self.frame = np.zeros(frame_samples, dtype=np.int16)
+        self.pull: Optional[Callable[[np.ndarray], None]] = None
+
+    def start(self, pull: Callable[[np.ndarray], None]):
+        self.pull = pull
+        self._start_clock()
+
+    def tick(self):
+        self.pull(self.frame)
+        self.ring.write(self.frame)
+
+
+class SoundDeviceSource:
+    """Microphone capture through ``sounddevice``"""
+
+    def __init__(self, frame_samples: int, sample_rate: int, device=None):
+        self.frame_samples = frame_samples
+        self.sample_rate = sample_rate
+        self.device = device
+        self.stream = None
+
+    def start(self, callback: Callable[[np.ndarray], None]):
+        import sounddevice as sd
+
+        def audio_callback(indata, frames, time_info, status):
+            callback(indata[:, 0])
+
+        self.stream = sd.InputStream(samplerate=self.sample_rate, channels=1, dtype="int16",
+                                     blocksize=self.frame_samples, device=self.device,
+                                     callback=audio_callback)
+        self.stream.start()
+
+    def stop(self):
+        if self.stream:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+
+class SoundDeviceSink:
+    """Speaker playback through ``sounddevice``"""
+
+    def __init__(self, frame_samples: int, sample_rate: int, device=None):
+        self.frame_samples = frame_samples
+        self.sample_rate = sample_rate
+        self.device = device
+        self.stream = None
+
+    def start(self, pull: Callable[[np.ndarray], None]):
+        import sounddevice as sd
+
+        def audio_callback(outdata, frames, time_info, status):
+            pull(outdata[:, 0])
+
+        self.stream = sd.OutputStream(samplerate=self.sample_rate, channels=1, dtype="int16",
+                                      blocksize=self.frame_samples, device=self.device,
+                                      callback=audio_callback)
+        self.stream.start()
+
+    def stop(self):
+        if self.stream:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+
+# Send and receive paths
+
+class AudioSender:
+    """Packetizes captured audio into fixed frames and sends them over UDP.
+
+    Capture blocks of any size are staged in a ring and cut into
+    ``frame_samples`` frames that are encoded directly into a reused packet
+    buffer. Receiver reports arrive on the same socket via the event loop.
+    With a ``cipher`` (a ``secure.SealedChannel``) each packet is sealed
+    into the channel's own reused buffer before sending.
+    """
+
+    def __init__(self, remote: Tuple[str, int], source, frame_samples: int, codec_name: str = "mulaw",
+                 relay_id: Optional[int] = None, cipher=None):
+        self.remote = remote
+        self.source = source
+        self.codec = get_codec(codec_name)
+        # Sending through a MediaRelay: every packet carries our participant id
+        self.prefix = wrap_header(relay_id) if relay_id is not None else b""
+        self.cipher = cipher
+        self._allocate(frame_samples)
+        self._pending_frame: Optional[int] = None
+        self.seq = 0
+        self.timestamp = 0
+        self.sock: Optional[socket.socket] = None
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.tuner = None
+        self.send_log = SendLog()
+        self.last_rtt: Optional[float] = None
+        self.last_loss = 0.0
+        self.counters = {"frames": 0, "bytes": 0, "dropped": 0, "errors": 0}
+        self.started_at: Optional[float] = None
+
+    def _allocate(self, frame_samples: int, carry: Optional[np.ndarray] = None):
+        self.frame_samples = frame_samples
+        self.ring = SampleRing(frame_samples * 8)
+        if carry is not None:
+            self.ring.write(carry)
+        self.frame = np.zeros(frame_samples, dtype=np.int16)
+        payload_bytes = frame_samples * self.codec.bytes_per_sample
+        self.packet = bytearray(self.prefix + bytes(HEADER.size + payload_bytes))
+        self.packet_view = memoryview(self.packet)
+        self.payload = np.frombuffer(self.packet, dtype=np.uint8, offset=len(self.prefix) + HEADER.size)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        socket_tuning.tune(self.sock, "media", f"audio_send:{self.remote[0]}:{self.remote[1]}")
+        self.sock.setblocking(False)
+        self.sock.bind(("0.0.0.0", 0))
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: ReportProtocol(self.on_report), sock=self.sock)
+        self.started_at = time.monotonic()
+        self.source.start(self.on_capture)
+
+    def set_frame_samples(self, frame_samples: int):
+        """Change the packet size; applied by the capture thread before its next frame"""
+        if frame_samples != self.frame_samples:
+            self._pending_frame = frame_samples
+
+    def on_capture(self, samples: np.ndarray):
+        if self._pending_frame:
+            carry = np.zeros(self.ring.available, dtype=np.int16)
+            self.ring.read_into(carry)
+            self._allocate(self._pending_frame, carry)
+            self._pending_frame = None
+        self.ring.write(samples)
+        while self.ring.read_into(self.frame):
+            self._send_frame()
+
+    def _send_frame(self):
+        HEADER.pack_into(self.packet, len(self.prefix), MAGIC, VERSION, self.codec.codec_id,
+                         self.seq & 0xFFFFFFFF, self.timestamp & 0xFFFFFFFF, self.frame_samples)
+        self.codec.encode(self.frame, self.payload)
+        self.send_log.record(self.seq, time.monotonic())
+        self.seq += 1
+        self.timestamp += self.frame_samples
+        packet = self.cipher.seal_into(self.packet_view) if self.cipher else self.packet_view
+        try:
+            self.sock.sendto(packet, self.remote)
+        except BlockingIOError:
+            self.counters["dropped"] += 1
+            return
+        except OSError as e:
+            self.counters["errors"] += 1
+            if self.counters["errors"] == 1:
+                log.warning("Send error to %s:%s: %s", self.remote[0], self.remote[1], e)
+            return
+        self.counters["frames"] += 1
+        self.counters["bytes"] += len(packet)
+
+    def on_report(self, data: bytes):
+        report = ReceiverReport.unpack(data)
+        if report is None or not report.expected:
+            return
+        self.last_rtt = self.send_log.rtt(report)
+        self.last_loss = report.loss
+        if self.tuner is not None:
+            self.tuner.on_report(report, self.last_rtt)
+
+    def stop(self):
+        self.source.stop()
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        elif self.sock:
+            self.sock.close()
+        self.sock = None
+
+    def stats(self) -> Dict:
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        return {
+            **self.counters,
+            "codec": self.codec.codec_id,
+            "frame_samples": self.frame_samples,
+            "kbps": round(self.counters["bytes"] * 8 / elapsed / 1000, 1) if elapsed else 0.0,
+            "rtt_ms": round(self.last_rtt, 1) if self.last_rtt is not None else None,
+            "reported_loss": round(self.last_loss, 4),
+        }
+
+
+class AudioMixer:
+    """Sums int16 frames in an int32 accumulator.
+
+    Callers copy each participant's frame into a row of ``inputs``;
+    ``mix_all`` produces the full mix and ``mix_minus`` the mix without one
+    participant (what that participant should hear), both from one shared
+    sum so N outputs cost one sum plus N subtractions.
+    """
+
+    def __init__(self, block: int, max_inputs: int = 32):
+        self.inputs = np.zeros((max_inputs, block), dtype=np.int16)
+        self.total = np.zeros(block, dtype=np.int32)
+        self.scratch = np.zeros(block, dtype=np.int32)
+        self.count = 0
+        self.clipped = 0
+
+    def resize(self, block: int, max_inputs: int):
+        if self.inputs.shape != (max_inputs, block):
+            self.inputs = np.zeros((max_inputs, block), dtype=np.int16)
+            self.total = np.zeros(block, dtype=np.int32)
+            self.scratch = np.zeros(block, dtype=np.int32)
+
+    def sum(self, count: int):
+        self.count = count
+        np.sum(self.inputs[:count], axis=0, dtype=np.int32, out=self.total)
+
+    def _clip(self, source: np.ndarray, out: np.ndarray):
+        if source.max(initial=0) > 32767 or source.min(initial=0) < -32768:
+            self.clipped += 1
+            np.clip(source, -32768, 32767, out=self.scratch)
+            source = self.scratch
+        np.copyto(out, source, casting="unsafe")
+
+    def mix_all(self, out: np.ndarray):
+        self._clip(self.total, out)
+
+    def mix_minus(self, index: int, out: np.ndarray):
+        np.subtract(self.total, self.inputs[index], out=self.scratch)
+        self._clip(self.scratch, out)
+
+
+class AudioStream:
+    """Receive state for one incoming audio source: jitter buffer, playout
+    ring and report counters. Rebuilds the jitter buffer (a short rebuffer)
+    when the sender changes its frame size."""
+
+    def __init__(self, key, frame_samples: int, sample_rate: int, report_to: Tuple[str, int],
+                 report_prefix: bytes = b""):
+        self.key = key
+        self.sample_rate = sample_rate
+        self.report_to = report_to
+        self.report_prefix = report_prefix
+        self.lock = threading.Lock()
+        self.window = ReportWindow(KIND_AUDIO)
+        self.highest_seq: Optional[int] = None
+        self.last_seen = time.monotonic()
+        self.resized = 0
+        self._allocate(frame_samples)
+
+    def _allocate(self, frame_samples: int):
+        self.frame_samples = frame_samples
+        self.jitter = JitterBuffer(frame_samples, self.sample_rate)
+        self.playout = SampleRing(frame_samples * 16)
+        self.frame = np.zeros(frame_samples, dtype=np.int16)
+
+    def put(self, codec, seq: int, timestamp: int, samples: int, payload: np.ndarray,
+            size: int, now: float):
+        if samples != self.frame_samples:
+            with self.lock:
+                self._allocate(samples)
+            self.highest_seq = None
+            self.resized += 1
+        if self.highest_seq is None or seq > self.highest_seq:
+            self.window.expected += seq - self.highest_seq if self.highest_seq is not None else 1
+            self.highest_seq = seq
+        self.window.on_packet(size, seq, now)
+        self.last_seen = now
+        self.jitter.put(seq, timestamp, payload, codec, now)
+
+    def read(self, out: np.ndarray):
+        """Fill ``out`` (any block size) from the jitter buffer"""
+        with self.lock:
+            while self.playout.available < len(out):
+                self.jitter.pop(self.frame)
+                self.playout.write(self.frame)
+            self.playout.read_into(out)
+
+    def build_report(self, now: Optional[float] = None) -> Optional[bytes]:
+        report = self.window.build(self.jitter.jitter * 1000, now)
+        return self.report_prefix + report if report else None
+
+    def stats(self) -> Dict:
+        return {**self.jitter.stats(), "frame_samples": self.frame_samples, "resized": self.resized}
+
+
+class AudioReceiver:
+    """Receives audio packets on the event loop and feeds the playback
+    device from per-source jitter buffers.
+
+    Packets relayed by a forwarding MediaRelay arrive in an envelope naming
+    the original source, so each participant gets its own stream and the
+    streams are mixed locally at playback. Receiver reports go back to each
+    source every ``REPORT_INTERVAL`` (through the relay when relayed).
+    """
+
+    def __init__(self, port: int, sink, frame_samples: int, sample_rate: int, keyring=None):
+        self.port = port
+        self.sink = sink
+        self.keyring = keyring
+        self.sample_rate = sample_rate
+        self.frame_samples = frame_samples
+        self.streams: Dict[Tuple, AudioStream] = {}
+        self.mixer = AudioMixer(frame_samples, 4)
+        self.lock = threading.Lock()
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.report_task: Optional[asyncio.Task] = None
+        self.rejected = 0
+
+    async def start(self, host: str = "0.0.0.0"):
+        self.transport, _ = await open_udp_endpoint(self.port, self.on_batch, host,
+                                                    profile="media", role=f"audio_recv:{self.port}")
+        self.report_task = asyncio.create_task(self._report_loop())
+        self.sink.start(self.pull)
+
+    def on_batch(self, batch: List[Datagram]):
+        now = time.monotonic()
+        for data, addr in batch:
+            source_id = None
+            if self.keyring and is_sealed(data):
+                data = self.keyring.open(data)
+                if data is None:
+                    self.rejected += 1
+                    continue
+            if is_relayed(data):
+                unwrapped = unwrap(data)
+                if unwrapped is None:
+                    self.rejected += 1
+                    continue
+                source_id, data = unwrapped
+            packet = parse_packet(data)
+            if packet is None:
+                self.rejected += 1
+                continue
+
+            key = (addr, source_id)
+            stream = self.streams.get(key)
+            if stream is None:
+                prefix = wrap_header(source_id) if source_id is not None else b""
+                stream = AudioStream(key, packet[3], self.sample_rate, addr, prefix)
+                with self.lock:
+                    self.streams[key] = stream
+            stream.put(*packet, len(data), now)
+
+    def pull(self, out: np.ndarray):
+        """Playback callback: fill ``out`` from every active source"""
+        with self.lock:
+            streams = list(self.streams.values())
+        if not streams:
+            out[:] = 0
+        elif len(streams) == 1:
+            streams[0].read(out)
+        else:
+            # Reallocates only when the device block size or source count grows
+            self.mixer.resize(len(out), max(len(streams), self.mixer.inputs.shape[0]))
+            for row, stream in enumerate(streams):
+                stream.read(self.mixer.inputs[row])
+            self.mixer.sum(len(streams))
+            self.mixer.mix_all(out)
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            now = time.monotonic()
+            for key, stream in list(self.streams.items()):
+                if now - stream.last_seen > STREAM_TIMEOUT:
+                    with self.lock:
+                        del self.streams[key]
+                    continue
+                report = stream.build_report(now)
+                if report:
+                    self.transport.sendto(report, stream.report_to)
+
+    def stop(self):
+        self.sink.stop()
+        if self.report_task:
+            self.report_task.cancel()
+            self.report_task = None
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+
+    def stats(self) -> Dict:
+        return {
+            "rejected": self.rejected,
+            "clipped_mixes": self.mixer.clipped,
+            "streams": {
+                f"{addr[0]}:{addr[1]}" + (f"#{source}" if source is not None else ""): stream.stats()
+                for (addr, source), stream in list(self.streams.items())
+            },
+        }
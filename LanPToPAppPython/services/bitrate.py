@@ -0,0 +1,304 @@
+# services/bitrate.py
+import asyncio
+import struct
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, replace
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# Receiver report, sent back to the media sender's socket about once a second:
+# magic(2) version(1) kind(1) received(4) expected(4) bytes(4) jitter_us(4) echo_id(4) hold_ms(4) interval_ms(4)
+REPORT_MAGIC = b"MR"
+REPORT_VERSION = 1
+REPORT = struct.Struct("!2sBB7I")
+REPORT_INTERVAL = 1.0
+
+KIND_AUDIO = 1
+KIND_VIDEO = 2
+
+MIN_KBPS = 64
+MAX_KBPS = 4000
+LOSS_HIGH = 0.10
+LOSS_LOW = 0.02
+QUEUE_DELAY_HIGH_MS = 40.0
+JITTER_HIGH_MS = 30.0
+MAX_INCREASE = 1.25       # per-report growth cap while probing
+DECREASE_HOLD = 2.0       # seconds after a decrease before probing up again
+UPGRADE_REPORTS = 3       # consecutive reports a higher rung must be affordable
+BASE_RTT_WINDOW = 30
+
+# Highest rung first: (kbps needed, width, height, fps, jpeg quality)
+VIDEO_LADDER: List[Tuple[int, int, int, int, int]] = [
+    (2500, 1280, 720, 30, 80),
+    (1500, 960, 540, 25, 75),
+    (900, 640, 480, 20, 70),
+    (500, 640, 480, 15, 60),
+    (250, 480, 360, 12, 50),
+    (120, 320, 240, 10, 40),
+    (0, 320, 240, 5, 30),
+]
+
+# Audio frames get longer when the budget is tight: fewer packets, less header overhead
+AUDIO_FRAME_MS = 20
+AUDIO_FRAME_MS_CONSTRAINED = 40
+AUDIO_CONSTRAINED_KBPS = 300
+
+
+@dataclass
+class ReceiverReport:
+    kind: int
+    received: int
+    expected: int
+    bytes: int
+    jitter_ms: float
+    echo_id: int
+    hold_ms: int
+    interval_ms: int
+
+    @property
+    def loss(self) -> float:
+        if not self.expected:
+            return 0.0
+        return max(0.0, 1 - self.received / self.expected)
+
+    @property
+    def kbps(self) -> float:
+        return self.bytes * 8 / self.interval_ms if self.interval_ms else 0.0
+
+    def pack(self) -> bytes:
+        return REPORT.pack(REPORT_MAGIC, REPORT_VERSION, self.kind, self.received, self.expected,
+                           self.bytes, int(self.jitter_ms * 1000), self.echo_id & 0xFFFFFFFF,
+                           self.hold_ms, self.interval_ms)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> Optional["ReceiverReport"]:
+        if len(data) != REPORT.size:
+            return None
+        magic, version, kind, received, expected, size, jitter_us, echo_id, hold_ms, interval_ms = REPORT.unpack(data)
+        if magic != REPORT_MAGIC or version != REPORT_VERSION:
+            return None
+        return cls(kind, received, expected, size, jitter_us / 1000, echo_id, hold_ms, interval_ms)
+
+
+def is_report(data: bytes) -> bool:
+    return data[:2] == REPORT_MAGIC
+
+
+class ReportWindow:
+    """Receiver-side counters for the next report"""
+
+    def __init__(self, kind: int):
+        self.kind = kind
+        self.received = 0
+        self.expected = 0
+        self.bytes = 0
+        self.echo_id: Optional[int] = None
+        self.echo_at = 0.0
+        self.started = time.monotonic()
+
+    def on_packet(self, size: int, echo_id: int, now: float):
+        self.received += 1
+        self.bytes += size
+        self.echo_id = echo_id
+        self.echo_at = now
+
+    def build(self, jitter_ms: float, now: Optional[float] = None) -> Optional[bytes]:
+        now = now if now is not None else time.monotonic()
+        if self.echo_id is None:
+            return None
+        report = ReceiverReport(
+            self.kind, min(self.received, self.expected), self.expected, self.bytes, jitter_ms,
+            self.echo_id, int((now - self.echo_at) * 1000), int((now - self.started) * 1000))
+        self.received = self.expected = self.bytes = 0
+        self.echo_id = None
+        self.started = now
+        return report.pack()
+
+
+class ReportProtocol(asyncio.DatagramProtocol):
+    """Receives reports on a media sender's socket"""
+
+    def __init__(self, on_report: Callable[[bytes], None]):
+        self.on_report = on_report
+
+    def datagram_received(self, data: bytes, addr):
+        self.on_report(data)
+
+
+class SendLog:
+    """Sender-side send times of recent packets, for RTT from echoed ids"""
+
+    def __init__(self, size: int = 512):
+        self.size = size
+        self.sent: "OrderedDict[int, float]" = OrderedDict()
+
+    def record(self, packet_id: int, now: float):
+        self.sent[packet_id & 0xFFFFFFFF] = now
+        if len(self.sent) > self.size:
+            self.sent.popitem(last=False)
+
+    def rtt(self, report: ReceiverReport, now: Optional[float] = None) -> Optional[float]:
+        sent = self.sent.get(report.echo_id)
+        if sent is None:
+            return None
+        now = now if now is not None else time.monotonic()
+        return max(0.0, (now - sent) * 1000 - report.hold_ms)
+
+
+class RateController:
+    """Target send rate from loss, delay and delivered throughput.
+
+    Loss above ``LOSS_HIGH`` cuts the rate in proportion to the loss; a
+    queueing delay (RTT above its recent minimum) or jitter above threshold
+    means the link is saturating, so the target drops to just under the
+    throughput the receiver actually measured. With both, the deeper cut wins. Otherwise, with low loss and
+    no recent decrease, the target grows by 8% per report, speeding up the
+    longer the link stays clean so recovery after a deep cut is quick.
+    """
+
+    def __init__(self, start_kbps: float = 1000, min_kbps: float = MIN_KBPS, max_kbps: float = MAX_KBPS):
+        self.min_kbps = min_kbps
+        self.max_kbps = max_kbps
+        self.target_kbps = start_kbps
+        self.rtts: Deque[float] = deque(maxlen=BASE_RTT_WINDOW)
+        self.last_decrease = float("-inf")
+        self.clean_reports = 0
+        self.state = "hold"
+
+    def update(self, loss: float, rtt_ms: Optional[float], jitter_ms: float,
+               delivered_kbps: float, now: Optional[float] = None) -> float:
+        now = now if now is not None else time.monotonic()
+        queue_delay = 0.0
+        if rtt_ms is not None:
+            self.rtts.append(rtt_ms)
+            queue_delay = rtt_ms - min(self.rtts)
+
+        congested = queue_delay > QUEUE_DELAY_HIGH_MS or jitter_ms > JITTER_HIGH_MS
+        if loss > LOSS_HIGH or congested:
+            cuts = []
+            if loss > LOSS_HIGH:
+                cuts.append(self.target_kbps * (1 - 0.5 * loss))
+            if congested:
+                cuts.append(0.85 * (delivered_kbps or self.target_kbps))
+            self._decrease(min(cuts), now, "loss" if loss > LOSS_HIGH else "delay")
+        elif loss < LOSS_LOW and now - self.last_decrease > DECREASE_HOLD:
+            self.clean_reports += 1
+            growth = min(MAX_INCREASE, 1.08 + 0.02 * max(0, self.clean_reports - 3))
+            self.target_kbps = min(self.max_kbps, self.target_kbps * growth)
+            self.state = "increase"
+        else:
+            self.clean_reports = 0
+            self.state = "hold"
+        return self.target_kbps
+
+    def _decrease(self, target: float, now: float, reason: str):
+        self.target_kbps = max(self.min_kbps, min(self.target_kbps, target))
+        self.last_decrease = now
+        self.clean_reports = 0
+        self.state = f"decrease:{reason}"
+
+
+class SessionTuner:
+    """Owns one call's ``MediaConfig`` copy and retunes it from receiver reports.
+
+    The rate controller's target picks a rung of ``VIDEO_LADDER`` (capped at
+    the configured resolution and quality). Stepping down is immediate;
+    stepping up needs the higher rung to stay affordable for
+    ``UPGRADE_REPORTS`` reports in a row, so the ladder doesn't flap.
+    ``on_change(config, changes)`` runs whenever a field actually changes.
+    """
+
+    def __init__(self, config, on_change: Optional[Callable[[object, Dict], None]] = None,
+                 start_kbps: float = 1000):
+        self.base = config
+        self.config = replace(config)
+        self.on_change = on_change
+        self.controller = RateController(start_kbps)
+        self.ladder = [
+            (kbps, min(w, config.video_width), min(h, config.video_height),
+             min(fps, config.video_fps), min(q, config.quality))
+            for kbps, w, h, fps, q in VIDEO_LADDER
+        ]
+        self.rung = self._affordable_rung(start_kbps)
+        self.upgrade_streak = 0
+        self.latest: Dict[int, ReceiverReport] = {}
+        self.audio_constrained = start_kbps < AUDIO_CONSTRAINED_KBPS
+        self.last_rtt: Optional[float] = None
+        self.last_loss = 0.0
+        self.switches = 0
+        self._apply(self._settings())
+
+    def _affordable_rung(self, kbps: float) -> int:
+        return next(i for i, rung in enumerate(self.ladder) if kbps >= rung[0])
+
+    def _settings(self) -> Dict:
+        _, width, height, fps, quality = self.ladder[self.rung]
+        target = self.controller.target_kbps
+        if target < AUDIO_CONSTRAINED_KBPS:
+            self.audio_constrained = True
+        elif target > AUDIO_CONSTRAINED_KBPS * 1.2:
+            self.audio_constrained = False
+        frame_ms = AUDIO_FRAME_MS_CONSTRAINED if self.audio_constrained else AUDIO_FRAME_MS
+        return {
+            "video_width": width,
+            "video_height": height,
+            "video_fps": fps,
+            "quality": quality,
+            "audio_frame": self.base.audio_rate * frame_ms // 1000,
+        }
+
+    def on_report(self, report: ReceiverReport, rtt_ms: Optional[float],
+                  now: Optional[float] = None) -> Dict:
+        """Feed one report; returns the config fields that changed.
+
+        Audio and video share the link, so the controller steps once per
+        video report (or audio report, for audio-only calls) using the worst
+        loss and jitter and the combined throughput of both.
+        """
+        self.latest[report.kind] = report
+        if rtt_ms is not None:
+            self.last_rtt = rtt_ms
+        primary = KIND_VIDEO if KIND_VIDEO in self.latest else KIND_AUDIO
+        if report.kind != primary:
+            return {}
+
+        reports = self.latest.values()
+        self.last_loss = max(r.loss for r in reports)
+        target = self.controller.update(self.last_loss, rtt_ms, max(r.jitter_ms for r in reports),
+                                        sum(r.kbps for r in reports), now)
+
+        affordable = self._affordable_rung(target)
+        if affordable > self.rung:
+            self.rung = affordable
+            self.upgrade_streak = 0
+            self.switches += 1
+        elif affordable < self.rung:
+            self.upgrade_streak += 1
+            if self.upgrade_streak >= UPGRADE_REPORTS:
+                self.rung -= 1
+                self.upgrade_streak = 0
+                self.switches += 1
+        else:
+            self.upgrade_streak = 0
+        return self._apply(self._settings())
+
+    def _apply(self, settings: Dict) -> Dict:
+        changes = {k: v for k, v in settings.items() if getattr(self.config, k) != v}
+        for key, value in changes.items():
+            setattr(self.config, key, value)
+        if changes and self.on_change:
+            self.on_change(self.config, changes)
+        return changes
+
+    def stats(self) -> Dict:
+        return {
+            "target_kbps": round(self.controller.target_kbps, 1),
+            "state": self.controller.state,
+            "delivered_kbps": round(sum(r.kbps for r in self.latest.values()), 1),
+            "rtt_ms": round(self.last_rtt, 1) if self.last_rtt is not None else None,
+            "loss": round(self.last_loss, 4),
+            "rung": self.rung,
+            "switches": self.switches,
+            "config": {k: getattr(self.config, k) for k in
+                       ("video_width", "video_height", "video_fps", "quality", "audio_frame")},
+        }
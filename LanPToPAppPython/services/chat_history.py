@@ -0,0 +1,270 @@
+# services/chat_history.py
+import bisect
+import itertools
+import json
+import os
+import struct
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .fanout import encode_message
+from .log import get_logger
+
+log = get_logger("HISTORY")
+
+RING_SIZE = 1000
+SEGMENT_BYTES = 4 * 1024 * 1024
+MAX_SEGMENTS = 16          # oldest segments are deleted beyond this
+INDEX_INTERVAL = 64        # one index entry per this many messages
+INDEX_ENTRY = struct.Struct("!QQ")   # seq, byte offset in the segment
+PAGE_LIMIT = 200
+
+# Message types kept in history; signaling and status events are not
+RECORDED_TYPES = ("chat", "udp_message", "file_received")
+
+
+class Segment:
+    """One append-only log file of JSON lines plus its sparse offset index"""
+
+    def __init__(self, directory: str, base: int):
+        self.base = base
+        self.log_path = os.path.join(directory, f"{base:016d}.log")
+        self.index_path = os.path.join(directory, f"{base:016d}.idx")
+        self.index: List[Tuple[int, int]] = []
+        self.last_seq = base - 1
+        self.size = 0
+
+    def load_index(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        self.index = [INDEX_ENTRY.unpack_from(data, i) for i in range(0, usable, INDEX_ENTRY.size)]
+
+    def offset_for(self, seq: int) -> int:
+        """Byte offset of the last indexed message at or before ``seq``"""
+        i = bisect.bisect_right(self.index, (seq, float("inf"))) - 1
+        return self.index[i][1] if i >= 0 else 0
+
+
+class ChatHistory:
+    """Chat messages with a sequence number each, kept in two tiers.
+
+    The newest ``ring_size`` messages stay in memory, which covers nearly
+    every reconnect replay. Everything is also appended to segmented
+    JSON-lines logs on disk, each with an index entry every
+    ``INDEX_INTERVAL`` messages, so an older page is one seek plus a short
+    forward read. The tail of the newest segment is re-scanned on startup
+    to drop a torn last line.
+
+    ``record`` only touches memory, so it is safe on the event loop; a
+    writer thread appends batches of pending lines to disk. Anything not
+    yet written is still in the ring, which is where reads of recent
+    messages come from.
+    """
+
+    def __init__(self, directory: str, ring_size: int = RING_SIZE,
+                 segment_bytes: int = SEGMENT_BYTES, max_segments: int = MAX_SEGMENTS):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.pending: List[Tuple[int, bytes]] = []
+        self.closing = False
+        self.segments: List[Segment] = []
+        self.log = None
+        self.index_file = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+        self.next_seq = self.segments[-1].last_seq + 1 if self.segments else 1
+        if not self.segments:
+            self._open_segment(self.next_seq)
+        else:
+            self._open_files(self.segments[-1])
+        self.ring: Deque[Dict] = deque(maxlen=ring_size)
+        start = max(self.first_seq, self.next_seq - ring_size)
+        self.ring.extend(self._read(start, self.next_seq - start))
+        self.writer = threading.Thread(target=self._write_loop, name="chat-history", daemon=True)
+        self.writer.start()
+
+    def _load(self):
+        bases = sorted(int(name[:-4]) for name in os.listdir(self.directory)
+                       if name.endswith(".log") and name[:-4].isdigit())
+        for n, base in enumerate(bases):
+            segment = Segment(self.directory, base)
+            segment.load_index()
+            segment.size = os.path.getsize(segment.log_path)
+            if n + 1 < len(bases):
+                segment.last_seq = bases[n + 1] - 1
+            else:
+                self._recover(segment)
+            self.segments.append(segment)
+
+    def _recover(self, segment: Segment):
+        # Scan the tail past the last index entry: finds the last seq, adds
+        # index entries written to the log but not the index, trims a torn line
+        offset = segment.index[-1][1] if segment.index else 0
+        indexed = {seq for seq, _ in segment.index}
+        with open(segment.log_path, "rb+") as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("torn line")
+                    seq = json.loads(line)["seq"]
+                except (ValueError, KeyError, TypeError):
+                    log.warning("Truncating %s at byte %d", segment.log_path, offset)
+                    f.truncate(offset)
+                    break
+                if (seq - segment.base) % INDEX_INTERVAL == 0 and seq not in indexed:
+                    segment.index.append((seq, offset))
+                segment.last_seq = seq
+                offset += len(line)
+        segment.size = offset
+        with open(segment.index_path, "wb") as f:
+            f.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in segment.index))
+
+    def _open_files(self, segment: Segment):
+        self.log = open(segment.log_path, "ab")
+        self.index_file = open(segment.index_path, "ab")
+
+    def _open_segment(self, base: int):
+        if self.log:
+            self.log.close()
+            self.index_file.close()
+        segment = Segment(self.directory, base)
+        self.segments.append(segment)
+        self._open_files(segment)
+        while len(self.segments) > self.max_segments:
+            oldest = self.segments.pop(0)
+            for path in (oldest.log_path, oldest.index_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    @property
+    def first_seq(self) -> int:
+        return self.segments[0].base if self.segments else self.next_seq
+
+    @property
+    def last_seq(self) -> int:
+        return self.next_seq - 1
+
+    def record(self, message: Dict) -> Dict:
+        """Assign the next seq, queue it for disk, and return the message with its ``seq``"""
+        with self.lock:
+            entry = {**message, "seq": self.next_seq}
+            self.pending.append((self.next_seq, (encode_message(entry) + "\n").encode()))
+            self.ring.append(entry)
+            self.next_seq += 1
+            self.wakeup.notify()
+            return entry
+
+    def _write_loop(self):
+        while True:
+            with self.lock:
+                while not self.pending and not self.closing:
+                    self.wakeup.wait()
+                batch, self.pending = self.pending, []
+            if not batch:
+                return
+            try:
+                self._append(batch)
+            except OSError as e:
+                log.error("Failed to write %d messages: %s", len(batch), e)
+
+    def _append(self, batch: List[Tuple[int, bytes]]):
+        # Only this thread writes; the lock guards what readers look at
+        segment = self.segments[-1]
+        new_index: List[Tuple[int, int]] = []
+        for seq, line in batch:
+            if segment.size and segment.size + len(line) > self.segment_bytes:
+                self._flush(segment, new_index)
+                new_index = []
+                with self.lock:
+                    self._open_segment(seq)
+                    segment = self.segments[-1]
+            if (seq - segment.base) % INDEX_INTERVAL == 0:
+                new_index.append((seq, segment.size))
+                self.index_file.write(INDEX_ENTRY.pack(seq, segment.size))
+            self.log.write(line)
+            segment.size += len(line)
+            segment.last_seq = seq
+        self._flush(segment, new_index)
+
+    def _flush(self, segment: Segment, new_index: List[Tuple[int, int]]):
+        self.log.flush()
+        self.index_file.flush()
+        with self.lock:
+            segment.index.extend(new_index)
+
+    def since(self, seq: int, limit: int = PAGE_LIMIT) -> List[Dict]:
+        """Up to ``limit`` messages after ``seq``, oldest first"""
+        with self.lock:
+            start = max(seq + 1, self.first_seq)
+            count = min(limit, self.next_seq - start)
+        return self._read(start, count)
+
+    def page(self, before: Optional[int] = None, limit: int = PAGE_LIMIT) -> List[Dict]:
+        """The ``limit`` messages just before ``before`` (default: the newest), oldest first"""
+        with self.lock:
+            end = min(before, self.next_seq) if before is not None else self.next_seq
+            start = max(self.first_seq, end - limit)
+        return self._read(start, end - start)
+
+    def _read(self, start: int, count: int) -> List[Dict]:
+        if count <= 0:
+            return []
+        # Copy what the range needs under the lock; files are read without it
+        # so record() on the event loop never waits on disk
+        with self.lock:
+            if self.ring and start >= self.ring[0]["seq"]:
+                skip = start - self.ring[0]["seq"]
+                return list(itertools.islice(self.ring, skip, skip + count))
+            n = bisect.bisect_right([s.base for s in self.segments], start) - 1
+            files = [(s.log_path, s.offset_for(start)) for s in self.segments[max(n, 0):]]
+
+        messages: List[Dict] = []
+        for path, offset in files:
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:  # rotated away since the snapshot
+                continue
+            with f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # still being appended by the writer thread
+                    entry = json.loads(line)
+                    if entry["seq"] < start:
+                        continue
+                    messages.append(entry)
+                    if len(messages) >= count:
+                        return messages
+        return messages
+
+    def close(self):
+        with self.lock:
+            self.closing = True
+            self.wakeup.notify()
+        self.writer.join()
+        with self.lock:
+            if self.log:
+                self.log.close()
+                self.index_file.close()
+                self.log = self.index_file = None
+
+    def stats(self) -> Dict:
+        return {
+            "first_seq": self.first_seq,
+            "last_seq": self.last_seq,
+            "in_memory": len(self.ring),
+            "pending_writes": len(self.pending),
+            "segments": len(self.segments),
+            "bytes": sum(s.size for s in self.segments),
+        }
@@ -1,18 +1,29 @@
 # services/config.py
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field, fields, replace
+from typing import Dict
 import json
 import os
 
+from .log import get_logger
+from .socket_tuning import DEFAULT_PROFILES, SocketProfile
+
+log = get_logger("CONFIG")
+
 @dataclass
 class AppConfig:
     udp_port: int = 9001
-    broadcast_ip: str = "192.168.1.8"
+    broadcast_ip: str = ""  # empty: derived from the interface netmask at runtime
     audio_port: int = 5060
     video_port: int = 5056
+    socket_tuning: bool = True
+    # Per-profile overrides of socket_tuning.DEFAULT_PROFILES, e.g.
+    # {"media": {"dscp": 34, "busy_poll": 0}}; a new name adds a profile
+    socket_profiles: Dict[str, Dict[str, int]] = field(default_factory=dict)
     
     @classmethod
-    def load(cls, config_file: str = "config.json") -> "AppConfig":
+    def load(cls, config_file: str = "config.json", create: bool = True) -> "AppConfig":
+        """Read ``config_file``; when it is missing, defaults are used and,
+        with ``create``, written out"""
         if os.path.exists(config_file):
             with open(config_file, 'r') as f:
                 data = json.load(f)
@@ -20,9 +31,22 @@ class AppConfig:
         else:
             # Create default config
             config = cls()
-            config.save(config_file)
+            if create:
+                config.save(config_file)
             return config
     
+    def profiles(self) -> Dict[str, SocketProfile]:
+        known = {f.name for f in fields(SocketProfile)}
+        merged = dict(DEFAULT_PROFILES)
+        for name, overrides in self.socket_profiles.items():
+            unknown = set(overrides) - known
+            if unknown:
+                log.warning("Ignoring unknown socket profile options for %s", name,
+                            options=",".join(sorted(unknown)))
+            merged[name] = replace(merged.get(name, SocketProfile()),
+                                   **{k: v for k, v in overrides.items() if k in known})
+        return merged
+    
     def save(self, config_file: str = "config.json"):
         with open(config_file, 'w') as f:
             json.dump(self.__dict__, f, indent=2)
@@ -0,0 +1,156 @@
+# services/discovery.py
+import asyncio
+import json
+import random
+import socket
+import struct
+from typing import Callable, Dict, Optional, Tuple
+
+from . import socket_tuning
+from .log import get_logger
+
+log = get_logger("DISCOVERY")
+
+MULTICAST_GROUP = "239.255.52.52"   # administratively scoped, stays on the LAN
+DISCOVERY_PORT = 9052
+AGGREGATE_RATE = 2.0     # announcements per second across the whole LAN
+MIN_INTERVAL = 5.0       # a small LAN still announces this often
+MAX_INTERVAL = 60.0      # bounds failure detection; past ~120 nodes the rate grows again
+
+Address = Tuple[str, int]
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, discovery: "Discovery"):
+        self.discovery = discovery
+
+    def datagram_received(self, data: bytes, addr: Address):
+        self.discovery.on_datagram(data, addr)
+
+    def error_received(self, exc):
+        log.debug("Socket error: %s", exc)
+
+
+class Discovery:
+    """Announces this node on a multicast group and reports other nodes'
+    announcements.
+
+    Every node sets its interval to ``nodes / AGGREGATE_RATE`` from the
+    size of its own peer table. Nodes that see the same LAN agree on that
+    size, so together they send about ``AGGREGATE_RATE`` announcements per
+    second however many nodes there are. Each announcement carries the
+    interval as ``every``, so receivers can scale their liveness timeouts
+    to it. The interval is jittered by ±50% so nodes that start together
+    do not stay in lockstep.
+
+    ``announcement(interval)`` builds the message to send.
+    ``on_announce(message, addr)`` is called for each one received.
+    ``node_count()`` returns the number of known peers.
+    """
+
+    def __init__(self, announcement: Callable[[float], Dict],
+                 on_announce: Callable[[Dict, Address], None],
+                 node_count: Callable[[], int],
+                 group: str = MULTICAST_GROUP, port: int = DISCOVERY_PORT,
+                 aggregate_rate: float = AGGREGATE_RATE,
+                 min_interval: float = MIN_INTERVAL, max_interval: float = MAX_INTERVAL):
+        self.announcement = announcement
+        self.on_announce = on_announce
+        self.node_count = node_count
+        self.group = group
+        self.port = port
+        self.aggregate_rate = aggregate_rate
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.task: Optional[asyncio.Task] = None
+        self.counters = {"sent": 0, "received": 0, "malformed": 0, "send_errors": 0}
+
+    @property
+    def running(self) -> bool:
+        return self.transport is not None
+
+    def interval(self) -> float:
+        nodes = self.node_count() + 1
+        return min(self.max_interval, max(self.min_interval, nodes / self.aggregate_rate))
+
+    def _open_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            # Every node on a host binds the same group port
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, "SO_REUSEPORT"):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(("", self.port))
+            membership = struct.pack("4s4s", socket.inet_aton(self.group), socket.inet_aton("0.0.0.0"))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            socket_tuning.tune(sock, "signaling", "discovery")
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    async def start(self) -> bool:
+        """Join the group and start announcing; False if multicast is unavailable"""
+        try:
+            sock = self._open_socket()
+        except OSError as e:
+            log.info("Multicast discovery unavailable on %s:%d: %s", self.group, self.port, e)
+            return False
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: _Protocol(self), sock=sock)
+        self.task = loop.create_task(self._announce_loop())
+        log.info("Announcing on %s:%d", self.group, self.port)
+        return True
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+
+    async def _announce_loop(self):
+        # A random first delay keeps a simultaneous start from bursting
+        await asyncio.sleep(random.uniform(0, 1))
+        while True:
+            interval = self.interval()
+            self.announce(interval)
+            await asyncio.sleep(interval * random.uniform(0.5, 1.5))
+
+    def announce(self, interval: Optional[float] = None):
+        if not self.transport:
+            return
+        message = self.announcement(interval if interval is not None else self.interval())
+        try:
+            self.transport.sendto(json.dumps(message).encode(), (self.group, self.port))
+            self.counters["sent"] += 1
+        except OSError as e:
+            self.counters["send_errors"] += 1
+            log.debug("Announcement failed: %s", e)
+
+    def on_datagram(self, data: bytes, addr: Address):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict) or message.get("type") != "announce":
+            self.counters["malformed"] += 1
+            return
+        self.counters["received"] += 1
+        try:
+            self.on_announce(message, addr)
+        except Exception as e:
+            log.warning("Failed to handle announcement from %s: %s", addr[0], e)
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "running": self.running,
+            "group": f"{self.group}:{self.port}",
+            "interval": round(self.interval(), 1),
+        }
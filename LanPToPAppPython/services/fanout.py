@@ -0,0 +1,261 @@
+# services/fanout.py
+import asyncio
+import json
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from . import metrics
+from .log import get_logger
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; stdlib json is the fallback
+    orjson = None
+
+log = get_logger("WS")
+
+QUEUE_SIZE = 256
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+COALESCE_WINDOW = 0.005   # seconds a writer waits for more messages to bundle
+MAX_BATCH = 64
+PING_INTERVAL = 15.0
+PING_TIMEOUT = 45.0       # close clients silent (no frames, no pongs) for this long
+
+fanout_seconds = metrics.histogram("metal52_ws_fanout_seconds",
+                                   "Time from publishing a message to its WebSocket send completing")
+
+
+def encode_message(message: Any) -> str:
+    """Serialize a message for the wire; strings pass through untouched"""
+    if isinstance(message, str):
+        return message
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message)
+
+
+class TokenBucket:
+    """Allows ``rate`` events per second on average with bursts up to ``burst``"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        now = now if now is not None else time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class ClientChannel:
+    """Bounded send queue plus a dedicated writer task for one WebSocket.
+
+    Queue entries are ``(text, is_json, queued_at)``. The writer takes everything that
+    arrives within ``COALESCE_WINDOW`` of the first message and sends
+    several JSON messages as one ``{"type": "batch", "messages": [...]}``
+    frame, so bursts such as ICE candidates cost one WebSocket send.
+    """
+
+    def __init__(self, hub: "FanoutHub", key: Hashable, websocket: WebSocket):
+        self.hub = hub
+        self.key = key
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(hub.queue_size)
+        self.sent = 0
+        self.frames = 0
+        self.dropped = 0
+        self.lag = 0  # messages dropped since the last successful send
+        self.last_seen = time.monotonic()
+        self.rtt_ms: Optional[float] = None
+        self.task = asyncio.create_task(self._writer())
+
+    def offer(self, text: str, is_json: bool = True) -> bool:
+        item = (text, is_json, time.perf_counter())
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.hub.policy == DISCONNECT:
+            self.hub.evict(self.key, "send queue full")
+            return False
+
+        # Drop the oldest frame so the client always converges on fresh state
+        self.queue.get_nowait()
+        self.dropped += 1
+        self.hub.dropped += 1
+        self.lag += 1
+        if self.lag > self.hub.max_lag:
+            self.hub.evict(self.key, f"{self.lag} messages behind")
+            return False
+        self.queue.put_nowait(item)
+        return True
+
+    async def _writer(self):
+        try:
+            while True:
+                items = [await self.queue.get()]
+                if self.hub.coalesce_window and self.queue.empty():
+                    await asyncio.sleep(self.hub.coalesce_window)
+                while len(items) < MAX_BATCH and not self.queue.empty():
+                    items.append(self.queue.get_nowait())
+                for text in self._frames(items):
+                    await self.websocket.send_text(text)
+                    self.frames += 1
+                now = time.perf_counter()
+                for item in items:
+                    fanout_seconds.observe(now - item[2])
+                self.sent += len(items)
+                self.lag = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.info("Failed to send to %s: %s", self.key, e)
+            if self.hub.clients.get(self.key) is self:
+                self.hub.remove(self.key)
+
+    @staticmethod
+    def _frames(items: List[Tuple[str, bool, float]]) -> List[str]:
+        # Consecutive JSON messages share a batch frame; anything else goes
+        # out on its own, in order
+        frames: List[str] = []
+        run: List[str] = []
+        for text, is_json, _ in items + [("", False, 0.0)]:
+            if is_json:
+                run.append(text)
+                continue
+            if len(run) == 1:
+                frames.append(run[0])
+            elif run:
+                frames.append('{"type":"batch","messages":[' + ",".join(run) + "]}")
+            run = []
+            if text:
+                frames.append(text)
+        return frames
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "sent": self.sent,
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "rtt_ms": self.rtt_ms,
+        }
+
+
+class FanoutHub:
+    """Encode-once broadcast to many WebSockets.
+
+    Every client gets its own bounded queue drained by its own writer task,
+    so a slow tab only ever delays itself. When a queue is full the policy
+    either drops that client's oldest pending frame (disconnecting it once it
+    falls ``max_lag`` frames behind) or disconnects it immediately.
+    ``heartbeat()`` pings every client and closes those that stop answering.
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE, policy: str = DROP_OLDEST,
+                 max_lag: Optional[int] = None, coalesce_window: float = COALESCE_WINDOW):
+        if policy not in (DROP_OLDEST, DISCONNECT):
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.max_lag = max_lag if max_lag is not None else queue_size * 4
+        self.coalesce_window = coalesce_window
+        self.clients: Dict[Hashable, ClientChannel] = {}
+        self.connections: Dict[Hashable, WebSocket] = {}
+        self.evicted = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.clients)
+
+    def add(self, key: Hashable, websocket: WebSocket) -> ClientChannel:
+        self.remove(key)
+        channel = ClientChannel(self, key, websocket)
+        self.clients[key] = channel
+        self.connections[key] = websocket
+        return channel
+
+    def remove(self, key: Hashable):
+        channel = self.clients.pop(key, None)
+        self.connections.pop(key, None)
+        if channel and channel.task is not asyncio.current_task():
+            channel.task.cancel()
+
+    def evict(self, key: Hashable, reason: str):
+        channel = self.clients.get(key)
+        if not channel:
+            return
+        log.warning("Disconnecting slow client %s: %s", key, reason)
+        self.evicted += 1
+        self.remove(key)
+        asyncio.create_task(self._close(channel.websocket))
+
+    async def _close(self, websocket: WebSocket, code: int = 1013):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def touch(self, key: Hashable):
+        """Any frame from the client proves it is alive"""
+        channel = self.clients.get(key)
+        if channel:
+            channel.last_seen = time.monotonic()
+
+    def pong(self, key: Hashable, sent_ms):
+        channel = self.clients.get(key)
+        if channel and isinstance(sent_ms, (int, float)):
+            channel.rtt_ms = round(time.monotonic() * 1000 - sent_ms, 1)
+
+    async def heartbeat(self, interval: float = PING_INTERVAL, timeout: float = PING_TIMEOUT):
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for key, channel in list(self.clients.items()):
+                if now - channel.last_seen > timeout:
+                    log.info("Closing unresponsive client %s", key)
+                    self.remove(key)
+                    asyncio.create_task(self._close(channel.websocket, 1001))
+                else:
+                    channel.offer(encode_message({"type": "ping", "t": round(now * 1000)}))
+
+    def send(self, key: Hashable, message: Any) -> bool:
+        channel = self.clients.get(key)
+        if not channel:
+            return False
+        return channel.offer(encode_message(message), not isinstance(message, str))
+
+    def publish(self, message: Any) -> int:
+        """Queue ``message`` for every client; returns how many accepted it"""
+        if not self.clients:
+            return 0
+        text = encode_message(message)
+        is_json = not isinstance(message, str)
+        delivered = 0
+        for channel in list(self.clients.values()):
+            if channel.offer(text, is_json):
+                delivered += 1
+        return delivered
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {str(key): channel.queue.qsize() for key, channel in self.clients.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": {str(key): channel.stats() for key, channel in self.clients.items()},
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "evicted": self.evicted,
+            "dropped": self.dropped,
+        }
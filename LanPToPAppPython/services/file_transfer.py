@@ -0,0 +1,374 @@
+# services/file_transfer.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from . import tcp_helper
+from .log import get_logger
+from .tcp_helper import read_frame, write_frame
+from .websocket_manager import broadcast
+
+log = get_logger("FILE")
+
+CHUNK_SIZE = 1024 * 1024
+WRITE_BATCH = 1024 * 1024
+RECV_PIECE = 256 * 1024
+MAX_FILE_SIZE = 4 * 1024 ** 3
+PARALLEL_STREAMS = 4
+FILE_ID = re.compile(r"[0-9a-f]{32}")
+
+# Incomplete transfers offered by peers, per sender and in total; one that
+# has made no progress for TRANSFER_IDLE seconds is discarded to make room
+MAX_OPEN_TRANSFERS = 16
+MAX_OPEN_PER_PEER = 4
+MAX_OPEN_BYTES = 16 * 1024 ** 3
+MAX_OPEN_BYTES_PER_PEER = 8 * 1024 ** 3
+TRANSFER_IDLE = 600
+
+# TCP frame kinds used by node-to-node transfers (0 is tcp_helper's plain message)
+KIND_FILE_OFFER = 1
+KIND_FILE_STATE = 2
+KIND_FILE_CHUNK = 3
+KIND_FILE_ACK = 4
+
+
+class TransferError(Exception):
+    pass
+
+
+def valid_id(file_id) -> bool:
+    """File ids are uuid4 hex; anything else could point outside the store"""
+    return isinstance(file_id, str) and FILE_ID.fullmatch(file_id) is not None
+
+
+def _safe_name(name: str) -> str:
+    name = os.path.basename(name or "file")
+    return re.sub(r"[^\w.\- ]", "_", name)[:200] or "file"
+
+
+class FileStore:
+    """Files on disk plus a JSON sidecar per file recording which chunks are
+    present and their SHA-256, so uploads and transfers can resume."""
+
+    def __init__(self, directory: str, chunk_size: int = CHUNK_SIZE):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.files: Dict[str, Dict] = {}
+        self.mtimes: Dict[str, int] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """(Re)read sidecars that are new or changed on disk; under several
+        workers another process may have created or advanced a file"""
+        for entry in os.listdir(self.directory):
+            if entry.endswith(".json") and valid_id(entry[:-5]):
+                self._load_one(entry[:-5])
+
+    def _load_one(self, file_id: str) -> Optional[Dict]:
+        if not valid_id(file_id):
+            return None
+        sidecar = os.path.join(self.directory, f"{file_id}.json")
+        try:
+            mtime = os.stat(sidecar).st_mtime_ns
+            if self.mtimes.get(file_id) == mtime:
+                return self.files.get(file_id)
+            with open(sidecar) as f:
+                meta = json.load(f)
+            self.files[meta["id"]] = meta
+            self.mtimes[meta["id"]] = mtime
+            return meta
+        except (OSError, ValueError, KeyError):
+            return self.files.get(file_id)
+
+    def refresh(self):
+        self._load()
+
+    def path(self, file_id: str) -> str:
+        if not valid_id(file_id):
+            raise KeyError(file_id)
+        return os.path.join(self.directory, f"{file_id}.bin")
+
+    def _save(self, meta: Dict):
+        tmp = os.path.join(self.directory, f"{meta['id']}.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.directory, f"{meta['id']}.json"))
+        self.mtimes[meta["id"]] = os.stat(os.path.join(self.directory, f"{meta['id']}.json")).st_mtime_ns
+
+    def create(self, name: str, size: int, file_id: Optional[str] = None,
+               chunk_size: Optional[int] = None, source: Optional[str] = None) -> Dict:
+        """New file of ``size`` bytes; ``source`` is the sending peer's IP for
+        transfers offered over TCP"""
+        if not isinstance(size, int) or isinstance(size, bool) or not 0 <= size <= MAX_FILE_SIZE:
+            raise TransferError(f"Size must be between 0 and {MAX_FILE_SIZE} bytes")
+        chunk_size = self.chunk_size if chunk_size is None else chunk_size
+        if not isinstance(chunk_size, int) or isinstance(chunk_size, bool) or chunk_size <= 0:
+            raise TransferError("Chunk size must be a positive integer")
+        if file_id is not None and not valid_id(file_id):
+            raise TransferError("Invalid file id")
+        meta = {
+            "id": file_id or uuid.uuid4().hex,
+            "name": _safe_name(name),
+            "size": size,
+            "chunk_size": chunk_size,
+            "checksums": [None] * -(-size // chunk_size),
+            "complete": size == 0,
+        }
+        if source is not None:
+            meta["source"] = source
+        with open(self.path(meta["id"]), "wb") as f:
+            f.truncate(size)
+        self.files[meta["id"]] = meta
+        self._save(meta)
+        return meta
+
+    def _discard(self, file_id: str):
+        for path in (self.path(file_id), os.path.join(self.directory, f"{file_id}.json")):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self.files.pop(file_id, None)
+        self.mtimes.pop(file_id, None)
+
+    def _admit(self, source: str, size: int, file_id: str):
+        """Refuse an offer that would take the open transfers past their caps"""
+        stale = time.time_ns() - TRANSFER_IDLE * 1_000_000_000
+        open_transfers = []
+        for meta in list(self.files.values()):
+            if "source" not in meta or meta["complete"] or meta["id"] == file_id:
+                continue
+            if self.mtimes.get(meta["id"], 0) < stale:
+                log.info("Discarding stalled transfer %s from %s", meta["id"], meta["source"])
+                self._discard(meta["id"])
+            else:
+                open_transfers.append(meta)
+        from_source = [meta for meta in open_transfers if meta["source"] == source]
+        if len(open_transfers) >= MAX_OPEN_TRANSFERS or len(from_source) >= MAX_OPEN_PER_PEER:
+            raise TransferError("Too many open transfers")
+        if (sum(meta["size"] for meta in open_transfers) + size > MAX_OPEN_BYTES
+                or sum(meta["size"] for meta in from_source) + size > MAX_OPEN_BYTES_PER_PEER):
+            raise TransferError("Open transfers would exceed the size limit")
+
+    def get(self, file_id: str) -> Dict:
+        meta = self._load_one(file_id)
+        if meta is None:
+            raise KeyError(file_id)
+        return meta
+
+    def committed_offset(self, meta: Dict) -> int:
+        """Resume point for sequential uploads: end of the complete-chunk prefix"""
+        done = 0
+        for checksum in meta["checksums"]:
+            if checksum is None:
+                break
+            done += 1
+        return min(meta["size"], done * meta["chunk_size"])
+
+    def missing_chunks(self, meta: Dict) -> List[int]:
+        return [i for i, checksum in enumerate(meta["checksums"]) if checksum is None]
+
+    def chunk_range(self, meta: Dict, index: int):
+        start = index * meta["chunk_size"]
+        return start, min(meta["chunk_size"], meta["size"] - start)
+
+    def _mark_chunk(self, meta: Dict, index: int, digest: str):
+        meta["checksums"][index] = digest
+        if all(meta["checksums"]):
+            meta["complete"] = True
+
+    def describe(self, meta: Dict) -> Dict:
+        return {
+            "id": meta["id"],
+            "name": meta["name"],
+            "size": meta["size"],
+            "chunk_size": meta["chunk_size"],
+            "offset": self.committed_offset(meta),
+            "missing_chunks": len(self.missing_chunks(meta)),
+            "complete": meta["complete"],
+        }
+
+    async def write_stream(self, file_id: str, offset: int, stream: AsyncIterator[bytes]) -> Dict:
+        """Append an HTTP body at ``offset``, hashing each chunk as it completes.
+
+        Data is buffered at most WRITE_BATCH bytes at a time and written from a
+        worker thread, so the event loop never blocks on disk.
+        """
+        meta = self.get(file_id)
+        expected = self.committed_offset(meta)
+        if offset != expected:
+            raise TransferError(f"Upload must resume at offset {expected}")
+
+        chunk_size = meta["chunk_size"]
+        index = offset // chunk_size
+        hasher = hashlib.sha256()
+        pending = bytearray()
+        pending_offset = offset
+        position = offset
+
+        fd = os.open(self.path(file_id), os.O_WRONLY)
+        try:
+            async for piece in stream:
+                if position + len(piece) > meta["size"]:
+                    raise TransferError("Upload exceeds declared size")
+                view = memoryview(piece)
+                while view:
+                    room = (index + 1) * chunk_size - position
+                    part, view = view[:room], view[room:]
+                    hasher.update(part)
+                    pending += part
+                    position += len(part)
+                    if position == min(meta["size"], (index + 1) * chunk_size):
+                        await asyncio.to_thread(os.pwrite, fd, bytes(pending), pending_offset)
+                        pending_offset += len(pending)
+                        pending.clear()
+                        self._mark_chunk(meta, index, hasher.hexdigest())
+                        await asyncio.to_thread(self._save, meta)
+                        index += 1
+                        hasher = hashlib.sha256()
+                if len(pending) >= WRITE_BATCH:
+                    await asyncio.to_thread(os.pwrite, fd, bytes(pending), pending_offset)
+                    pending_offset += len(pending)
+                    pending.clear()
+        finally:
+            os.close(fd)
+
+        return self.describe(meta)
+
+    # Node-to-node transfer
+
+    async def send_to_peer(self, file_id: str, host: str, port: int,
+                           streams: int = PARALLEL_STREAMS) -> Dict:
+        meta = self.get(file_id)
+        if not meta["complete"]:
+            raise TransferError("File upload is not complete")
+
+        offer = {k: meta[k] for k in ("id", "name", "size", "chunk_size", "checksums")}
+        reader, writer = conn = await tcp_helper.pool.acquire(host, port)
+        try:
+            await write_frame(writer, KIND_FILE_OFFER, json.dumps(offer).encode())
+            kind, payload = await read_frame(reader)
+            if kind != KIND_FILE_STATE:
+                raise TransferError(f"Unexpected reply kind {kind}")
+            missing = json.loads(payload)["missing"]
+        except Exception:
+            tcp_helper.pool.release(host, port, conn, reuse=False)
+            raise
+        tcp_helper.pool.release(host, port, conn)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for index in missing:
+            queue.put_nowait(index)
+        workers = [
+            asyncio.create_task(self._send_worker(meta, host, port, queue))
+            for _ in range(max(1, min(streams, len(missing))))
+        ]
+        sent = sum(await asyncio.gather(*workers))
+        return {"id": file_id, "peer": f"{host}:{port}", "chunks_sent": sent,
+                "chunks_skipped": len(meta["checksums"]) - len(missing)}
+
+    async def _send_worker(self, meta: Dict, host: str, port: int, queue: asyncio.Queue) -> int:
+        sent = 0
+        reader, writer = conn = await tcp_helper.pool.acquire(host, port)
+        try:
+            with open(self.path(meta["id"]), "rb") as f:
+                while not queue.empty():
+                    index = queue.get_nowait()
+                    offset, length = self.chunk_range(meta, index)
+                    header = {"id": meta["id"], "index": index, "length": length,
+                              "sha256": meta["checksums"][index]}
+                    await write_frame(writer, KIND_FILE_CHUNK, json.dumps(header).encode())
+                    await tcp_helper.send_file_range(writer, f, offset, length)
+                    kind, payload = await read_frame(reader)
+                    ack = json.loads(payload)
+                    if kind != KIND_FILE_ACK or not ack.get("ok"):
+                        raise TransferError(f"Peer rejected chunk {index}: {ack.get('error')}")
+                    sent += 1
+        except Exception:
+            tcp_helper.pool.release(host, port, conn, reuse=False)
+            raise
+        tcp_helper.pool.release(host, port, conn)
+        return sent
+
+    async def handle_offer(self, payload: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        offer = json.loads(payload)
+        if not valid_id(offer.get("id")) or not isinstance(offer.get("name"), str):
+            raise ConnectionError("Invalid file offer")
+        meta = self.files.get(offer["id"])
+        if meta is None or meta["size"] != offer["size"] or meta["chunk_size"] != offer["chunk_size"]:
+            # Chunks of a different size or chunking can't be reused: start over
+            source = writer.get_extra_info("peername")[0]
+            try:
+                if not isinstance(offer.get("size"), int):
+                    raise TransferError("Size must be an integer")
+                self._admit(source, offer["size"], offer["id"])
+                meta = self.create(offer["name"], offer["size"], offer["id"], offer["chunk_size"], source)
+            except TransferError as e:
+                raise ConnectionError(f"File offer refused: {e}")
+        missing = self.missing_chunks(meta)
+        await write_frame(writer, KIND_FILE_STATE, json.dumps({"missing": missing}).encode())
+
+    async def handle_chunk(self, payload: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        header = json.loads(payload)
+        length = header["length"]
+        if not isinstance(length, int) or not 0 <= length <= MAX_FILE_SIZE:
+            raise ConnectionError("Invalid chunk length")
+        meta = self.files.get(header["id"]) if valid_id(header["id"]) else None
+        if meta is None:
+            # Consume the body to keep the stream in sync, then refuse
+            remaining = length
+            while remaining:
+                remaining -= len(await reader.readexactly(min(RECV_PIECE, remaining)))
+            await write_frame(writer, KIND_FILE_ACK, json.dumps({"ok": False, "error": "unknown file"}).encode())
+            return
+
+        index = header["index"]
+        if not isinstance(index, int) or not 0 <= index < len(meta["checksums"]):
+            raise ConnectionError(f"Chunk index {index!r} out of range")
+        offset, expected_length = self.chunk_range(meta, index)
+        if length != expected_length:
+            raise ConnectionError(f"Chunk {index} length mismatch")
+
+        hasher = hashlib.sha256()
+        fd = os.open(self.path(meta["id"]), os.O_WRONLY)
+        try:
+            position = offset
+            remaining = length
+            while remaining:
+                piece = await reader.readexactly(min(RECV_PIECE, remaining))
+                hasher.update(piece)
+                await asyncio.to_thread(os.pwrite, fd, piece, position)
+                position += len(piece)
+                remaining -= len(piece)
+        finally:
+            os.close(fd)
+
+        digest = hasher.hexdigest()
+        ok = digest == header.get("sha256")
+        if ok:
+            self._mark_chunk(meta, index, digest)
+            await asyncio.to_thread(self._save, meta)
+        await write_frame(writer, KIND_FILE_ACK, json.dumps(
+            {"ok": ok, "index": index, "error": None if ok else "checksum mismatch"}).encode())
+
+        if ok and meta["complete"]:
+            addr = writer.get_extra_info("peername")
+            log.info("Received %s (%d bytes) from %s", meta['name'], meta['size'], addr[0])
+            await broadcast({
+                "type": "file_received",
+                "file": self.describe(meta),
+                "url": f"/api/files/{meta['id']}",
+                "sender_ip": addr[0],
+                "timestamp": datetime.now().isoformat(),
+            })
+
+    def register(self):
+        tcp_helper.register_handler(KIND_FILE_OFFER, self.handle_offer)
+        tcp_helper.register_handler(KIND_FILE_CHUNK, self.handle_chunk)
@@ -0,0 +1,194 @@
+# services/fragments.py
+import struct
+import time
+from typing import Dict, List, Optional
+
+# Fragment layout: magic(2) version(1) origin(8) msg_id(4) index(2) count(2) | chunk
+MAGIC = b"MF"
+VERSION = 1
+HEADER = struct.Struct("!2sB8sIHH")
+
+# Keep every datagram under a typical 1500-byte Ethernet MTU after IP/UDP headers
+FRAGMENT_MTU = 1200
+CHUNK_SIZE = FRAGMENT_MTU - HEADER.size
+
+# Capability advertised by nodes that can reassemble fragments
+CAPABILITY = "frag1"
+
+REASSEMBLY_TTL = 5.0
+MAX_FRAGMENTS = 1024
+MAX_BYTES_PER_PEER = 512 * 1024
+MAX_BYTES_TOTAL = 8 * 1024 * 1024
+FINISHED_MEMORY = 1024
+
+
+def is_fragment(data: bytes) -> bool:
+    """Magic, version and a full header: legacy text that merely starts with "MF" is not a fragment"""
+    return len(data) >= HEADER.size and data[:2] == MAGIC and data[2] == VERSION
+
+
+class Fragmenter:
+    """Splits oversized payloads into numbered, MTU-sized fragments"""
+
+    def __init__(self, origin: str, mtu: int = FRAGMENT_MTU):
+        self.origin = bytes.fromhex(origin)[:8].ljust(8, b"\0")
+        self.chunk_size = mtu - HEADER.size
+        self.msg_id = 0
+
+    def split(self, data: bytes) -> List[bytes]:
+        count = -(-len(data) // self.chunk_size)
+        if count > MAX_FRAGMENTS:
+            raise ValueError(f"Payload of {len(data)} bytes needs {count} fragments (max {MAX_FRAGMENTS})")
+        self.msg_id = (self.msg_id + 1) & 0xFFFFFFFF
+        view = memoryview(data)
+        return [
+            HEADER.pack(MAGIC, VERSION, self.origin, self.msg_id, index, count)
+            + view[index * self.chunk_size:(index + 1) * self.chunk_size]
+            for index in range(count)
+        ]
+
+
+class Reassembler:
+    """Bounded reassembly of fragmented messages.
+
+    Partial messages live in ``buffers`` keyed by ``origin:msg_id`` in arrival
+    order (prefixed with ``s:`` for fragments that arrived sealed, so a
+    message only completes from fragments that were all sealed or all not),
+    so TTL expiry and cap-driven eviction both pop from the front.
+    Fragments may arrive in any order; duplicates and fragments of messages
+    that already completed, expired or were evicted are dropped.
+    """
+
+    def __init__(self, ttl: float = REASSEMBLY_TTL, max_per_peer: int = MAX_BYTES_PER_PEER,
+                 max_total: int = MAX_BYTES_TOTAL, buffers: Optional[Dict[str, Dict]] = None):
+        self.ttl = ttl
+        self.max_per_peer = max_per_peer
+        self.max_total = max_total
+        self.buffers: Dict[str, Dict] = buffers if buffers is not None else {}
+        self.peer_bytes: Dict[str, int] = {}
+        self.total_bytes = 0
+        self._finished: Dict[str, float] = {}  # completed or abandoned message keys
+        self.counters = {
+            "completed": 0,
+            "duplicates": 0,
+            "expired": 0,
+            "evicted": 0,
+            "rejected": 0,
+        }
+
+    def add(self, frame: bytes, peer: str, now: Optional[float] = None, sealed: bool = False) -> Optional[bytes]:
+        """Store one fragment; returns the full payload once the last piece arrives"""
+        now = now if now is not None else time.monotonic()
+        self.expire(now)
+
+        if len(frame) < HEADER.size:
+            self.counters["rejected"] += 1
+            return None
+        magic, version, origin, msg_id, index, count = HEADER.unpack_from(frame)
+        if magic != MAGIC or version != VERSION or not 0 < count <= MAX_FRAGMENTS or index >= count:
+            self.counters["rejected"] += 1
+            return None
+
+        key = f"{'s:' if sealed else ''}{origin.hex()}:{msg_id}"
+        if key in self._finished:
+            self.counters["duplicates"] += 1
+            return None
+
+        chunk = frame[HEADER.size:]
+        entry = self.buffers.get(key)
+        if entry is None:
+            entry = {
+                "peer": peer,
+                "count": count,
+                "parts": [None] * count,
+                "received": 0,
+                "bytes": 0,
+                "created": now,
+            }
+            self.buffers[key] = entry
+        elif entry["count"] != count or entry["peer"] != peer:
+            self.counters["rejected"] += 1
+            return None
+
+        if entry["parts"][index] is not None:
+            self.counters["duplicates"] += 1
+            return None
+
+        if not self._reserve(peer, len(chunk), key, now):
+            # Over the memory cap: give up on the whole message and ignore its stragglers
+            self.counters["rejected"] += 1
+            self._drop(key)
+            self._finish(key, now)
+            return None
+
+        entry["parts"][index] = chunk
+        entry["received"] += 1
+        entry["bytes"] += len(chunk)
+        if entry["received"] < count:
+            return None
+
+        self._drop(key)
+        self._finish(key, now)
+        self.counters["completed"] += 1
+        return b"".join(entry["parts"])
+
+    def _finish(self, key: str, now: float):
+        self._finished[key] = now
+        if len(self._finished) > FINISHED_MEMORY:
+            del self._finished[next(iter(self._finished))]
+
+    def _reserve(self, peer: str, size: int, key: str, now: float) -> bool:
+        if size > self.max_per_peer:
+            return False
+        # Evict this peer's oldest partials first, then anyone's, to make room
+        while self.peer_bytes.get(peer, 0) + size > self.max_per_peer:
+            victim = next((k for k, e in self.buffers.items() if e["peer"] == peer and k != key), None)
+            if victim is None:
+                return False
+            self._drop(victim)
+            self._finish(victim, now)
+            self.counters["evicted"] += 1
+        while self.total_bytes + size > self.max_total:
+            victim = next((k for k in self.buffers if k != key), None)
+            if victim is None:
+                return False
+            self._drop(victim)
+            self._finish(victim, now)
+            self.counters["evicted"] += 1
+        self.peer_bytes[peer] = self.peer_bytes.get(peer, 0) + size
+        self.total_bytes += size
+        return True
+
+    def _drop(self, key: str):
+        entry = self.buffers.pop(key, None)
+        if not entry:
+            return
+        peer = entry["peer"]
+        remaining = self.peer_bytes.get(peer, 0) - entry["bytes"]
+        if remaining > 0:
+            self.peer_bytes[peer] = remaining
+        else:
+            self.peer_bytes.pop(peer, None)
+        self.total_bytes -= entry["bytes"]
+
+    def expire(self, now: Optional[float] = None):
+        now = now if now is not None else time.monotonic()
+        while self.buffers:
+            key, entry = next(iter(self.buffers.items()))
+            if now - entry["created"] < self.ttl:
+                break
+            self._drop(key)
+            self._finish(key, now)
+            self.counters["expired"] += 1
+        while self._finished:
+            key, finished = next(iter(self._finished.items()))
+            if now - finished < self.ttl:
+                break
+            del self._finished[key]
+
+    def stats(self) -> Dict:
+        return {
+            "pending": len(self.buffers),
+            "buffered_bytes": self.total_bytes,
+            **self.counters,
+        }
@@ -0,0 +1,110 @@
+# services/gossip.py
+import random
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from .peers import PeerTable
+
+DEFAULT_TTL = 4           # hops a message may travel beyond its author
+DEFAULT_FANOUT = 3        # peers each relay forwards to; 0 means every peer
+SEEN_WINDOW = 300.0       # seconds a message id is remembered
+SEEN_CAPACITY = 10000
+
+
+class SeenCache:
+    """Bounded, time-windowed LRU set of message ids"""
+
+    def __init__(self, window: float = SEEN_WINDOW, capacity: int = SEEN_CAPACITY):
+        self.window = window
+        self.capacity = capacity
+        self.entries: "OrderedDict[str, float]" = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, message_id: str, now: Optional[float] = None) -> bool:
+        """Remember ``message_id``; returns False if it was already seen"""
+        now = now if now is not None else time.monotonic()
+        self.expire(now)
+        if message_id in self.entries:
+            self.entries.move_to_end(message_id)
+            self.entries[message_id] = now
+            return False
+        self.entries[message_id] = now
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return True
+
+    def expire(self, now: float):
+        while self.entries:
+            message_id, seen = next(iter(self.entries.items()))
+            if now - seen <= self.window:
+                break
+            del self.entries[message_id]
+
+
+class GossipRelay:
+    """Relays chat beyond one hop without broadcast storms.
+
+    The author stamps each message with ``gossip = {"id", "ttl", "node"}``
+    and sends it to every peer. A node that sees an id for the first time
+    delivers it locally and, while ``ttl`` remains, passes it on with
+    ``ttl - 1`` to ``fanout`` random peers other than the one it came from.
+    Repeats are recognised by id in a ``SeenCache`` and dropped, so each
+    node relays a message at most once and per-node traffic is bounded by
+    the fanout regardless of LAN size.
+
+    ``transmit(message, peer_keys)`` puts a message on the wire.
+    """
+
+    def __init__(self, node_id: int, origin: str, peers: PeerTable,
+                 transmit: Callable[[Dict, List[str]], None],
+                 fanout: int = DEFAULT_FANOUT, ttl: int = DEFAULT_TTL):
+        self.node_id = node_id
+        self.origin = origin
+        self.peers = peers
+        self.transmit = transmit
+        self.fanout = fanout
+        self.ttl = ttl
+        self.seen = SeenCache()
+        self.counter = 0
+        self.counters = {"originated": 0, "delivered": 0, "duplicates": 0, "relayed": 0, "expired": 0}
+
+    def originate(self, message: Dict) -> Dict:
+        """Stamp a message this node authored; send the result to every peer"""
+        self.counter += 1
+        message_id = f"{self.origin}:{self.counter}"
+        self.seen.add(message_id)
+        self.counters["originated"] += 1
+        return {**message, "gossip": {"id": message_id, "ttl": self.ttl, "node": self.node_id}}
+
+    def accept(self, message: Dict, peer_key: Optional[str]) -> bool:
+        """Returns True if ``message`` is new and should be delivered locally;
+        relays it onwards as a side effect"""
+        gossip = message.get("gossip")
+        if not isinstance(gossip, dict) or not isinstance(gossip.get("id"), str):
+            return True
+        if not self.seen.add(gossip["id"]):
+            self.counters["duplicates"] += 1
+            return False
+        self.counters["delivered"] += 1
+
+        ttl = gossip.get("ttl", 0)
+        if not isinstance(ttl, int) or ttl <= 0:
+            self.counters["expired"] += 1
+            return True
+        targets = self._targets(exclude=peer_key)
+        if targets:
+            self.transmit({**message, "gossip": {**gossip, "ttl": min(ttl, self.ttl) - 1}}, targets)
+            self.counters["relayed"] += 1
+        return True
+
+    def _targets(self, exclude: Optional[str]) -> List[str]:
+        candidates = [peer["id"] for peer in self.peers.select() if peer["id"] != exclude]
+        if self.fanout and len(candidates) > self.fanout:
+            return random.sample(candidates, self.fanout)
+        return candidates
+
+    def stats(self) -> Dict:
+        return {**self.counters, "seen": len(self.seen), "fanout": self.fanout, "ttl": self.ttl}
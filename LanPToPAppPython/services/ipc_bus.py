@@ -0,0 +1,276 @@
+# services/ipc_bus.py
+import asyncio
+import fcntl
+import functools
+import inspect
+import itertools
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from .fanout import encode_message
+from .log import get_logger
+from .tcp_helper import FRAME_HEADER, read_frame
+
+log = get_logger("IPC")
+
+# Frames on the bus use tcp_helper's length(4) kind(1) framing with a JSON payload
+KIND_EVENT = 1     # owner -> worker: a message for the worker's local WebSockets
+KIND_WS = 2        # worker -> owner: an inbound WebSocket frame to handle
+KIND_PUBLISH = 3   # worker -> owner: publish a message to every worker
+KIND_CALL = 4      # worker -> owner: run a registered owner call
+KIND_REPLY = 5     # owner -> worker: result of a call
+
+MAX_BACKLOG = 4 * 1024 * 1024   # a worker this far behind is dropped and reconnects
+CALL_TIMEOUT = 10.0
+RECONNECT_DELAY = 0.5
+
+# BusServer in the worker that owns the node's sockets, BusClient in the others; set by main.py
+bus = None
+calls: Dict[str, Callable] = {}
+threaded: Set[str] = set()
+
+
+def acquire_ownership(path: str) -> Optional[int]:
+    """Try to become the owner worker; returns the held lock's fd, or None"""
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def is_owner() -> bool:
+    return bus is None or bus.owner
+
+
+async def run_call(name: str, args: Dict) -> Any:
+    func = calls[name]
+    if inspect.iscoroutinefunction(func):
+        return await func(**args)
+    if name in threaded:
+        return await run_in_threadpool(func, **args)
+    # Owner state (peers, channels, clients) belongs to the event loop
+    return func(**args)
+
+
+def owner_call(name: str, threadpool: bool = False):
+    """Endpoint decorator for state that lives in the owner worker: other
+    workers forward the call over the bus and return the owner's result.
+    Arguments and results must be JSON-serialisable. Sync functions run on
+    the owner's event loop unless ``threadpool`` is set, which is only for
+    disk-bound calls that touch nothing but thread-safe state."""
+    def decorate(func):
+        calls[name] = func
+        if threadpool:
+            threaded.add(name)
+
+        @functools.wraps(func)
+        async def endpoint(**kwargs):
+            if not is_owner():
+                return await bus.call(name, kwargs)
+            return await run_call(name, kwargs)
+        return endpoint
+    return decorate
+
+
+def _frame(kind: int, message: Any) -> bytes:
+    payload = encode_message(message).encode()
+    return FRAME_HEADER.pack(len(payload), kind) + payload
+
+
+class BusServer:
+    """Owner side: fans published messages out to every worker and serves
+    their forwarded WebSocket frames, publishes and calls"""
+
+    owner = True
+
+    def __init__(self, path: str, on_ws: Callable[[str, Dict], None], on_publish: Callable[[Any], None]):
+        self.path = path
+        self.on_ws = on_ws
+        self.on_publish = on_publish
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.workers: Set[asyncio.StreamWriter] = set()
+        self.dropped_workers = 0
+
+    async def start(self):
+        # We hold the ownership lock, so any socket file left here is stale
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._serve, self.path)
+        log.info("Owner worker %d serving the bus at %s", os.getpid(), self.path)
+
+    def publish(self, message: Any):
+        if not self.workers:
+            return
+        frame = _frame(KIND_EVENT, message)
+        for writer in list(self.workers):
+            if writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                log.warning("Dropping a worker that stopped reading the bus")
+                self.dropped_workers += 1
+                self.workers.discard(writer)
+                writer.close()
+                continue
+            writer.write(frame)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.workers.add(writer)
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                message = json.loads(payload)
+                if kind == KIND_WS:
+                    try:
+                        self.on_ws(message["conn"], message["data"])
+                    except Exception as e:
+                        log.warning("Failed to handle forwarded WebSocket frame: %s", e)
+                elif kind == KIND_PUBLISH:
+                    try:
+                        self.on_publish(message["message"])
+                    except Exception as e:
+                        log.warning("Failed to publish forwarded message: %s", e)
+                elif kind == KIND_CALL:
+                    asyncio.create_task(self._call(writer, message))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            log.warning("Closing worker connection: %s", e)
+        finally:
+            self.workers.discard(writer)
+            writer.close()
+
+    async def _call(self, writer: asyncio.StreamWriter, message: Dict):
+        try:
+            reply = {"id": message["id"], "result": await run_call(message["name"], message["args"])}
+        except HTTPException as e:
+            reply = {"id": message["id"], "status": e.status_code, "detail": e.detail}
+        except Exception as e:
+            reply = {"id": message["id"], "status": 500, "detail": str(e)}
+        if not writer.is_closing():
+            writer.write(_frame(KIND_REPLY, reply))
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            for writer in list(self.workers):
+                writer.close()
+            await self.server.wait_closed()
+            self.server = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict:
+        return {"role": "owner", "pid": os.getpid(), "workers": len(self.workers),
+                "dropped_workers": self.dropped_workers}
+
+
+class BusClient:
+    """Worker side: receives the owner's events and forwards frames, publishes
+    and calls to it. When the owner goes away, ``on_orphaned()`` gets a chance
+    to take ownership; it returns True if this worker became the owner."""
+
+    owner = False
+
+    def __init__(self, path: str, on_event: Callable[[Any], None],
+                 on_orphaned: Callable[[], Awaitable[bool]]):
+        self.path = path
+        self.on_event = on_event
+        self.on_orphaned = on_orphaned
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.ids = itertools.count(1)
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.callbacks: Dict[int, Callable[[Any], None]] = {}
+        self.connected = asyncio.Event()
+        self.reconnects = 0
+
+    async def run(self):
+        while True:
+            try:
+                reader, self.writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                if await self.on_orphaned():
+                    return
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            log.info("Worker %d attached to the bus", os.getpid())
+            self.connected.set()
+            try:
+                while True:
+                    kind, payload = await read_frame(reader)
+                    self._dispatch(kind, json.loads(payload))
+            except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+                pass
+            self.connected.clear()
+            self.writer.close()
+            self.writer = None
+            self.reconnects += 1
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(HTTPException(status_code=503, detail="Owner worker went away"))
+            self.pending.clear()
+            self.callbacks.clear()
+
+    def _dispatch(self, kind: int, message: Any):
+        if kind == KIND_EVENT:
+            self.on_event(message)
+        elif kind == KIND_REPLY:
+            future = self.pending.pop(message["id"], None)
+            callback = self.callbacks.pop(message["id"], None)
+            if "status" in message:
+                if future and not future.done():
+                    future.set_exception(HTTPException(status_code=message["status"], detail=message["detail"]))
+                return
+            # Runs before the next bus frame is read, so events that follow the
+            # reply on the bus are seen after the callback's effects
+            if callback:
+                callback(message["result"])
+            if future and not future.done():
+                future.set_result(message["result"])
+
+    def _send(self, kind: int, message: Any) -> bool:
+        if self.writer is None or self.writer.is_closing():
+            return False
+        self.writer.write(_frame(kind, message))
+        return True
+
+    def publish(self, message: Any):
+        # The owner records it and sends it back to every worker, this one included
+        if not self._send(KIND_PUBLISH, {"message": message}):
+            log.warning("Bus down; message not published")
+
+    def forward_ws(self, connection_id: str, data: Dict):
+        self._send(KIND_WS, {"conn": connection_id, "data": data})
+
+    async def call(self, name: str, args: Dict, on_result: Optional[Callable[[Any], None]] = None) -> Any:
+        try:
+            await asyncio.wait_for(self.connected.wait(), CALL_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Owner worker unavailable")
+        call_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[call_id] = future
+        if on_result:
+            self.callbacks[call_id] = on_result
+        self._send(KIND_CALL, {"id": call_id, "name": name, "args": args})
+        try:
+            return await asyncio.wait_for(future, CALL_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"Owner call {name} timed out")
+        finally:
+            self.pending.pop(call_id, None)
+            self.callbacks.pop(call_id, None)
+
+    async def stop(self):
+        if self.writer:
+            self.writer.close()
+
+    def stats(self) -> Dict:
+        return {"role": "worker", "pid": os.getpid(), "connected": self.connected.is_set(),
+                "reconnects": self.reconnects}
@@ -0,0 +1,132 @@
+# services/log.py
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, Tuple
+
+# LOG_LEVEL=warning silences per-message lines; debug turns on per-datagram detail
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")      # "text" ([TAG] message key=value) or "json"
+LOG_RATE = int(os.getenv("LOG_RATE", "20"))       # lines per second per message template; 0 = unlimited
+RATE_WINDOW = 1.0
+
+ROOT = "metal52"
+
+
+class RateLimit(logging.Filter):
+    """At most ``rate`` records per window for each (logger, template) pair.
+
+    Keyed by the unformatted message, so a flood of "sent to %d targets"
+    lines collapses to a few, and the first line of the next window notes
+    how many were suppressed.
+    """
+
+    def __init__(self, rate: int = LOG_RATE, window: float = RATE_WINDOW):
+        super().__init__()
+        self.rate = rate
+        self.window = window
+        self.windows: Dict[Tuple[str, str], list] = {}   # key -> [window start, count, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.rate or record.levelno >= logging.ERROR:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        state = self.windows.get(key)
+        if state is None or now - state[0] >= self.window:
+            if len(self.windows) > 4096:
+                self.windows.clear()
+            suppressed = state[2] if state else 0
+            self.windows[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if state[1] < self.rate:
+            state[1] += 1
+            return True
+        state[2] += 1
+        return False
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"[{record.name.rpartition('.')[2]}] {record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.levelno >= logging.WARNING:
+            line = f"{record.levelname} {line}"
+        if getattr(record, "suppressed", 0):
+            line += f" (+{record.suppressed} similar suppressed)"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "tag": record.name.rpartition('.')[2],
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class Logger:
+    """Thin wrapper over a stdlib logger taking structured fields as keywords:
+    ``log.debug("sent %s", kind, targets=3)``. Disabled levels return after
+    one cached check, before any formatting."""
+
+    __slots__ = ("logger",)
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def enabled(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level: int, msg: str, args, fields, exc_info=None):
+        if self.logger.isEnabledFor(level):
+            self.logger._log(level, msg, args, exc_info=exc_info, extra={"fields": fields} if fields else None)
+
+    def debug(self, msg: str, *args, **fields):
+        self._log(logging.DEBUG, msg, args, fields)
+
+    def info(self, msg: str, *args, **fields):
+        self._log(logging.INFO, msg, args, fields)
+
+    def warning(self, msg: str, *args, **fields):
+        self._log(logging.WARNING, msg, args, fields)
+
+    def error(self, msg: str, *args, exc_info=None, **fields):
+        self._log(logging.ERROR, msg, args, fields, exc_info)
+
+
+def _configure() -> logging.Logger:
+    root = logging.getLogger(ROOT)
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+        handler.addFilter(RateLimit())
+        root.addHandler(handler)
+        root.propagate = False
+    root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    return root
+
+
+def get_logger(tag: str) -> Logger:
+    """Logger whose lines are tagged ``[TAG]`` like the rest of the node's output"""
+    return Logger(_configure().getChild(tag))
+
+
+def set_level(level: str):
+    logging.getLogger(ROOT).setLevel(level.upper())
@@ -0,0 +1,29 @@
+# services/media_envelope.py
+import struct
+from typing import Optional, Tuple
+
+# Relay envelope around any media datagram (audio, video slice or report):
+# magic(2) version(1) participant(4) | inner datagram
+# Towards the relay the participant id names the sender; from the relay it
+# names the original source, so receivers can keep one stream per source.
+MAGIC = b"MX"
+VERSION = 1
+ENVELOPE = struct.Struct("!2sBI")
+
+
+def is_relayed(data: bytes) -> bool:
+    return data[:2] == MAGIC
+
+
+def wrap_header(participant: int) -> bytes:
+    return ENVELOPE.pack(MAGIC, VERSION, participant)
+
+
+def unwrap(data: bytes) -> Optional[Tuple[int, bytes]]:
+    """Returns ``(participant, inner)``, or None if the envelope is malformed"""
+    if len(data) < ENVELOPE.size:
+        return None
+    magic, version, participant = ENVELOPE.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return participant, data[ENVELOPE.size:]
@@ -1,12 +1,20 @@
 # services/media_manager.py
-import asyncio
 from dataclasses import dataclass
-from typing import Optional, Dict, Any
-import cv2
-import sounddevice as sd
-import socket
-import threading
-import numpy as np
+from typing import TYPE_CHECKING, Optional, Dict, Any, Callable, Tuple, Union
+
+from .bitrate import SessionTuner
+from .log import get_logger
+from .secure import CH_AUDIO, CH_VIDEO
+
+# The media stack (numpy, and cv2/sounddevice behind it) is imported when a
+# session starts, so text-only nodes never load it
+if TYPE_CHECKING:
+    import numpy as np
+    from .audio_pipeline import AudioReceiver, AudioSender
+    from .media_relay import MediaRelay
+    from .video_pipeline import VideoReceiver, VideoSender
+
+log = get_logger("MEDIA")
 
 @dataclass
 class MediaConfig:
@@ -16,13 +24,32 @@ class MediaConfig:
     audio_port: int = 5060
     video_port: int = 5056
     quality: int = 70        # JPEG quality
+    video_fps: int = 15
+    audio_frame: int = 320   # samples per packet (20 ms at 16 kHz)
+    audio_codec: str = "mulaw"
+    relay_audio_port: int = 5090   # MediaRelay listens here for 3+ node calls,
+    relay_video_port: int = 5091   # clear of the media ports test_launcher hands out
 
 class MediaManager:
-    def __init__(self, config: MediaConfig):
+    """Runs this node's media senders, receivers and relay.
+
+    With a ``keyring`` (``secure.KeyRing``), calls started with the peer's
+    advertised public key (``peer_pk``) are sealed end to end, and sealed
+    packets are accepted by the receivers. Relayed calls stay plaintext,
+    since the relay has to read the participant envelope.
+    """
+
+    def __init__(self, config: MediaConfig, keyring=None):
         self.config = config
-        self.audio_stream = None
-        self.video_capture = None
-        self.sockets: Dict[str, socket.socket] = {}
+        self.keyring = keyring
+        self.audio_sender: Optional["AudioSender"] = None
+        self.audio_receiver: Optional["AudioReceiver"] = None
+        self.video_sender: Optional["VideoSender"] = None
+        self.video_receiver: Optional["VideoReceiver"] = None
+        self.latest_frame: Optional["np.ndarray"] = None
+        self.latest_frames: Dict[str, "np.ndarray"] = {}
+        self.relay: Optional["MediaRelay"] = None
+        self.tuners: Dict[str, SessionTuner] = {}
         self.active_sessions: Dict[str, bool] = {
             'audio_send': False,
             'audio_recv': False,
@@ -30,50 +57,225 @@ class MediaManager:
             'video_recv': False
         }
         
-    async def start_audio_call(self, remote_ip: str) -> Dict[str, Any]:
+    async def start_call(self, remote_ip: str, audio_port: Optional[int] = None,
+                         video_port: Optional[int] = None, video: bool = False,
+                         peer_pk: Optional[str] = None, synthetic: bool = False,
+                         peer: Optional[str] = None) -> Dict[str, Any]:
+        """Both directions of a call with one peer: this node's receivers plus
+        senders to the peer's media ports. ``synthetic`` replaces the devices
+        with a tone, colour bars and a recording sink (headless nodes, tests).
+        ``peer`` names the session's tuner, so audio and video share it."""
+        source = sink = frames = None
+        if synthetic:
+            from .audio_pipeline import RecordingSink, ToneSource
+            source = ToneSource(self.config.audio_frame, self.config.audio_rate)
+            sink = RecordingSink(self.config.audio_frame, self.config.audio_rate)
+            if video:
+                from .video_pipeline import SyntheticSource
+                frames = SyntheticSource(self.config.video_width, self.config.video_height)
+        results = {
+            "audio_recv": await self.start_audio_receiver(sink=sink),
+            "audio_send": await self.start_audio_call(remote_ip, audio_port, source, peer_pk=peer_pk, peer=peer),
+        }
+        if video:
+            results["video_recv"] = await self.start_video_receiver()
+            results["video_send"] = await self.start_video_call(remote_ip, video_port, frames, peer_pk=peer_pk,
+                                                                peer=peer)
+        return results
+
+    async def start_audio_call(self, remote_ip: str, remote_port: Optional[int] = None,
+                               source=None, relay_id: Optional[int] = None,
+                               peer_pk: Optional[str] = None, peer: Optional[str] = None) -> Dict[str, Any]:
+        """Send captured audio to ``remote_ip``. ``source`` replaces the
+        microphone, e.g. with an ``audio_pipeline.ToneSource``. With
+        ``relay_id`` the audio goes to a MediaRelay at ``remote_ip`` as that
+        participant. The session tuner is ``peer``'s, or the destination
+        ``ip:port``'s."""
         if self.active_sessions['audio_send']:
             return {"error": "Audio already active"}
-            
+
+        default_port = self.config.relay_audio_port if relay_id is not None else self.config.audio_port
         try:
-            self._start_audio_sender(remote_ip)
-            printf($"remote_ip: {remote_ip}")
+            await self._start_audio_sender(remote_ip, remote_port or default_port, source, relay_id,
+                                           self._cipher(peer_pk, CH_AUDIO, relay_id), peer)
+            log.info("Sending audio to %s:%s", remote_ip, remote_port or default_port)
             self.active_sessions['audio_send'] = True
             return {"status": "success", "message": f"Audio started to {remote_ip}"}
         except Exception as e:
             return {"error": str(e)}
-    
-    def _start_audio_sender(self, remote_ip: str):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sockets['audio_send'] = sock
-        
-        def audio_callback(indata, frames, time, status):
-            if self.active_sessions['audio_send']:
-                try:
-                    sock.sendto(indata.tobytes(), (remote_ip, self.config.audio_port))
-                except Exception as e:
-                    print(f"Audio send error: {e}")
-        
-        self.audio_stream = sd.InputStream(
-            samplerate=self.config.audio_rate,
-            channels=1,
-            dtype='int16',
-            callback=audio_callback,
-            blocksize=1024
-        )
-        self.audio_stream.start()
-    
+
+    async def _start_audio_sender(self, remote_ip: str, remote_port: int, source=None,
+                                  relay_id: Optional[int] = None, cipher=None, peer: Optional[str] = None):
+        from .audio_pipeline import AudioSender, SoundDeviceSource
+        tuner = self._tuner(peer or f"{remote_ip}:{remote_port}")
+        config = tuner.config
+        if source is None:
+            source = SoundDeviceSource(config.audio_frame, config.audio_rate)
+        sender = AudioSender((remote_ip, remote_port), source, config.audio_frame, config.audio_codec,
+                             relay_id, cipher)
+        sender.tuner = tuner
+        await sender.start()
+        self.audio_sender = sender
+
+    def _cipher(self, peer_pk: Optional[str], channel: int, relay_id: Optional[int]):
+        if not (self.keyring and peer_pk) or relay_id is not None:
+            return None
+        cipher = self.keyring.channel_for(peer_pk, channel)
+        if cipher is None:
+            raise ValueError("Invalid peer public key")
+        return cipher
+
+    def _tuner(self, key: str) -> SessionTuner:
+        """Per-call copy of the config, retuned live from receiver reports"""
+        tuner = self.tuners.get(key)
+        if tuner is None:
+            tuner = self.tuners[key] = SessionTuner(self.config)
+            tuner.on_change = lambda config, changes: self._retune(key, tuner, config, changes)
+        return tuner
+
+    def _retune(self, key: str, tuner: SessionTuner, config: MediaConfig, changes: Dict[str, Any]):
+        log.info("Retuning call with %s: %s", key, changes)
+        if self.audio_sender and self.audio_sender.tuner is tuner and 'audio_frame' in changes:
+            self.audio_sender.set_frame_samples(config.audio_frame)
+        if self.video_sender and self.video_sender.tuner is tuner:
+            self.video_sender.apply_config(config)
+
+    async def start_audio_receiver(self, port: Optional[int] = None, sink=None) -> Dict[str, Any]:
+        """Play audio arriving on ``port`` through the jitter buffer"""
+        if self.active_sessions['audio_recv']:
+            return {"error": "Audio receiver already active"}
+
+        from .audio_pipeline import AudioReceiver, SoundDeviceSink
+        if sink is None:
+            sink = SoundDeviceSink(self.config.audio_frame, self.config.audio_rate)
+        receiver = AudioReceiver(port or self.config.audio_port, sink,
+                                 self.config.audio_frame, self.config.audio_rate, self.keyring)
+        try:
+            await receiver.start()
+        except Exception as e:
+            receiver.stop()
+            return {"error": str(e)}
+        self.audio_receiver = receiver
+        self.active_sessions['audio_recv'] = True
+        return {"status": "success", "message": f"Audio receiving on {receiver.port}"}
+
+    async def start_video_call(self, remote_ip: str, remote_port: Optional[int] = None,
+                               source=None, relay_id: Optional[int] = None,
+                               peer_pk: Optional[str] = None, peer: Optional[str] = None) -> Dict[str, Any]:
+        """Send camera frames to ``remote_ip``. ``source`` may be a
+        ``video_pipeline.SyntheticSource`` or a ``CaptureSource`` on a file.
+        ``relay_id`` and ``peer`` work as for ``start_audio_call``."""
+        if self.active_sessions['video_send']:
+            return {"error": "Video already active"}
+
+        from .video_pipeline import CaptureSource, VideoSender
+        default_port = self.config.relay_video_port if relay_id is not None else self.config.video_port
+        tuner = self._tuner(peer or f"{remote_ip}:{remote_port or default_port}")
+        config = tuner.config
+        try:
+            cipher = self._cipher(peer_pk, CH_VIDEO, relay_id)
+        except ValueError as e:
+            return {"error": str(e)}
+        sender = VideoSender(
+            (remote_ip, remote_port or default_port), source or CaptureSource(0),
+            config.video_width, config.video_height, config.quality, config.video_fps,
+            relay_id=relay_id, cipher=cipher)
+        sender.tuner = tuner
+        try:
+            await sender.start()
+        except Exception as e:
+            await sender.stop()
+            return {"error": str(e)}
+        self.video_sender = sender
+        self.active_sessions['video_send'] = True
+        log.info("Sending video to %s:%s", remote_ip, remote_port or default_port)
+        return {"status": "success", "message": f"Video started to {remote_ip}"}
+
+    async def start_video_receiver(self, port: Optional[int] = None,
+                                   on_frame: Optional[Callable[["np.ndarray", str], None]] = None) -> Dict[str, Any]:
+        """Receive video on ``port``; decoded frames go to ``on_frame(frame, source)``,
+        or are kept in ``latest_frames`` per source by default"""
+        if self.active_sessions['video_recv']:
+            return {"error": "Video receiver already active"}
+
+        from .video_pipeline import VideoReceiver
+        receiver = VideoReceiver(port or self.config.video_port, on_frame or self._store_frame,
+                                 keyring=self.keyring)
+        try:
+            await receiver.start()
+        except Exception as e:
+            receiver.stop()
+            return {"error": str(e)}
+        self.video_receiver = receiver
+        self.active_sessions['video_recv'] = True
+        return {"status": "success", "message": f"Video receiving on {receiver.port}"}
+
+    def _store_frame(self, frame: "np.ndarray", source: str):
+        self.latest_frames[source] = frame
+        self.latest_frame = frame
+
+    async def start_relay(self, participants: Dict[int, Union[str, Tuple[str, int, int]]],
+                          mode: str = "forward") -> Dict[str, Any]:
+        """Relay media for a 3+ node call. ``participants`` maps each
+        participant id to its IP, which receives on the configured media
+        ports, or to ``(ip, audio_port, video_port)``; they send to this node
+        with ``relay_id`` set."""
+        if self.relay:
+            return {"error": "Relay already active"}
+
+        from .media_relay import MediaRelay
+        try:
+            relay = MediaRelay(self.config.relay_audio_port, self.config.relay_video_port, mode,
+                               self.config.audio_frame, self.config.audio_rate, self.config.audio_codec)
+        except ValueError as e:
+            return {"error": str(e)}
+        for participant_id, where in participants.items():
+            if isinstance(where, str):
+                where = (where, self.config.audio_port, self.config.video_port)
+            relay.join(participant_id, *where)
+        try:
+            await relay.start()
+        except Exception as e:
+            relay.stop()
+            return {"error": str(e)}
+        self.relay = relay
+        return {"status": "success", "message": f"{mode} relay for {len(participants)} participants",
+                "audio_port": relay.audio_port, "video_port": relay.video_port}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": dict(self.active_sessions),
+            "audio_send": self.audio_sender.stats() if self.audio_sender else None,
+            "audio_recv": self.audio_receiver.stats() if self.audio_receiver else None,
+            "video_send": self.video_sender.stats() if self.video_sender else None,
+            "video_recv": self.video_receiver.stats() if self.video_receiver else None,
+            "relay": self.relay.stats() if self.relay else None,
+            "tuning": {key: tuner.stats() for key, tuner in self.tuners.items()},
+        }
+
     async def stop_all_media(self):
         # Clean shutdown of all media streams
         for session in self.active_sessions:
             self.active_sessions[session] = False
             
-        if self.audio_stream:
-            self.audio_stream.stop()
-            self.audio_stream.close()
-            
-        if self.video_capture:
-            self.video_capture.release()
+        if self.audio_sender:
+            self.audio_sender.stop()
+            self.audio_sender = None
+
+        if self.audio_receiver:
+            self.audio_receiver.stop()
+            self.audio_receiver = None
             
-        for sock in self.sockets.values():
-            sock.close()
-        self.sockets.clear()
+        if self.video_sender:
+            await self.video_sender.stop()
+            self.video_sender = None
+
+        if self.video_receiver:
+            self.video_receiver.stop()
+            self.video_receiver = None
+
+        if self.relay:
+            self.relay.stop()
+            self.relay = None
+
+        self.tuners.clear()
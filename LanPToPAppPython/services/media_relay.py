@@ -0,0 +1,259 @@
+# services/media_relay.py
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .audio_pipeline import HEADER, MAGIC, VERSION, AudioMixer, AudioStream, get_codec, parse_packet
+from .bitrate import REPORT_INTERVAL, is_report
+from .log import get_logger
+from .media_envelope import unwrap, wrap_header
+from .udp_transport import Datagram, open_udp_endpoint
+
+log = get_logger("RELAY")
+
+RELAY_MODES = ("forward", "mix")
+PARTICIPANT_TIMEOUT = 10.0   # stop mixing a participant after this long without audio
+
+
+@dataclass
+class Participant:
+    id: int
+    audio_addr: Optional[Tuple[str, int]] = None   # where this participant receives
+    video_addr: Optional[Tuple[str, int]] = None
+    audio_from: Optional[Tuple[str, int]] = None   # learned sender sockets, for reports
+    video_from: Optional[Tuple[str, int]] = None
+    stream: Optional[AudioStream] = None           # mix mode only
+    packet: Optional[bytearray] = None             # mix mode: reused outgoing packet
+    payload: Optional[np.ndarray] = None
+    seq: int = 0
+    timestamp: int = 0
+
+
+class MediaRelay:
+    """Relays media between the participants of a 3+ node call.
+
+    Every participant sends one audio and one video stream to the relay,
+    each datagram wrapped in a ``media_envelope`` naming the sender, instead
+    of sending N-1 copies itself. In ``forward`` mode the relay re-sends
+    each datagram, wrapped with the source id, to every other participant,
+    whose receivers keep one stream per source and mix locally. In ``mix``
+    mode audio is decoded through a jitter buffer per participant and each
+    participant gets a single N-1 mix (everyone but themselves) every frame
+    period; video is always forwarded. Receiver reports are routed back to
+    the source's sender socket, or generated by the relay for mixed audio.
+    """
+
+    def __init__(self, audio_port: int, video_port: int, mode: str = "forward",
+                 frame_samples: int = 320, sample_rate: int = 16000, codec_name: str = "mulaw"):
+        if mode not in RELAY_MODES:
+            raise ValueError(f"Unknown relay mode: {mode}")
+        self.audio_port = audio_port
+        self.video_port = video_port
+        self.mode = mode
+        self.frame_samples = frame_samples
+        self.sample_rate = sample_rate
+        self.codec = get_codec(codec_name)
+        self.participants: Dict[int, Participant] = {}
+        self.mixer = AudioMixer(frame_samples, 8)
+        self.frame = np.zeros(frame_samples, dtype=np.int16)
+        self.audio_transport: Optional[asyncio.DatagramTransport] = None
+        self.video_transport: Optional[asyncio.DatagramTransport] = None
+        self.tasks: List[asyncio.Task] = []
+        self.busy = 0.0
+        self.started_at: Optional[float] = None
+        self.counters = {
+            "audio_in": 0,
+            "video_in": 0,
+            "forwarded": 0,
+            "mixed_frames": 0,
+            "reports": 0,
+            "unknown": 0,
+            "rejected": 0,
+        }
+
+    def join(self, participant_id: int, ip: str, audio_port: Optional[int] = None,
+             video_port: Optional[int] = None) -> Participant:
+        """Register where ``participant_id`` receives audio and video"""
+        participant = self.participants.get(participant_id) or Participant(participant_id)
+        participant.audio_addr = (ip, audio_port) if audio_port else None
+        participant.video_addr = (ip, video_port) if video_port else None
+        if self.mode == "mix":
+            payload_bytes = self.frame_samples * self.codec.bytes_per_sample
+            participant.packet = bytearray(HEADER.size + payload_bytes)
+            participant.payload = np.frombuffer(participant.packet, dtype=np.uint8, offset=HEADER.size)
+        self.participants[participant_id] = participant
+        log.info("Participant %s joined: audio=%s video=%s", participant_id,
+                 participant.audio_addr, participant.video_addr)
+        return participant
+
+    def leave(self, participant_id: int):
+        self.participants.pop(participant_id, None)
+
+    async def start(self, host: str = "0.0.0.0"):
+        self.audio_transport, _ = await open_udp_endpoint(self.audio_port, self.on_audio_batch, host,
+                                                          profile="media", role="relay_audio")
+        self.video_transport, _ = await open_udp_endpoint(self.video_port, self.on_video_batch, host,
+                                                          profile="media", role="relay_video")
+        self.started_at = time.monotonic()
+        if self.mode == "mix":
+            self.tasks = [asyncio.create_task(self._mix_loop()), asyncio.create_task(self._report_loop())]
+        log.info("%s relay on audio %d, video %d", self.mode, self.audio_port, self.video_port)
+
+    def _sender(self, data: bytes) -> Optional[Tuple[Participant, bytes]]:
+        unwrapped = unwrap(data)
+        if unwrapped is None:
+            self.counters["rejected"] += 1
+            return None
+        participant = self.participants.get(unwrapped[0])
+        if participant is None:
+            self.counters["unknown"] += 1
+            return None
+        return participant, unwrapped[1]
+
+    def _forward(self, transport, source: Participant, inner: bytes, kind: str):
+        data = wrap_header(source.id) + inner
+        for participant in self.participants.values():
+            addr = participant.audio_addr if kind == "audio" else participant.video_addr
+            if participant is not source and addr is not None:
+                transport.sendto(data, addr)
+                self.counters["forwarded"] += 1
+
+    def _route_report(self, transport, source: Participant, inner: bytes, kind: str):
+        # A receiver's report about ``source``'s stream goes back to its sender socket
+        addr = source.audio_from if kind == "audio" else source.video_from
+        if addr is not None:
+            transport.sendto(inner, addr)
+            self.counters["reports"] += 1
+
+    def on_audio_batch(self, batch: List[Datagram]):
+        if self.audio_transport is None:
+            return  # final flush after stop()
+        started = time.perf_counter()
+        now = time.monotonic()
+        for data, addr in batch:
+            if is_report(data):
+                continue  # a participant's report on our own mix
+            found = self._sender(data)
+            if found is None:
+                continue
+            participant, inner = found
+            if is_report(inner):
+                self._route_report(self.audio_transport, participant, inner, "audio")
+                continue
+            self.counters["audio_in"] += 1
+            if participant.audio_from != addr:
+                participant.audio_from = addr
+                participant.stream = None
+            if self.mode == "forward":
+                self._forward(self.audio_transport, participant, inner, "audio")
+                continue
+            packet = parse_packet(inner)
+            if packet is None:
+                self.counters["rejected"] += 1
+                continue
+            if participant.stream is None:
+                participant.stream = AudioStream(participant.id, packet[3], self.sample_rate, addr)
+            participant.stream.put(*packet, len(inner), now)
+        self.busy += time.perf_counter() - started
+
+    def on_video_batch(self, batch: List[Datagram]):
+        if self.video_transport is None:
+            return  # final flush after stop()
+        started = time.perf_counter()
+        for data, addr in batch:
+            found = self._sender(data)
+            if found is None:
+                continue
+            participant, inner = found
+            if is_report(inner):
+                self._route_report(self.video_transport, participant, inner, "video")
+                continue
+            self.counters["video_in"] += 1
+            participant.video_from = addr
+            self._forward(self.video_transport, participant, inner, "video")
+        self.busy += time.perf_counter() - started
+
+    async def _mix_loop(self):
+        interval = self.frame_samples / self.sample_rate
+        deadline = time.monotonic()
+        while True:
+            deadline += interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                deadline = time.monotonic()
+            started = time.perf_counter()
+            self.mix_tick()
+            self.busy += time.perf_counter() - started
+
+    def mix_tick(self):
+        """Pull one frame from every talking participant and send each
+        participant the mix of everyone else"""
+        now = time.monotonic()
+        talking = [p for p in self.participants.values()
+                   if p.stream is not None and now - p.stream.last_seen < PARTICIPANT_TIMEOUT]
+        rows: Dict[int, int] = {}
+        if talking:
+            self.mixer.resize(self.frame_samples, max(len(talking), self.mixer.inputs.shape[0]))
+            for row, participant in enumerate(talking):
+                participant.stream.read(self.mixer.inputs[row])
+                rows[participant.id] = row
+        self.mixer.sum(len(talking))
+
+        frame = self.frame
+        for participant in self.participants.values():
+            if participant.audio_addr is None:
+                continue
+            row = rows.get(participant.id)
+            if row is None:
+                self.mixer.mix_all(frame)
+            else:
+                self.mixer.mix_minus(row, frame)
+            HEADER.pack_into(participant.packet, 0, MAGIC, VERSION, self.codec.codec_id,
+                             participant.seq & 0xFFFFFFFF, participant.timestamp & 0xFFFFFFFF,
+                             self.frame_samples)
+            self.codec.encode(frame, participant.payload)
+            participant.seq += 1
+            participant.timestamp += self.frame_samples
+            self.audio_transport.sendto(participant.packet, participant.audio_addr)
+        self.counters["mixed_frames"] += 1
+
+    async def _report_loop(self):
+        # Mixed audio terminates at the relay, so the relay reports on each sender's stream
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            now = time.monotonic()
+            for participant in list(self.participants.values()):
+                stream = participant.stream
+                if stream is None:
+                    continue
+                if now - stream.last_seen > PARTICIPANT_TIMEOUT:
+                    participant.stream = None
+                    continue
+                report = stream.build_report(now)
+                if report:
+                    self.audio_transport.sendto(report, stream.report_to)
+                    self.counters["reports"] += 1
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        for transport in (self.audio_transport, self.video_transport):
+            if transport:
+                transport.close()
+        self.audio_transport = self.video_transport = None
+
+    def stats(self) -> Dict:
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        return {
+            **self.counters,
+            "mode": self.mode,
+            "participants": len(self.participants),
+            "clipped_mixes": self.mixer.clipped,
+            "cpu_percent": round(self.busy / elapsed * 100, 2) if elapsed else 0.0,
+        }
@@ -0,0 +1,200 @@
+# services/metrics.py
+import bisect
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers a sub-millisecond parse up to a slow second-long round trip
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.children: Dict[LabelValues, object] = {}
+
+    def labels(self, *values):
+        """The child for these label values, created on first use; keep a
+        reference to it in hot paths rather than looking it up per event"""
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = self._child()
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {_number(value)}" for name, labels, value in self.samples()]
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        if not self.label_names:
+            self.inc = self.labels().inc
+
+    def _child(self):
+        return _CounterChild()
+
+    def samples(self):
+        for key, child in self.children.items():
+            yield self.name, _labels(self.label_names, key), child.value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.bounds = tuple(sorted(buckets))
+        if not self.label_names:
+            self.observe = self.labels().observe
+
+    def _child(self):
+        return _HistogramChild(self.bounds)
+
+    def samples(self):
+        for key, child in self.children.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), child.counts):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       _labels(self.label_names, key, f'le="{_number(bound)}"'), cumulative)
+            yield f"{self.name}_sum", _labels(self.label_names, key), child.sum
+            yield f"{self.name}_count", _labels(self.label_names, key), child.count
+
+
+class Callback(Metric):
+    """A gauge or counter read from existing state when scraped, so values
+    that are already counted elsewhere (stats() dicts) cost nothing per event.
+
+    ``read()`` returns a number, or a dict mapping label values (a tuple, or
+    a single value for one label) to numbers."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], object],
+                 labels: Sequence[str] = (), kind: str = "gauge"):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.read = read
+
+    def samples(self):
+        try:
+            value = self.read()
+        except Exception:
+            return  # the source isn't running (yet); omit the metric
+        if value is None:
+            return
+        if not isinstance(value, dict):
+            yield self.name, "", value
+            return
+        for key, v in value.items():
+            if v is None:
+                continue
+            key = key if isinstance(key, tuple) else (key,)
+            yield self.name, _labels(self.label_names, key), v
+
+
+class Registry:
+    """Metrics rendered in the Prometheus text exposition format.
+
+    Updates are plain attribute increments without locks: they happen on
+    the event loop, and a scrape racing a media thread can at worst read a
+    value one event stale.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    return registry.register(Counter(name, help, labels))
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, help, labels, buckets))
+
+
+def gauge_fn(name: str, help: str, read: Callable[[], object], labels: Sequence[str] = ()) -> Callback:
+    return registry.register(Callback(name, help, read, labels, "gauge"))
+
+
+def counter_fn(name: str, help: str, read: Callable[[], object], labels: Sequence[str] = ()) -> Callback:
+    return registry.register(Callback(name, help, read, labels, "counter"))
+
+
+def unregister(name: str) -> Optional[Metric]:
+    return registry.metrics.pop(name, None)
@@ -0,0 +1,192 @@
+# services/netinfo.py
+import asyncio
+import errno
+import ipaddress
+import socket
+import struct
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional
+
+from .log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Non-POSIX platforms fall back to the route probe only
+    fcntl = None
+
+log = get_logger("NET")
+
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891b
+
+# rtnetlink multicast groups that fire when links or IPv4 addresses change
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+
+REFRESH_INTERVAL = 60.0
+
+
+@dataclass(frozen=True)
+class InterfaceAddress:
+    name: str
+    ip: str
+    netmask: str
+
+    @property
+    def network(self) -> ipaddress.IPv4Network:
+        return ipaddress.IPv4Network(f"{self.ip}/{self.netmask}", strict=False)
+
+    @property
+    def broadcast(self) -> str:
+        return str(self.network.broadcast_address)
+
+    @property
+    def is_loopback(self) -> bool:
+        return ipaddress.IPv4Address(self.ip).is_loopback
+
+
+def _ioctl_ipv4(sock: socket.socket, request: int, ifname: str) -> Optional[str]:
+    try:
+        packed = struct.pack("256s", ifname[:15].encode())
+        result = fcntl.ioctl(sock.fileno(), request, packed)
+        return socket.inet_ntoa(result[20:24])
+    except OSError:
+        return None
+
+
+def list_interfaces() -> List[InterfaceAddress]:
+    """Enumerate IPv4 interface addresses via SIOCGIFADDR/SIOCGIFNETMASK"""
+    if fcntl is None or not hasattr(socket, "if_nameindex"):
+        return []
+
+    interfaces = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        for _, name in socket.if_nameindex():
+            ip = _ioctl_ipv4(s, SIOCGIFADDR, name)
+            if not ip:
+                continue
+            netmask = _ioctl_ipv4(s, SIOCGIFNETMASK, name) or "255.255.255.255"
+            interfaces.append(InterfaceAddress(name, ip, netmask))
+    return interfaces
+
+
+def probe_route_ip() -> Optional[str]:
+    """Address the kernel would use for the default route (no packet is sent)"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except OSError:
+        return None
+
+
+class LocalAddressRegistry:
+    """Cached view of this node's IPv4 addresses.
+
+    Lookups are plain attribute/set reads; the expensive enumeration only runs
+    on refresh(), which is driven by rtnetlink change events where available
+    and only falls back to a slow interval timer without them.
+    """
+
+    def __init__(self, refresh_interval: float = REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.interfaces: List[InterfaceAddress] = []
+        self.addresses: FrozenSet[str] = frozenset()
+        self.broadcasts: List[str] = []
+        self.primary_ip = "127.0.0.1"
+        self._netlink: Optional[socket.socket] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.refresh()
+
+    def refresh(self):
+        interfaces = list_interfaces()
+        route_ip = probe_route_ip()
+
+        # Loopback is deliberately excluded: several nodes may share 127.0.0.1
+        addresses = {i.ip for i in interfaces if not i.is_loopback}
+        if route_ip:
+            addresses.add(route_ip)
+
+        self.interfaces = interfaces
+        self.addresses = frozenset(addresses)
+        self.broadcasts = sorted({i.broadcast for i in interfaces if not i.is_loopback})
+        self.primary_ip = route_ip or next(iter(sorted(addresses)), "127.0.0.1")
+
+    def is_local(self, ip: str) -> bool:
+        return ip in self.addresses
+
+    def primary_broadcast(self) -> str:
+        """Broadcast address of the primary interface, or the limited broadcast"""
+        for interface in self.interfaces:
+            if interface.ip == self.primary_ip:
+                return interface.broadcast
+        return self.broadcasts[0] if self.broadcasts else "255.255.255.255"
+
+    def start(self):
+        """Begin tracking address changes on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if not self._open_netlink(loop):
+            self._start_polling(loop)
+
+    def _start_polling(self, loop: asyncio.AbstractEventLoop):
+        if self._refresh_task is None:
+            self._refresh_task = loop.create_task(self._refresh_periodically())
+
+    def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        self._close_netlink()
+
+    def _close_netlink(self):
+        if self._netlink:
+            try:
+                asyncio.get_running_loop().remove_reader(self._netlink.fileno())
+            except RuntimeError:
+                pass
+            self._netlink.close()
+            self._netlink = None
+
+    def _open_netlink(self, loop: asyncio.AbstractEventLoop) -> bool:
+        if not hasattr(socket, "AF_NETLINK"):
+            return False
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.setblocking(False)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+        except OSError as e:
+            log.info("Netlink unavailable, using %.0fs polling: %s", self.refresh_interval, e)
+            return False
+        self._netlink = sock
+        loop.add_reader(sock.fileno(), self._on_netlink_event)
+        return True
+
+    def _on_netlink_event(self):
+        # Only the fact that something changed matters; drain and re-enumerate
+        try:
+            while True:
+                self._netlink.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError as e:
+            if e.errno != errno.ENOBUFS:  # overrun: events were lost, the refresh covers them
+                log.info("Netlink failed, using %.0fs polling: %s", self.refresh_interval, e)
+                self._close_netlink()
+                self._start_polling(asyncio.get_running_loop())
+        self.refresh()
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            self.refresh()
+
+
+_shared_registry: Optional[LocalAddressRegistry] = None
+
+
+def get_local_addresses() -> LocalAddressRegistry:
+    """Process-wide registry, enumerated on first use"""
+    global _shared_registry
+    if _shared_registry is None:
+        _shared_registry = LocalAddressRegistry()
+    return _shared_registry
@@ -0,0 +1,150 @@
+# services/peers.py
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+HEARTBEAT_INTERVAL = 5.0
+STALE_AFTER = HEARTBEAT_INTERVAL * 3
+OFFLINE_AFTER = HEARTBEAT_INTERVAL * 12
+# Peers found by multicast discovery announce every ``every`` seconds and
+# are judged against that instead of the heartbeat interval
+STALE_ANNOUNCEMENTS = 3
+OFFLINE_ANNOUNCEMENTS = 6
+# Peers learned from traffic are forgotten this long after going quiet, and
+# the oldest learned peer makes room once the table is full; peers added by
+# hand are kept
+EVICT_AFTER = OFFLINE_AFTER * 10
+MAX_PEERS = 256
+
+
+def peer_key(ip: str, port: int) -> str:
+    return f"{ip}:{port}"
+
+
+class PeerTable:
+    """Known peers keyed by ``ip:web_port``.
+
+    Entries are the plain dicts served by the API (``peer_nodes`` in main.py);
+    liveness is tracked separately with monotonic timestamps so sweeps never
+    parse ISO strings. ``on_remove(peer)`` runs for every evicted peer.
+    """
+
+    def __init__(self, peers: Optional[Dict[str, Dict]] = None,
+                 on_remove: Optional[Callable[[Dict], None]] = None):
+        self.peers: Dict[str, Dict] = peers if peers is not None else {}
+        self.on_remove = on_remove
+        self._last_seen: Dict[str, float] = {}
+        self._announce_interval: Dict[str, float] = {}
+        self._learned: Set[str] = set()  # added by observe(), so evictable
+
+    def __len__(self):
+        return len(self.peers)
+
+    def add(self, ip: str, port: int, udp_port: int, node_id=None,
+            status: str = "connecting") -> Dict:
+        key = peer_key(ip, port)
+        peer = self.peers.get(key)
+        if peer is None:
+            peer = {
+                "id": key,
+                "ip": ip,
+                "port": port,
+                "udp_port": udp_port,
+                "node_id": None,
+                "status": status,
+                "last_seen": datetime.now().isoformat()
+            }
+            self.peers[key] = peer
+        else:
+            peer["udp_port"] = udp_port
+        if node_id is not None:
+            peer["node_id"] = str(node_id)
+        return peer
+
+    def observe(self, ip: str, udp_port: int, web_port: Optional[int] = None,
+                node_id=None, caps: Optional[Iterable[str]] = None,
+                announce_interval: Optional[float] = None, origin: Optional[str] = None) -> Tuple[Dict, bool]:
+        """Record traffic from a peer; returns the entry and whether it just came
+        online, which includes a restart (a new ``origin`` process tag) seen
+        before the peer went stale. ``announce_interval`` marks a peer heard
+        through multicast discovery"""
+        key = self._find(ip, udp_port, web_port)
+        if key is None:
+            if len(self.peers) >= MAX_PEERS:
+                self._evict_oldest()
+            peer = self.add(ip, web_port if web_port is not None else udp_port, udp_port, node_id, "online")
+            key = peer["id"]
+            self._learned.add(key)
+        peer = self.peers[key]
+        came_online = key not in self._last_seen or peer["status"] != "online"
+        if isinstance(origin, str):
+            came_online = came_online or peer.get("origin", origin) != origin
+            peer["origin"] = origin
+        peer["udp_port"] = udp_port
+        if caps is not None:
+            peer["caps"] = list(caps)
+        if node_id is not None:
+            peer["node_id"] = str(node_id)
+        peer["status"] = "online"
+        peer["last_seen"] = datetime.now().isoformat()
+        self._last_seen[key] = time.monotonic()
+        if isinstance(announce_interval, (int, float)) and announce_interval > 0:
+            self._announce_interval[key] = float(announce_interval)
+        return peer, came_online
+
+    def _find(self, ip: str, udp_port: int, web_port: Optional[int]) -> Optional[str]:
+        if web_port is not None:
+            key = peer_key(ip, web_port)
+            return key if key in self.peers else None
+        for key, peer in self.peers.items():
+            if peer["ip"] == ip and peer.get("udp_port") == udp_port:
+                return key
+        return None
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.peers.get(key)
+
+    def remove(self, key: str):
+        peer = self.peers.pop(key, None)
+        self._last_seen.pop(key, None)
+        self._announce_interval.pop(key, None)
+        self._learned.discard(key)
+        if peer and self.on_remove:
+            self.on_remove(peer)
+
+    def _evict_oldest(self):
+        if self._learned:
+            self.remove(min(self._learned, key=lambda k: self._last_seen.get(k, 0.0)))
+
+    def sweep(self, now: Optional[float] = None):
+        """Downgrade peers whose heartbeats have stopped and forget learned
+        peers that have been quiet for EVICT_AFTER"""
+        now = now if now is not None else time.monotonic()
+        for key in [k for k in self._learned if now - self._last_seen.get(k, now) > EVICT_AFTER]:
+            self.remove(key)
+        for key, peer in self.peers.items():
+            seen = self._last_seen.get(key)
+            if seen is None:
+                continue
+            idle = now - seen
+            interval = self._announce_interval.get(key, 0.0)
+            if idle > max(OFFLINE_AFTER, interval * OFFLINE_ANNOUNCEMENTS):
+                peer["status"] = "offline"
+            elif idle > max(STALE_AFTER, interval * STALE_ANNOUNCEMENTS):
+                peer["status"] = "stale"
+
+    def announced(self, key: str) -> bool:
+        """Whether the peer's own multicast announcements keep it alive"""
+        return key in self._announce_interval
+
+    def select(self, keys: Optional[Iterable[str]] = None,
+               include_offline: bool = False) -> List[Dict]:
+        """Reachable peers, optionally limited to ``keys``"""
+        if keys is None:
+            peers = self.peers.values()
+        else:
+            peers = [self.peers[k] for k in keys if k in self.peers]
+        return [
+            peer for peer in peers
+            if peer.get("udp_port") and (include_offline or peer["status"] != "offline")
+        ]
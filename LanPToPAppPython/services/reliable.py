@@ -0,0 +1,244 @@
+# services/reliable.py
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from . import metrics
+from .log import get_logger
+
+log = get_logger("REL")
+
+# Capability advertised by nodes that ACK and reorder "rel"-tagged messages
+CAPABILITY = "rel1"
+
+INITIAL_RTO = 0.5
+MIN_RTO = 0.1
+MAX_RTO = 4.0
+MAX_RETRIES = 6
+TICK = 0.05
+MAX_SACK = 32
+MAX_HOLDBACK = 64
+HOLE_TIMEOUT = 3.0  # deliver past a gap the sender has evidently given up on
+
+peer_rtt_seconds = metrics.histogram("metal52_peer_rtt_seconds",
+                                     "Round-trip time of acknowledged signaling messages", ["peer"])
+
+
+class ReliableChannel:
+    """Sender state for one destination peer: sequence numbers, unacked
+    messages and an RFC 6298 style retransmission timer."""
+
+    def __init__(self, peer_key: str = ""):
+        self.rtt_samples = peer_rtt_seconds.labels(peer_key)
+        self.session = os.urandom(4).hex()
+        self.next_seq = 1
+        self.pending: Dict[int, Dict] = {}
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.rto = INITIAL_RTO
+
+    def sample_rtt(self, rtt: float):
+        self.rtt_samples.observe(rtt)
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(MAX_RTO, max(MIN_RTO, self.srtt + max(TICK, 4 * self.rttvar)))
+
+
+class ReceiveState:
+    """Receiver state for one (peer, session) stream"""
+
+    def __init__(self, session: str):
+        self.session = session
+        self.expected = 1
+        self.holdback: Dict[int, Dict] = {}
+        self.hole_since: Optional[float] = None
+
+
+class ReliabilityLayer:
+    """Selective-ACK reliable, ordered delivery on top of plain datagrams.
+
+    ``transmit(message, peer_key)`` puts a message on the wire and
+    ``deliver(peer_key, message)`` receives in-order, de-duplicated messages.
+    Reliable messages carry ``rel = {"s": session, "n": seq}``; receivers
+    answer with ``ack = {"s": session, "c": cumulative, "sack": [...]}``.
+    """
+
+    def __init__(self, transmit: Callable[[Dict, str], None],
+                 deliver: Callable[[str, Dict], None]):
+        self.transmit = transmit
+        self.deliver = deliver
+        self.channels: Dict[str, ReliableChannel] = {}
+        self.receivers: Dict[str, ReceiveState] = {}
+        self.counters = {
+            "sent": 0,
+            "retransmits": 0,
+            "acked": 0,
+            "abandoned": 0,
+            "received": 0,
+            "duplicates": 0,
+            "reordered": 0,
+            "skipped": 0,
+        }
+
+    # Sending
+
+    def send(self, message: Dict, peer_key: str) -> int:
+        channel = self.channels.get(peer_key)
+        if channel is None:
+            channel = self.channels[peer_key] = ReliableChannel(peer_key)
+        seq = channel.next_seq
+        channel.next_seq += 1
+
+        message = {**message, "rel": {"s": channel.session, "n": seq}}
+        now = time.monotonic()
+        channel.pending[seq] = {"message": message, "sent_at": now, "retries": 0}
+        self.counters["sent"] += 1
+        self.transmit(message, peer_key)
+        return seq
+
+    def on_ack(self, peer_key: str, ack: Dict):
+        channel = self.channels.get(peer_key)
+        if channel is None or ack.get("s") != channel.session:
+            return
+        now = time.monotonic()
+        cumulative = ack.get("c", 0)
+        sacked = set(ack.get("sack", ()))
+
+        for seq in [s for s in channel.pending if s <= cumulative or s in sacked]:
+            entry = channel.pending.pop(seq)
+            self.counters["acked"] += 1
+            if entry["retries"] == 0:  # Karn: never sample retransmitted messages
+                channel.sample_rtt(now - entry["sent_at"])
+
+        # Holes below the highest SACKed seq were most likely lost: resend now
+        if sacked:
+            highest = max(sacked)
+            threshold = channel.srtt or channel.rto
+            for seq, entry in channel.pending.items():
+                if seq < highest and entry["retries"] == 0 and now - entry["sent_at"] > threshold:
+                    self._retransmit(peer_key, channel, seq, entry, now)
+
+    def _retransmit(self, peer_key: str, channel: ReliableChannel, seq: int, entry: Dict, now: float):
+        entry["retries"] += 1
+        entry["sent_at"] = now
+        self.counters["retransmits"] += 1
+        self.transmit(entry["message"], peer_key)
+
+    def check_timers(self, now: Optional[float] = None):
+        now = now if now is not None else time.monotonic()
+        for peer_key, channel in self.channels.items():
+            for seq, entry in list(channel.pending.items()):
+                timeout = min(MAX_RTO, channel.rto * (2 ** entry["retries"]))
+                if now - entry["sent_at"] < timeout:
+                    continue
+                if entry["retries"] >= MAX_RETRIES:
+                    del channel.pending[seq]
+                    self.counters["abandoned"] += 1
+                    continue
+                self._retransmit(peer_key, channel, seq, entry, now)
+
+        for peer_key, state in self.receivers.items():
+            if state.hole_since is not None and now - state.hole_since > HOLE_TIMEOUT:
+                self._skip_hole(peer_key, state, now)
+
+    # Receiving
+
+    def receive(self, peer_key: str, message: Dict):
+        rel = message.get("rel") or {}
+        session, seq = rel.get("s"), rel.get("n")
+        if not isinstance(seq, int) or session is None:
+            return
+
+        state = self.receivers.get(peer_key)
+        if state is None or state.session != session:
+            # New peer or the sender restarted: start a fresh stream
+            state = self.receivers[peer_key] = ReceiveState(session)
+
+        if seq < state.expected or seq in state.holdback:
+            self.counters["duplicates"] += 1
+        elif seq == state.expected:
+            self.counters["received"] += 1
+            self.deliver(peer_key, message)
+            state.expected += 1
+            self._drain(peer_key, state)
+        elif len(state.holdback) < MAX_HOLDBACK:
+            self.counters["received"] += 1
+            self.counters["reordered"] += 1
+            state.holdback[seq] = message
+            if state.hole_since is None:
+                state.hole_since = time.monotonic()
+
+        self._send_ack(peer_key, state)
+
+    def _drain(self, peer_key: str, state: ReceiveState):
+        while state.expected in state.holdback:
+            self.deliver(peer_key, state.holdback.pop(state.expected))
+            state.expected += 1
+        state.hole_since = time.monotonic() if state.holdback else None
+
+    def _skip_hole(self, peer_key: str, state: ReceiveState, now: float):
+        next_seq = min(state.holdback)
+        self.counters["skipped"] += next_seq - state.expected
+        state.expected = next_seq
+        self._drain(peer_key, state)
+
+    def _send_ack(self, peer_key: str, state: ReceiveState):
+        ack = {"s": state.session, "c": state.expected - 1}
+        if state.holdback:
+            ack["sack"] = sorted(state.holdback)[:MAX_SACK]
+        self.transmit({"type": "ack", "ack": ack}, peer_key)
+
+    def forget(self, peer_key: str):
+        self.channels.pop(peer_key, None)
+        self.receivers.pop(peer_key, None)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(TICK)
+            try:
+                self.check_timers()
+            except Exception as e:
+                log.error("Timer error: %s", e)
+
+    def stats(self) -> Dict:
+        sent = self.counters["sent"]
+        return {
+            **self.counters,
+            "retransmit_rate": round(self.counters["retransmits"] / sent, 4) if sent else 0.0,
+            "in_flight": sum(len(c.pending) for c in self.channels.values()),
+            "rto_ms": {key: round(c.rto * 1000, 1) for key, c in self.channels.items()},
+            "srtt_ms": {key: round(c.srtt * 1000, 2) for key, c in self.channels.items() if c.srtt is not None},
+        }
+
+
+class CallSetupTracker:
+    """Time from sending a call request until the remote answer arrives"""
+
+    def __init__(self, history: int = 100):
+        self.started_at: Optional[float] = None
+        self.samples: Deque[float] = deque(maxlen=history)
+
+    def start(self):
+        self.started_at = time.monotonic()
+
+    def complete(self):
+        if self.started_at is not None:
+            self.samples.append(time.monotonic() - self.started_at)
+            self.started_at = None
+
+    def stats(self) -> Dict:
+        if not self.samples:
+            return {"count": 0}
+        ordered: List[float] = sorted(self.samples)
+        return {
+            "count": len(ordered),
+            "last_ms": round(self.samples[-1] * 1000, 1),
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+        }
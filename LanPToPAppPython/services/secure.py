@@ -0,0 +1,414 @@
+# services/secure.py
+import asyncio
+import base64
+import hashlib
+import os
+import struct
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+    from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+except ImportError:  # cryptography is optional; without it everything stays plaintext
+    ChaCha20Poly1305 = None
+
+AVAILABLE = ChaCha20Poly1305 is not None
+CAPABILITY = "sec1"
+
+# Sealed datagram: magic(2) version(1) channel(1) sender key id(8) counter(8) | ciphertext | tag(16)
+MAGIC = b"MS"
+VERSION = 1
+HEADER = struct.Struct("!2sBB8sQ")
+COUNTER = struct.Struct("!Q")
+COUNTER_OFFSET = HEADER.size - COUNTER.size
+TAG_SIZE = 16
+OVERHEAD = HEADER.size + TAG_SIZE
+NONCE_SIZE = 12
+MAX_DATAGRAM = 65507
+
+# Channels get independent keys and counters, so senders on different
+# threads (audio capture, the event loop) never share a nonce sequence
+CH_UDP = 1
+CH_AUDIO = 2
+CH_VIDEO = 3
+CH_TCP = 4
+DATAGRAM_CHANNELS = (CH_UDP, CH_AUDIO, CH_VIDEO)
+
+REPLAY_WINDOW = 1024
+KEY_ID_SIZE = 8
+# Peer keys arrive in unauthenticated heartbeats (and TCP hellos), so the
+# caches derived from them keep only the most recently used
+MAX_PEER_KEYS = 256
+
+# TCP: length(4) | sealed record; the counter is implicit in the stream order
+RECORD_HEADER = struct.Struct("!I")
+RECORD_SIZE = 16 * 1024
+HELLO_SALT = 16
+PUBLIC_SIZE = 32
+
+# Set by main.py when encryption is enabled; tcp_helper and others read it
+keyring: Optional["KeyRing"] = None
+required = False   # refuse plaintext peers (SECURE_MODE=require)
+
+
+def is_sealed(data) -> bool:
+    return len(data) >= OVERHEAD and data[:2] == MAGIC
+
+
+def key_id(public: bytes) -> bytes:
+    return hashlib.sha256(public).digest()[:KEY_ID_SIZE]
+
+
+class ReplayWindow:
+    """Sliding bitmap of recently accepted counters (as in IPsec/DTLS)"""
+
+    __slots__ = ("size", "highest", "bitmap")
+
+    def __init__(self, size: int = REPLAY_WINDOW):
+        self.size = size
+        self.highest = 0
+        self.bitmap = 0
+
+    def check(self, counter: int) -> bool:
+        if counter > self.highest:
+            return True
+        offset = self.highest - counter
+        return offset < self.size and not (self.bitmap >> offset) & 1
+
+    def accept(self, counter: int):
+        if counter > self.highest:
+            shift = counter - self.highest
+            self.bitmap = ((self.bitmap << shift) | 1) & ((1 << self.size) - 1)
+            self.highest = counter
+        else:
+            self.bitmap |= 1 << (self.highest - counter)
+
+
+class SealedChannel:
+    """Both directions of one channel with one peer.
+
+    The header and nonce buffers are allocated once, the output buffer on
+    the first seal; sealing packs the next counter into both and, where the
+    installed cryptography supports it, encrypts straight into that reused
+    buffer. ``opened_at`` is when a datagram last authenticated. A channel
+    is used from one thread at a time.
+    """
+
+    def __init__(self, channel: int, local_id: bytes, send_key: bytes, recv_key: bytes):
+        self.channel = channel
+        self.local_id = local_id
+        self.send_aead = ChaCha20Poly1305(send_key)
+        self.recv_aead = ChaCha20Poly1305(recv_key)
+        self.counter = 0
+        self.send_nonce = bytearray(NONCE_SIZE)
+        self.recv_nonce = bytearray(NONCE_SIZE)
+        self.out: Optional[bytearray] = None
+        self.replay = ReplayWindow()
+        self.opened_at: Optional[float] = None
+        self.into = hasattr(self.send_aead, "encrypt_into")
+
+    def _allocate(self):
+        self.out = bytearray(MAX_DATAGRAM)
+        self.out_view = memoryview(self.out)
+        HEADER.pack_into(self.out, 0, MAGIC, VERSION, self.channel, self.local_id, 0)
+        self.header_view = self.out_view[:HEADER.size]
+
+    def _next(self):
+        if self.out is None:
+            self._allocate()
+        self.counter += 1
+        COUNTER.pack_into(self.out, COUNTER_OFFSET, self.counter)
+        COUNTER.pack_into(self.send_nonce, NONCE_SIZE - COUNTER.size, self.counter)
+
+    def seal_into(self, plaintext) -> memoryview:
+        """Seal into the channel's output buffer; the view is valid until the next seal"""
+        self._next()
+        end = HEADER.size + len(plaintext) + TAG_SIZE
+        if self.into:
+            self.send_aead.encrypt_into(self.send_nonce, plaintext, self.header_view,
+                                        self.out_view[HEADER.size:end])
+        else:
+            self.out[HEADER.size:end] = self.send_aead.encrypt(self.send_nonce, plaintext, self.header_view)
+        return self.out_view[:end]
+
+    def seal(self, plaintext) -> bytes:
+        return bytes(self.seal_into(plaintext))
+
+    def seal_each(self, payloads: Iterable) -> Iterator[memoryview]:
+        """Seal a batch (e.g. the slices of one video frame) through the one
+        buffer; send each view before advancing"""
+        for payload in payloads:
+            yield self.seal_into(payload)
+
+    def open(self, data, counter: int) -> Optional[bytes]:
+        if not self.replay.check(counter):
+            return None
+        COUNTER.pack_into(self.recv_nonce, NONCE_SIZE - COUNTER.size, counter)
+        view = memoryview(data)
+        try:
+            plaintext = self.recv_aead.decrypt(self.recv_nonce, view[HEADER.size:], view[:HEADER.size])
+        except InvalidTag:
+            return None
+        self.replay.accept(counter)
+        self.opened_at = time.monotonic()
+        return plaintext
+
+
+class KeyRing:
+    """This node's X25519 key pair and the sessions derived from it.
+
+    Peers learn our public key from heartbeats and announcements. The
+    X25519 exchange with a peer runs once, and its shared secret is cached.
+    Each channel's keys come from one HKDF over that secret, salted with
+    the optional pre-shared key. Only nodes holding the same
+    ``psk`` can talk, which is what authenticates peers; without a psk the
+    layer protects against eavesdropping but not an active
+    man in the middle. A new key pair is made per process, so counters
+    never repeat under a key. Peer keys, their secrets and channels are
+    kept for the ``MAX_PEER_KEYS`` most recently used peers.
+    """
+
+    def __init__(self, psk: bytes = b""):
+        if not AVAILABLE:
+            raise RuntimeError("cryptography is not installed")
+        self.psk = psk
+        self.private = X25519PrivateKey.generate()
+        self.public = self.private.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+        self.public_b64 = base64.b64encode(self.public).decode()
+        self.key_id = key_id(self.public)
+        self.known: "OrderedDict[str, bytes]" = OrderedDict()    # peer public key (base64) -> raw
+        self.by_id: Dict[bytes, str] = {}                          # peer key id -> base64 public key
+        self.secrets: "OrderedDict[bytes, bytes]" = OrderedDict()  # peer public key -> X25519 shared secret
+        self.channels: Dict[Tuple[bytes, int], SealedChannel] = {}
+        self.counters = {"sealed": 0, "opened": 0, "exchanges": 0, "unknown_key": 0,
+                         "rejected": 0, "bad_key": 0}
+
+    def learn(self, public_b64: str) -> Optional[bytes]:
+        """Record a peer's advertised public key; returns it raw, or None if malformed"""
+        public = self.known.get(public_b64)
+        if public is not None:
+            self.known.move_to_end(public_b64)
+        else:
+            try:
+                public = base64.b64decode(public_b64, validate=True)
+            except ValueError:
+                public = b""
+            try:
+                if len(public) != PUBLIC_SIZE or public == self.public:
+                    raise ValueError("Bad public key")
+                self._secret(public)   # also rejects low-order points
+            except ValueError:
+                self.counters["bad_key"] += 1
+                return None
+            self.known[public_b64] = public
+            self.by_id[key_id(public)] = public_b64
+            if len(self.known) > MAX_PEER_KEYS:
+                self._forget(next(iter(self.known)))
+        return public
+
+    def _forget(self, public_b64: str):
+        public = self.known.pop(public_b64)
+        self.by_id.pop(key_id(public), None)
+        self.secrets.pop(public, None)
+        for channel in DATAGRAM_CHANNELS:
+            self.channels.pop((public, channel), None)
+
+    def _secret(self, public: bytes) -> bytes:
+        secret = self.secrets.get(public)
+        if secret is None:
+            secret = self.private.exchange(X25519PublicKey.from_public_bytes(public))
+            self.secrets[public] = secret
+            self.counters["exchanges"] += 1
+            if len(self.secrets) > MAX_PEER_KEYS:
+                self.secrets.popitem(last=False)
+        else:
+            self.secrets.move_to_end(public)
+        return secret
+
+    def derive(self, public: bytes, channel: int, context: bytes = b"") -> Tuple[bytes, bytes]:
+        """Two 32-byte keys for (peer, channel, context): the one for the
+        lower public key's direction first"""
+        low, high = sorted((self.public, public))
+        material = HKDF(algorithm=hashes.SHA256(), length=64, salt=self.psk or None,
+                        info=b"metal52/sec1/" + bytes([channel]) + low + high + context,
+                        ).derive(self._secret(public))
+        return material[:32], material[32:]
+
+    def channel(self, public: bytes, channel: int) -> SealedChannel:
+        sealed = self.channels.get((public, channel))
+        if sealed is None:
+            low_to_high, high_to_low = self.derive(public, channel)
+            if self.public < public:
+                send_key, recv_key = low_to_high, high_to_low
+            else:
+                send_key, recv_key = high_to_low, low_to_high
+            sealed = self.channels[(public, channel)] = SealedChannel(channel, self.key_id, send_key, recv_key)
+        return sealed
+
+    def channel_for(self, public_b64: str, channel: int) -> Optional[SealedChannel]:
+        public = self.learn(public_b64)
+        return self.channel(public, channel) if public else None
+
+    def opened_since(self, public_b64: str, since: float) -> bool:
+        """Whether a datagram sealed under this peer key authenticated after ``since``"""
+        public = self.known.get(public_b64)
+        return public is not None and any(
+            sealed.opened_at is not None and sealed.opened_at > since
+            for sealed in (self.channels.get((public, channel)) for channel in DATAGRAM_CHANNELS) if sealed)
+
+    def seal(self, public_b64: str, channel: int, plaintext) -> Optional[bytes]:
+        sealed = self.channel_for(public_b64, channel)
+        if sealed is None:
+            return None
+        self.counters["sealed"] += 1
+        return sealed.seal(plaintext)
+
+    def open(self, data) -> Optional[bytes]:
+        """Plaintext of a sealed datagram, or None if it can't be authenticated"""
+        try:
+            _, version, channel, sender_id, counter = HEADER.unpack_from(data)
+        except struct.error:
+            self.counters["rejected"] += 1
+            return None
+        public_b64 = self.by_id.get(sender_id)
+        if public_b64 is None or version != VERSION:
+            # Usually a peer we haven't heard a heartbeat from yet
+            self.counters["unknown_key"] += 1
+            return None
+        if channel not in DATAGRAM_CHANNELS:
+            self.counters["rejected"] += 1
+            return None
+        self.known.move_to_end(public_b64)
+        public = self.known[public_b64]
+        plaintext = self.channel(public, channel).open(data, counter)
+        if plaintext is None:
+            self.counters["rejected"] += 1
+            return None
+        self.counters["opened"] += 1
+        return plaintext
+
+    def stats(self) -> Dict:
+        return {**self.counters, "enabled": True, "key_id": self.key_id.hex(),
+                "peers": len(self.known), "channels": len(self.channels), "psk": bool(self.psk)}
+
+
+class SecureWriter:
+    """StreamWriter stand-in that seals written bytes into records.
+
+    Writes are buffered and sealed in ``RECORD_SIZE`` records; ``drain()``
+    seals whatever is left, so framing code that drains after each frame
+    (tcp_helper.write_frame) needs no changes.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, key: bytes):
+        self.writer = writer
+        self.aead = ChaCha20Poly1305(key)
+        self.nonce = bytearray(NONCE_SIZE)
+        self.counter = 0
+        self.buffer = bytearray()
+
+    @property
+    def transport(self):
+        return self.writer.transport
+
+    def get_extra_info(self, name, default=None):
+        return self.writer.get_extra_info(name, default)
+
+    def is_closing(self) -> bool:
+        return self.writer.is_closing()
+
+    def _emit(self, size: int):
+        self.counter += 1
+        COUNTER.pack_into(self.nonce, NONCE_SIZE - COUNTER.size, self.counter)
+        length = RECORD_HEADER.pack(size + TAG_SIZE)
+        self.writer.write(length + self.aead.encrypt(self.nonce, bytes(self.buffer[:size]), length))
+        del self.buffer[:size]
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= RECORD_SIZE:
+            self._emit(RECORD_SIZE)
+
+    async def drain(self):
+        if self.buffer:
+            self._emit(len(self.buffer))
+        await self.writer.drain()
+
+    async def sendfile(self, f, offset: int, length: int):
+        """Encrypted stand-in for loop.sendfile: file reads run in a thread"""
+        loop = asyncio.get_running_loop()
+        end = offset + length
+        while offset < end:
+            size = min(RECORD_SIZE * 4, end - offset)
+            data = await loop.run_in_executor(None, os.pread, f.fileno(), size, offset)
+            if not data:
+                raise ConnectionError("File shrank during send")
+            self.write(data)
+            await self.drain()
+            offset += len(data)
+
+    def close(self):
+        if self.buffer and not self.writer.is_closing():
+            self._emit(len(self.buffer))
+        self.writer.close()
+
+    async def wait_closed(self):
+        await self.writer.wait_closed()
+
+
+class SecureReader:
+    """StreamReader stand-in that opens records from a SecureWriter"""
+
+    def __init__(self, reader: asyncio.StreamReader, key: bytes):
+        self.reader = reader
+        self.aead = ChaCha20Poly1305(key)
+        self.nonce = bytearray(NONCE_SIZE)
+        self.counter = 0
+        self.buffer = bytearray()
+
+    def at_eof(self) -> bool:
+        return not self.buffer and self.reader.at_eof()
+
+    async def _fill(self):
+        length = await self.reader.readexactly(RECORD_HEADER.size)
+        size = RECORD_HEADER.unpack(length)[0]
+        if not TAG_SIZE < size <= RECORD_SIZE + TAG_SIZE:
+            raise ValueError(f"Bad record length {size}")
+        record = await self.reader.readexactly(size)
+        self.counter += 1
+        COUNTER.pack_into(self.nonce, NONCE_SIZE - COUNTER.size, self.counter)
+        try:
+            self.buffer += self.aead.decrypt(self.nonce, record, length)
+        except InvalidTag:
+            raise ValueError("Record failed authentication")
+
+    async def readexactly(self, n: int) -> bytes:
+        while len(self.buffer) < n:
+            await self._fill()
+        data = bytes(self.buffer[:n])
+        del self.buffer[:n]
+        return data
+
+
+def hello() -> Tuple[bytes, bytes]:
+    """Client hello payload (public key + connection salt) and the salt"""
+    salt = os.urandom(HELLO_SALT)
+    return keyring.public + salt, salt
+
+
+def wrap_stream(reader, writer, public: bytes, salt: bytes, client: bool):
+    """Per-connection record keys from the cached peer secret and both
+    sides' salts (client's then server's), so a recorded session can't be
+    replayed to either end; the first key always protects client -> server"""
+    if public == keyring.public:
+        raise ValueError("Connection to self")
+    to_server, to_client = keyring.derive(public, CH_TCP, salt)
+    if client:
+        return SecureReader(reader, to_client), SecureWriter(writer, to_server)
+    return SecureReader(reader, to_server), SecureWriter(writer, to_client)
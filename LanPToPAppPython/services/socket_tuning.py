@@ -0,0 +1,180 @@
+# services/socket_tuning.py
+import os
+import socket
+import weakref
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+from .log import get_logger
+
+log = get_logger("SOCKET")
+
+# Not exported by every Python build; values are the Linux ones
+SO_PRIORITY = getattr(socket, "SO_PRIORITY", 12)
+SO_BUSY_POLL = getattr(socket, "SO_BUSY_POLL", 46)
+SO_RCVBUFFORCE = getattr(socket, "SO_RCVBUFFORCE", 33)
+SO_SNDBUFFORCE = getattr(socket, "SO_SNDBUFFORCE", 32)
+
+PROC_UDP = ("/proc/net/udp", "/proc/net/udp6")
+PROC_SNMP = "/proc/net/snmp"
+
+
+@dataclass
+class SocketProfile:
+    """Kernel options for one class of traffic; 0 leaves an option at the
+    kernel default"""
+    rcvbuf: int = 0      # bytes
+    sndbuf: int = 0
+    dscp: int = 0        # DiffServ code point (0-63), sent as TOS = dscp << 2
+    priority: int = 0    # SO_PRIORITY, the queueing band on this host (0-6 unprivileged)
+    busy_poll: int = 0   # SO_BUSY_POLL microseconds; raising it needs CAP_NET_ADMIN
+
+
+DEFAULT_PROFILES: Dict[str, SocketProfile] = {
+    # Audio/video: room for a burst of 20 ms packets, expedited forwarding
+    "media": SocketProfile(rcvbuf=512 * 1024, sndbuf=256 * 1024, dscp=46, priority=6, busy_poll=50),
+    # Chat, heartbeats and call signaling on the node's UDP port
+    "signaling": SocketProfile(rcvbuf=1024 * 1024, sndbuf=512 * 1024, dscp=24, priority=4),
+    # File transfer: low-effort marking so it yields to calls; buffers are left
+    # to TCP autotuning, which grows past anything worth fixing here
+    "bulk": SocketProfile(dscp=8, priority=1),
+    "default": SocketProfile(),
+}
+
+profiles: Dict[str, SocketProfile] = dict(DEFAULT_PROFILES)
+enabled = True
+
+
+class _Tuned:
+    __slots__ = ("sock", "profile", "errors")
+
+    def __init__(self, sock: socket.socket, profile: str, errors: Dict[str, str]):
+        try:
+            self.sock = weakref.ref(sock)
+        except TypeError:  # asyncio's TransportSocket wrappers; dropped once closed
+            self.sock = lambda: sock
+        self.profile = profile
+        self.errors = errors
+
+
+tuned: Dict[str, _Tuned] = {}
+
+
+def _set_buffer(sock: socket.socket, option: int, force: int, size: int):
+    # The FORCE variant goes past net.core.[rw]mem_max but needs CAP_NET_ADMIN
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, force, size)
+    except OSError:
+        sock.setsockopt(socket.SOL_SOCKET, option, size)
+
+
+def apply(sock: socket.socket, profile: SocketProfile) -> Dict[str, str]:
+    """Set what the profile asks for; returns the options the kernel refused"""
+    errors: Dict[str, str] = {}
+    steps = (
+        ("rcvbuf", lambda v: _set_buffer(sock, socket.SO_RCVBUF, SO_RCVBUFFORCE, v)),
+        ("sndbuf", lambda v: _set_buffer(sock, socket.SO_SNDBUF, SO_SNDBUFFORCE, v)),
+        ("dscp", lambda v: sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, v << 2)),
+        ("priority", lambda v: sock.setsockopt(socket.SOL_SOCKET, SO_PRIORITY, v)),
+        ("busy_poll", lambda v: sock.setsockopt(socket.SOL_SOCKET, SO_BUSY_POLL, v)),
+    )
+    for name, setter in steps:
+        value = getattr(profile, name)
+        if not value:
+            continue
+        try:
+            setter(value)
+        except OSError as e:
+            errors[name] = e.strerror or str(e)
+    return errors
+
+
+def tune(sock: socket.socket, profile: str, role: Optional[str] = None) -> Dict[str, str]:
+    """Apply the named profile to ``sock``; long-lived sockets pass a
+    ``role`` to be listed by ``report()``"""
+    if not enabled:
+        return {}
+    settings = profiles.get(profile)
+    if settings is None:
+        log.warning("Unknown socket profile %s for %s", profile, role)
+        return {}
+    errors = apply(sock, settings)
+    if role is None:
+        return errors
+    if errors:
+        log.info("Socket %s: %s profile partly applied", role, profile, refused=",".join(errors))
+    tuned[role] = _Tuned(sock, profile, errors)
+    return errors
+
+
+def effective(sock: socket.socket) -> Dict[str, Optional[int]]:
+    """What the kernel actually uses (buffer sizes include its 2x bookkeeping)"""
+    def read(level, option):
+        try:
+            return sock.getsockopt(level, option)
+        except OSError:
+            return None
+    tos = read(socket.IPPROTO_IP, socket.IP_TOS)
+    return {
+        "rcvbuf": read(socket.SOL_SOCKET, socket.SO_RCVBUF),
+        "sndbuf": read(socket.SOL_SOCKET, socket.SO_SNDBUF),
+        "dscp": tos >> 2 if tos is not None else None,
+        "priority": read(socket.SOL_SOCKET, SO_PRIORITY),
+        "busy_poll": read(socket.SOL_SOCKET, SO_BUSY_POLL),
+    }
+
+
+def udp_socket_stats() -> Dict[int, Dict[str, int]]:
+    """Queue depths and drop counts of every UDP socket, by inode"""
+    stats: Dict[int, Dict[str, int]] = {}
+    for path in PROC_UDP:
+        try:
+            with open(path) as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 13:
+                continue
+            tx_queue, rx_queue = fields[4].split(":")
+            stats[int(fields[9])] = {"tx_queue": int(tx_queue, 16), "rx_queue": int(rx_queue, 16),
+                                     "drops": int(fields[12])}
+    return stats
+
+
+def udp_counters() -> Dict[str, int]:
+    """Host-wide UDP counters (RcvbufErrors, SndbufErrors, InErrors, ...)"""
+    try:
+        with open(PROC_SNMP) as f:
+            rows = [line.split() for line in f if line.startswith("Udp:")]
+    except OSError:
+        return {}
+    if len(rows) < 2:
+        return {}
+    return {name: int(value) for name, value in zip(rows[0][1:], rows[1][1:])}
+
+
+def report() -> Dict:
+    udp = udp_socket_stats()
+    sockets = {}
+    for role, entry in list(tuned.items()):
+        sock = entry.sock()
+        if sock is None or sock.fileno() < 0:
+            del tuned[role]
+            continue
+        try:
+            inode = os.fstat(sock.fileno()).st_ino
+            local = sock.getsockname()
+        except OSError:
+            del tuned[role]
+            continue
+        sockets[role] = {
+            "profile": entry.profile,
+            "local": f"{local[0]}:{local[1]}",
+            "requested": asdict(profiles[entry.profile]),
+            "effective": effective(sock),
+            "refused": entry.errors,
+            "kernel": udp.get(inode) if sock.type == socket.SOCK_DGRAM else None,
+        }
+    return {"enabled": enabled, "sockets": sockets, "udp": udp_counters()}
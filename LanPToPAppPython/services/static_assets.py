@@ -0,0 +1,105 @@
+# services/static_assets.py
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Optional, Set, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip covers every browser
+    brotli = None
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"   # may be stored, but checked with If-None-Match before reuse
+MIN_COMPRESS = 256
+
+
+def accepted_encodings(request: Request) -> Set[str]:
+    accept = request.headers.get("accept-encoding", "")
+    return {token.split(";")[0].strip() for token in accept.split(",")}
+
+
+class Encoded:
+    """A response body compressed once up front, with an ETag from its hash"""
+
+    __slots__ = ("body", "gzip", "br", "media_type", "version", "etag")
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.version = hashlib.sha256(body).hexdigest()[:12]
+        self.etag = f'"{self.version}"'
+        compress = len(body) >= MIN_COMPRESS
+        self.gzip = gzip.compress(body, 9, mtime=0) if compress else None
+        self.br = brotli.compress(body) if compress and brotli else None
+
+    def response(self, request: Request, cache_control: str = REVALIDATE) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if self.etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        body = self.body
+        encodings = accepted_encodings(request)
+        if self.br and "br" in encodings:
+            body = self.br
+            headers["Content-Encoding"] = "br"
+        elif self.gzip and "gzip" in encodings:
+            body = self.gzip
+            headers["Content-Encoding"] = "gzip"
+        return Response(body, media_type=self.media_type, headers=headers)
+
+
+class StaticAssets:
+    """Files under ``directory`` served from memory, precompressed.
+
+    ``url(name)`` adds the content hash as ``?v=``; a request carrying the
+    current hash is answered as immutable, anything else revalidates by
+    ETag. Files are read on first request and re-read when their mtime
+    changes, which also gives them a new URL.
+    """
+
+    def __init__(self, directory: str, prefix: str = "/static"):
+        self.directory = os.path.realpath(directory)
+        self.prefix = prefix
+        self.files: Dict[str, Tuple[int, Encoded]] = {}
+        self.paths: Dict[str, Optional[str]] = {}
+
+    def _path(self, name: str) -> Optional[str]:
+        if name not in self.paths:
+            if len(self.paths) > 1024:
+                self.paths.clear()
+            path = os.path.realpath(os.path.join(self.directory, name))
+            self.paths[name] = path if path.startswith(self.directory + os.sep) else None
+        return self.paths[name]
+
+    def get(self, name: str) -> Optional[Encoded]:
+        path = self._path(name)
+        if path is None:
+            return None
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self.files.get(name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            encoded = Encoded(f.read(), mimetypes.guess_type(name)[0] or "application/octet-stream")
+        self.files[name] = (mtime, encoded)
+        return encoded
+
+    def url(self, name: str) -> str:
+        encoded = self.get(name)
+        return f"{self.prefix}/{name}" + (f"?v={encoded.version}" if encoded else "")
+
+    def response(self, name: str, request: Request) -> Response:
+        encoded = self.get(name)
+        if encoded is None:
+            return Response("Not Found", status_code=404, media_type="text/plain")
+        immutable = request.query_params.get("v") == encoded.version
+        return encoded.response(request, IMMUTABLE if immutable else REVALIDATE)
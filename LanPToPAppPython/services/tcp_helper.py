@@ -1,62 +1,262 @@
 # services/tcp_helper.py
 
-import socket
-import threading
 import asyncio
+import os
+import struct
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
+from . import secure, socket_tuning
+from .log import get_logger
 from .websocket_manager import broadcast
 
-server_thread = None
+log = get_logger("TCP")
+
+TCP_PORT = 9000
+
+# Every frame is length(4) kind(1) | payload
+FRAME_HEADER = struct.Struct("!IB")
+KIND_MESSAGE = 0
+# First frame of an encrypted connection: client sends public key + salt,
+# server answers with its public key + its own salt (or nothing, if it can't
+# encrypt) and then an empty sealed hello that confirms both sides derived
+# the same keys
+KIND_HELLO = 0x7F
+HELLO_TIMEOUT = 2.0
+
+MAX_FRAME = 1024 * 1024
+READ_LIMIT = 64 * 1024
+WRITE_HIGH_WATER = 256 * 1024
+
+Handler = Callable[[bytes, asyncio.StreamReader, asyncio.StreamWriter], Awaitable[None]]
+
+server: Optional[asyncio.AbstractServer] = None
 is_server_running = False
-event_loop = None  # Will be set in main.py during startup
+handlers: Dict[int, Handler] = {}
+connection_count = 0
+
+
+def register_handler(kind: int, handler: Handler):
+    """Route frames of ``kind`` to ``handler(payload, reader, writer)``"""
+    handlers[kind] = handler
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    header = await reader.readexactly(FRAME_HEADER.size)
+    length, kind = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError(f"Frame of {length} bytes exceeds {MAX_FRAME}")
+    return kind, await reader.readexactly(length)
+
+
+async def write_frame(writer: asyncio.StreamWriter, kind: int, payload: bytes):
+    writer.write(FRAME_HEADER.pack(len(payload), kind))
+    writer.write(payload)
+    await writer.drain()
 
 
-def start_server():
-    global server_thread, is_server_running
+async def handle_message(payload: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    addr = writer.get_extra_info("peername")
+    message = f"[TCP] {addr[0]}: {payload.decode('utf-8', errors='replace')}"
+    log.debug("Message from %s", addr[0], bytes=len(payload))
+    await broadcast(message)
+
+register_handler(KIND_MESSAGE, handle_message)
+
+
+async def send_file_range(writer, f, offset: int, length: int):
+    """Write ``length`` bytes of ``f`` from ``offset``; encrypted connections
+    seal them, plaintext ones use a kernel-side copy (os.sendfile) when supported"""
+    if isinstance(writer, secure.SecureWriter):
+        await writer.sendfile(f, offset, length)
+    else:
+        await asyncio.get_running_loop().sendfile(writer.transport, f, offset, length)
+
+
+async def accept_hello(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Server side of the handshake: the connection's streams from here on"""
+    kind, payload = await asyncio.wait_for(read_frame(reader), HELLO_TIMEOUT)
+    if kind != KIND_HELLO:
+        if secure.keyring and secure.required:
+            raise ConnectionError("Plaintext connection refused")
+        return reader, writer, (kind, payload)
+    public, salt = payload[:secure.PUBLIC_SIZE], payload[secure.PUBLIC_SIZE:]
+    if not secure.keyring or len(public) != secure.PUBLIC_SIZE or len(salt) != secure.HELLO_SALT:
+        await write_frame(writer, KIND_HELLO, b"")
+        return reader, writer, None
+    server_salt = os.urandom(secure.HELLO_SALT)
+    await write_frame(writer, KIND_HELLO, secure.keyring.public + server_salt)
+    reader, writer = secure.wrap_stream(reader, writer, public, salt + server_salt, client=False)
+    await write_frame(writer, KIND_HELLO, b"")
+    return reader, writer, None
+
+
+async def send_hello(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Client side of the handshake"""
+    payload, salt = secure.hello()
+    await write_frame(writer, KIND_HELLO, payload)
+    kind, reply = await asyncio.wait_for(read_frame(reader), HELLO_TIMEOUT)
+    if kind != KIND_HELLO or len(reply) != secure.PUBLIC_SIZE + secure.HELLO_SALT:
+        if secure.required:
+            raise ConnectionError("Peer does not support encryption")
+        return reader, writer
+    public, server_salt = reply[:secure.PUBLIC_SIZE], reply[secure.PUBLIC_SIZE:]
+    reader, writer = secure.wrap_stream(reader, writer, public, salt + server_salt, client=True)
+    try:
+        kind, _ = await asyncio.wait_for(read_frame(reader), HELLO_TIMEOUT)
+    except ValueError:
+        kind = None
+    if kind != KIND_HELLO:
+        raise ConnectionError("Key confirmation failed (different SECURE_PSK?)")
+    return reader, writer
+
+
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    global connection_count
+    addr = writer.get_extra_info("peername")
+    writer.transport.set_write_buffer_limits(high=WRITE_HIGH_WATER)
+    connection_count += 1
+    log.debug("Connection from %s", addr)
+    try:
+        reader, writer, first = await accept_hello(reader, writer)
+        while True:
+            kind, payload = first or await read_frame(reader)
+            first = None
+            handler = handlers.get(kind)
+            if handler is None:
+                log.warning("Unknown frame kind %d from %s", kind, addr[0])
+                continue
+            await handler(payload, reader, writer)
+    except asyncio.IncompleteReadError:
+        pass
+    except asyncio.TimeoutError:
+        log.info("Closing %s: no first frame within %.0fs", addr[0], HELLO_TIMEOUT)
+    except (ValueError, ConnectionError) as e:
+        log.info("Closing %s: %s", addr[0], e)
+    except (KeyError, TypeError) as e:
+        # A well-formed frame whose payload lacks or mistypes a field
+        log.warning("Closing %s after a malformed frame: %r", addr[0], e)
+    finally:
+        connection_count -= 1
+        writer.close()
+
+
+async def start_server(port: int = TCP_PORT, host: str = "0.0.0.0"):
+    global server, is_server_running
 
     if is_server_running:
         return {"status": "TCP server already running"}
 
-    def handle_client(conn, addr):
-        print(f"[TCP] Connection from {addr}")
-        try:
-            while True:
-                data = conn.recv(1024)
-                if not data:
-                    break
-                message = f"[TCP] {addr[0]}: {data.decode()}"
-                print(message)
-
-                # Broadcast to WebSocket clients using thread-safe method
-                if event_loop and event_loop.is_running():
-                    asyncio.run_coroutine_threadsafe(broadcast(message), event_loop)
-
-                conn.sendall(b"ACK")  # Optional: echo or ACK
-        finally:
-            conn.close()
-
-    def server_loop():
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.bind(("0.0.0.0", 9000))
-            s.listen()
-            print("[TCP] Server started on port 9000")
-            while True:
-                conn, addr = s.accept()
-                threading.Thread(target=handle_client, args=(conn, addr), daemon=True).start()
-
-    server_thread = threading.Thread(target=server_loop, daemon=True)
-    server_thread.start()
+    try:
+        server = await asyncio.start_server(handle_client, host, port, limit=READ_LIMIT)
+    except OSError as e:
+        log.error("Failed to start server on port %d: %s", port, e)
+        return {"status": "Error", "detail": str(e)}
+    # Accepted connections inherit the listening socket's options
+    for sock in server.sockets:
+        socket_tuning.tune(sock, "bulk", f"tcp_listen:{port}")
     is_server_running = True
+    log.info("Server started on port %d", port)
+
+    return {"status": "TCP server started", "port": port}
+
+
+async def stop_server():
+    global server, is_server_running
+    if server:
+        server.close()
+        await server.wait_closed()
+        server = None
+    is_server_running = False
+    await pool.close_all()
+
+
+class ConnectionPool:
+    """Reusable outbound connections, keyed by ``(host, port)``"""
 
-    return {"status": "TCP server started"}
+    def __init__(self, max_per_peer: int = 4):
+        self.max_per_peer = max_per_peer
+        self.idle: Dict[Tuple[str, int], List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+        self.limits: Dict[Tuple[str, int], asyncio.Semaphore] = {}
+        self.opened = 0
+        self.sealed = 0
 
+    async def acquire(self, host: str, port: int):
+        key = (host, port)
+        await self.limits.setdefault(key, asyncio.Semaphore(self.max_per_peer)).acquire()
+        idle = self.idle.get(key, [])
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+        try:
+            reader, writer = await asyncio.open_connection(host, port, limit=READ_LIMIT)
+        except Exception:
+            self.limits[key].release()
+            raise
+        writer.transport.set_write_buffer_limits(high=WRITE_HIGH_WATER)
+        socket_tuning.tune(writer.get_extra_info("socket"), "bulk")
+        self.opened += 1
+        if secure.keyring:
+            try:
+                reader, writer = await send_hello(reader, writer)
+            except Exception:
+                writer.close()
+                self.limits[key].release()
+                raise
+            self.sealed += isinstance(writer, secure.SecureWriter)
+        return reader, writer
+
+    def release(self, host: str, port: int, conn, reuse: bool = True):
+        key = (host, port)
+        reader, writer = conn
+        if reuse and not writer.is_closing():
+            self.idle.setdefault(key, []).append(conn)
+        else:
+            writer.close()
+        self.limits[key].release()
+
+    async def send(self, host: str, port: int, kind: int, payload: bytes):
+        # One retry covers a pooled connection the peer closed while idle
+        for attempt in range(2):
+            conn = await self.acquire(host, port)
+            try:
+                await write_frame(conn[1], kind, payload)
+            except (ConnectionError, OSError):
+                self.release(host, port, conn, reuse=False)
+                if attempt:
+                    raise
+                continue
+            self.release(host, port, conn)
+            return
+
+    async def close_all(self):
+        for conns in self.idle.values():
+            for _, writer in conns:
+                writer.close()
+        self.idle.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "opened": self.opened,
+            "encrypted": self.sealed,
+            "idle": {f"{h}:{p}": len(c) for (h, p), c in self.idle.items()},
+        }
 
-def send_data(data: str, host="192.168.1.14", port=9000):
+
+pool = ConnectionPool()
+
+
+async def send_data(data: str, host: str = "127.0.0.1", port: int = TCP_PORT):
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect((host, port))
-            s.sendall(data.encode())
-            response = s.recv(1024)
-            return {"status": "Data sent", "response": response.decode()}
+        await pool.send(host, port, KIND_MESSAGE, data.encode())
+        return {"status": "Data sent", "peer": f"{host}:{port}"}
     except Exception as e:
-        return {"status": "Error", "detail": str(e)}
\ No newline at end of file
+        return {"status": "Error", "detail": str(e)}
+
+
+def stats() -> Dict:
+    return {
+        "running": is_server_running,
+        "connections": connection_count,
+        "pool": pool.stats(),
+    }
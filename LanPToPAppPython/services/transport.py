@@ -0,0 +1,220 @@
+# services/transport.py
+import asyncio
+import json
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from . import metrics, secure, wire
+from .fragments import Reassembler, is_fragment
+from .log import get_logger
+from .netinfo import get_local_addresses
+from .udp_sender import Address, UDPSender, close_sender, get_sender
+from .udp_transport import MAX_BATCH, Datagram, open_udp_endpoint
+from .wire import WireError, is_binary_frame
+
+log = get_logger("UDP")
+
+BIND_ATTEMPTS = 5   # retried in the background with exponential backoff
+
+datagrams_in = metrics.counter("metal52_udp_datagrams_received_total", "UDP datagrams received")
+bytes_in = metrics.counter("metal52_udp_bytes_received_total", "UDP payload bytes received")
+parse_seconds = metrics.histogram("metal52_udp_parse_seconds", "Time to decode and handle one UDP datagram")
+dropped_messages = metrics.counter("metal52_dropped_messages_total", "Inbound messages discarded, by reason", ["reason"])
+dropped_bad_frame = dropped_messages.labels("bad_frame")
+dropped_handler_error = dropped_messages.labels("handler_error")
+dropped_unauthenticated = dropped_messages.labels("unauthenticated")
+
+
+class Packet:
+    """One decoded datagram: ``message`` is the JSON or wire-frame dict (None
+    for anything else), ``text`` the payload as text for JSON and legacy
+    datagrams. Filters may attach the sending ``peer``."""
+
+    __slots__ = ("addr", "sealed", "message", "text", "peer")
+
+    def __init__(self, addr, sealed: bool, message: Optional[Dict], text: str):
+        self.addr = addr
+        self.sealed = sealed
+        self.message = message
+        self.text = text
+        self.peer: Optional[Dict] = None
+
+
+# filter(packet) -> False to drop; handler(message, addr, peer) -> event to deliver
+Filter = Callable[[Packet], bool]
+Handler = Callable[[Dict, Address, Optional[Dict]], Optional[Dict]]
+
+
+class Transport:
+    """The node's UDP port: one socket, read in batches, with every datagram
+    unsealed, reassembled and decoded once and then dispatched by message
+    type to the registered handlers. Events the handlers return are passed
+    to ``deliver`` once per batch. Sends go through the shared UDPSender.
+
+    Datagrams that are not a dict, or whose type has no handler, go to the
+    ``fallback`` handler with the raw text in ``packet.text``.
+    """
+
+    def __init__(self, port: int, deliver: Callable[[Dict], object],
+                 keyring: Optional["secure.KeyRing"] = None,
+                 reassembler: Optional[Reassembler] = None,
+                 profile: str = "signaling", role: str = "udp", max_batch: int = MAX_BATCH):
+        self.port = port
+        self.deliver = deliver
+        self.keyring = keyring
+        self.reassembler = reassembler
+        self.profile = profile
+        self.role = role
+        self.max_batch = max_batch
+        self.handlers: Dict[str, Handler] = {}
+        self.filters: List[Filter] = []
+        self.fallback: Optional[Callable[[Packet], Optional[Dict]]] = None
+        self.sender: Optional[UDPSender] = None
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.retry_task: Optional[asyncio.Task] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self.transport is not None
+
+    def on(self, msg_type: str, handler: Handler):
+        self.handlers[msg_type] = handler
+
+    def add_filter(self, fn: Filter):
+        self.filters.append(fn)
+
+    # --- socket lifecycle ---
+
+    async def start(self) -> bool:
+        """Open the sender and bind the port; a failed bind keeps retrying in
+        the background so a port still held by a previous run is picked up"""
+        self.sender = get_sender()
+        if await self._bind():
+            return True
+        self.retry_task = asyncio.create_task(self._retry_bind())
+        return False
+
+    async def _bind(self) -> bool:
+        try:
+            self.transport, _ = await open_udp_endpoint(self.port, self.on_batch, max_batch=self.max_batch,
+                                                        profile=self.profile, role=self.role)
+        except OSError as e:
+            self.last_error = str(e)
+            return False
+        self.last_error = None
+        log.info("Listening on port %d", self.port)
+        return True
+
+    async def _retry_bind(self):
+        for attempt in range(1, BIND_ATTEMPTS + 1):
+            log.warning("Bind error (attempt %d/%d): %s", attempt, BIND_ATTEMPTS, self.last_error)
+            await asyncio.sleep(2 ** attempt)
+            if await self._bind():
+                return
+        log.error("Failed to bind port %d after %d attempts", self.port, BIND_ATTEMPTS)
+
+    def stop(self):
+        if self.retry_task:
+            self.retry_task.cancel()
+            self.retry_task = None
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        close_sender()
+        self.sender = None
+
+    # --- receive path ---
+
+    def decode(self, data: bytes, addr) -> Optional[Packet]:
+        sealed = secure.is_sealed(data)
+        if sealed:
+            data = self.keyring.open(data) if self.keyring else None
+            if data is None:
+                dropped_unauthenticated.inc()
+                return None
+        if is_fragment(data):
+            # Sealed and plaintext fragments never complete each other's messages
+            data = self.reassembler.add(data, addr[0], sealed=sealed) if self.reassembler else None
+            if data is None:
+                return None
+        if is_binary_frame(data):
+            try:
+                return Packet(addr, sealed, wire.decode(data), "")
+            except (WireError, ValueError) as e:
+                log.debug("Dropping bad frame from %s: %s", addr[0], e)
+                dropped_bad_frame.inc()
+                return None
+        text = data.decode("utf-8", errors="replace")
+        try:
+            message = json.loads(text)
+        except json.JSONDecodeError:
+            message = None
+        return Packet(addr, sealed, message if isinstance(message, dict) else None, text)
+
+    def dispatch(self, message: Dict, addr, peer: Optional[Dict] = None) -> Optional[Dict]:
+        """Run the handler for ``message``'s type; also used for messages
+        delivered out of band, e.g. reordered by the reliability layer"""
+        handler = self.handlers.get(message.get("type"))
+        return handler(message, addr, peer) if handler else None
+
+    def handle(self, data: bytes, addr) -> Optional[Dict]:
+        packet = self.decode(data, addr)
+        if packet is None:
+            return None
+        for fn in self.filters:
+            if not fn(packet):
+                return None
+        message = packet.message
+        if message is not None and message.get("type") in self.handlers:
+            return self.dispatch(message, addr, packet.peer)
+        return self.fallback(packet) if self.fallback else None
+
+    def on_batch(self, batch: List[Datagram]):
+        events = []
+        datagrams_in.inc(len(batch))
+        for data, addr in batch:
+            bytes_in.inc(len(data))
+            started = time.perf_counter()
+            try:
+                event = self.handle(data, addr)
+            except Exception as e:
+                log.warning("Failed to handle datagram from %s: %s", addr[0], e)
+                dropped_handler_error.inc()
+                continue
+            finally:
+                parse_seconds.observe(time.perf_counter() - started)
+            if event:
+                events.append(event)
+        for event in events:
+            self.deliver(event)
+
+    # --- send path ---
+
+    def _sender(self) -> UDPSender:
+        if self.sender is None:
+            self.sender = get_sender()
+        return self.sender
+
+    def send(self, data: bytes, addr: Address) -> bool:
+        return self._sender().send(data, addr)
+
+    def send_many(self, data: bytes, targets: Iterable[Address]) -> int:
+        return self._sender().send_many(data, targets)
+
+    def broadcast(self, data: bytes, port: Optional[int] = None) -> Dict:
+        """Send to the LAN broadcast address of the primary interface"""
+        target = (get_local_addresses().primary_broadcast(), port or self.port)
+        sender = self._sender()
+        if not sender.send(data, target):
+            return {"status": "Error", "detail": sender.last_error or "send buffer full"}
+        return {"status": "Message broadcasted", "ip": target[0]}
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "port": self.port,
+            "bind_error": self.last_error,
+            "handlers": sorted(self.handlers),
+            "sender": self._sender().stats(),
+        }
@@ -0,0 +1,107 @@
+# services/udp_sender.py
+import socket
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from . import socket_tuning
+
+Address = Tuple[str, int]
+
+
+class UDPSender:
+    """Long-lived, non-blocking UDP send socket.
+
+    Bound once and shared by every caller in the process. ``sendto`` on a
+    non-blocking datagram socket never waits: if the kernel buffer is full the
+    datagram is counted as dropped, which matches UDP's delivery semantics.
+    """
+
+    def __init__(self):
+        self.sock: Optional[socket.socket] = None
+        self.datagrams_sent = 0
+        self.bytes_sent = 0
+        self.batches_sent = 0
+        self.send_errors = 0
+        self.dropped = 0
+        self.last_error: Optional[str] = None
+
+    def open(self, host: str = "0.0.0.0", port: int = 0):
+        if self.sock:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        socket_tuning.tune(sock, "signaling", "udp_send")
+        sock.setblocking(False)
+        sock.bind((host, port))
+        self.sock = sock
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def _sendto(self, data: bytes, addr: Address) -> bool:
+        try:
+            self.sock.sendto(data, addr)
+        except BlockingIOError:
+            self.dropped += 1
+            return False
+        except OSError as e:
+            self.send_errors += 1
+            self.last_error = f"{addr[0]}:{addr[1]}: {e}"
+            return False
+        self.datagrams_sent += 1
+        self.bytes_sent += len(data)
+        return True
+
+    def send(self, data: bytes, addr: Address) -> bool:
+        if not self.sock:
+            self.open()
+        return self._sendto(data, addr)
+
+    def send_many(self, data: bytes, targets: Iterable[Address]) -> int:
+        """Send one pre-encoded payload to several targets; returns the success count"""
+        if not self.sock:
+            self.open()
+        sent = 0
+        for addr in targets:
+            if self._sendto(data, addr):
+                sent += 1
+        self.batches_sent += 1
+        return sent
+
+    def stats(self) -> Dict:
+        return {
+            "open": self.sock is not None,
+            "local_port": self.sock.getsockname()[1] if self.sock else None,
+            "datagrams_sent": self.datagrams_sent,
+            "bytes_sent": self.bytes_sent,
+            "batches_sent": self.batches_sent,
+            "send_errors": self.send_errors,
+            "dropped": self.dropped,
+            "last_error": self.last_error,
+        }
+
+
+_shared_sender: Optional[UDPSender] = None
+_shared_lock = threading.Lock()
+
+
+def get_sender() -> UDPSender:
+    """Process-wide sender, opened on first use"""
+    global _shared_sender
+    if _shared_sender is None:
+        with _shared_lock:
+            if _shared_sender is None:
+                sender = UDPSender()
+                sender.open()
+                _shared_sender = sender
+    return _shared_sender
+
+
+def close_sender():
+    global _shared_sender
+    with _shared_lock:
+        if _shared_sender:
+            _shared_sender.close()
+            _shared_sender = None
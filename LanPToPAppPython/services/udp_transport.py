@@ -0,0 +1,106 @@
+# services/udp_transport.py
+import asyncio
+import socket
+from typing import Callable, List, Optional, Tuple
+
+from . import socket_tuning
+from .log import get_logger
+
+log = get_logger("UDP")
+
+Datagram = Tuple[bytes, Tuple[str, int]]
+
+MAX_BATCH = 64
+MAX_DATAGRAM = 65535
+
+
+class DatagramBatchProtocol(asyncio.DatagramProtocol):
+    """Hands datagrams to ``on_batch`` in lists, so bursts are parsed and
+    dispatched together instead of one callback per packet.
+
+    asyncio reads a single datagram per readiness callback; with ``sock``
+    given, each callback then drains whatever else is already queued on the
+    socket with non-blocking ``recvfrom`` calls, up to ``max_batch``."""
+
+    def __init__(self, on_batch: Callable[[List[Datagram]], None], max_batch: int = MAX_BATCH,
+                 sock: Optional[socket.socket] = None):
+        self.on_batch = on_batch
+        self.max_batch = max_batch
+        self.sock = sock
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.closed: Optional[asyncio.Future] = None
+        self._pending: List[Datagram] = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data: bytes, addr):
+        self._pending.append((data, addr))
+        if self.sock is not None:
+            self._drain()
+        self._flush()
+
+    def _drain(self):
+        while len(self._pending) < self.max_batch:
+            try:
+                self._pending.append(self.sock.recvfrom(MAX_DATAGRAM))
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self.error_received(e)
+                return
+
+    def _flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            self.on_batch(batch)
+        except Exception as e:
+            log.error("Batch handler error: %s", e)
+
+    def error_received(self, exc):
+        log.warning("Socket error: %s", exc)
+
+    def connection_lost(self, exc):
+        self._flush()
+        if self.closed and not self.closed.done():
+            self.closed.set_result(exc)
+
+
+def bind_udp_socket(port: int, host: str = "0.0.0.0", reuse_addr: bool = False,
+                    profile: Optional[str] = None, role: Optional[str] = None) -> socket.socket:
+    """A non-blocking UDP socket bound to ``host:port``. Without ``reuse_addr``
+    a port another process already holds fails with EADDRINUSE instead of
+    both sockets silently splitting its datagrams."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        if reuse_addr:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if profile:
+            socket_tuning.tune(sock, profile, role)
+        sock.setblocking(False)
+        sock.bind((host, port))
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+async def open_udp_endpoint(
+    port: int,
+    on_batch: Callable[[List[Datagram]], None],
+    host: str = "0.0.0.0",
+    max_batch: int = MAX_BATCH,
+    profile: Optional[str] = None,
+    role: Optional[str] = None,
+) -> Tuple[asyncio.DatagramTransport, DatagramBatchProtocol]:
+    """Bind ``host:port`` and start delivering datagram batches on the running
+    loop; ``profile`` names a socket_tuning profile for the socket"""
+    loop = asyncio.get_running_loop()
+    sock = bind_udp_socket(port, host, profile=profile, role=role or f"udp:{port}")
+    return await loop.create_datagram_endpoint(
+        lambda: DatagramBatchProtocol(on_batch, max_batch, sock),
+        sock=sock,
+    )
@@ -0,0 +1,522 @@
+# services/video_pipeline.py
+import asyncio
+import socket
+import struct
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import socket_tuning
+from .log import get_logger
+from .media_envelope import is_relayed, unwrap, wrap_header
+from .secure import OVERHEAD as SEAL_OVERHEAD, is_sealed
+from .bitrate import KIND_VIDEO, REPORT_INTERVAL, ReceiverReport, ReportProtocol, ReportWindow, SendLog
+from .udp_transport import Datagram, open_udp_endpoint
+
+log = get_logger("VIDEO")
+
+# Slice layout: magic(2) version(1) quality(1) frame_id(4) index(2) count(2) capture_ms(4) | jpeg bytes
+MAGIC = b"MV"
+VERSION = 1
+HEADER = struct.Struct("!2sBBIHHI")
+
+VIDEO_MTU = 1200
+SLICE_SIZE = VIDEO_MTU - HEADER.size
+MAX_SLICES = 512
+FRAME_TIMEOUT = 0.5   # give up on a partial frame after this long
+MAX_PARTIAL_FRAMES = 4
+STREAM_TIMEOUT = 10.0      # forget a source after this long without slices
+
+
+def jpeg_encode(frame: np.ndarray, quality: int) -> bytes:
+    import cv2
+    ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encode failed")
+    return encoded.tobytes()
+
+
+def jpeg_decode(data: bytes) -> Optional[np.ndarray]:
+    import cv2
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def _resize(frame: np.ndarray, width: int, height: int) -> np.ndarray:
+    if frame.shape[1] == width and frame.shape[0] == height:
+        return frame
+    import cv2
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def encode_frame(frame: np.ndarray, width: int, height: int, quality: int,
+                 encoder: Callable[[np.ndarray, int], bytes] = jpeg_encode) -> Tuple[bytes, float]:
+    """Resize and encode one frame; runs on a pool worker. Returns (data, seconds)"""
+    started = time.perf_counter()
+    data = encoder(_resize(frame, width, height), quality)
+    return data, time.perf_counter() - started
+
+
+# Sources
+
+class CaptureSource:
+    """Camera index or video file read through ``cv2.VideoCapture``.
+    Files loop when they reach the end."""
+
+    def __init__(self, device=0):
+        self.device = device
+        self.capture = None
+
+    def open(self):
+        import cv2
+        self.capture = cv2.VideoCapture(self.device)
+        if not self.capture.isOpened():
+            raise RuntimeError(f"Cannot open video source {self.device!r}")
+
+    def read(self) -> Optional[np.ndarray]:
+        ok, frame = self.capture.read()
+        if not ok and isinstance(self.device, str):
+            import cv2
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture.read()
+        return frame if ok else None
+
+    def close(self):
+        if self.capture:
+            self.capture.release()
+            self.capture = None
+
+
+class SyntheticSource:
+    """Moving colour bars at a fixed size, for tests and headless nodes"""
+
+    def __init__(self, width: int = 640, height: int = 480):
+        self.width = width
+        self.height = height
+        self.tick = 0
+        self.bars = np.zeros((height, width, 3), dtype=np.uint8)
+        palette = np.array([[255, 255, 255], [0, 255, 255], [255, 255, 0], [0, 255, 0],
+                            [255, 0, 255], [0, 0, 255], [255, 0, 0], [0, 0, 0]], dtype=np.uint8)
+        for i, colour in enumerate(palette):
+            self.bars[:, i * width // 8:(i + 1) * width // 8] = colour
+
+    def open(self):
+        pass
+
+    def read(self) -> Optional[np.ndarray]:
+        self.tick += 1
+        return np.roll(self.bars, self.tick * 4 % self.width, axis=1)
+
+    def close(self):
+        pass
+
+
+# Adaptation
+
+class VideoAdapter:
+    """Picks JPEG quality and frame rate from receiver-reported loss and the
+    measured encode time.
+
+    Loss above ``LOSS_HIGH`` backs quality and rate off multiplicatively;
+    a clean link with spare encode headroom probes back up additively.
+    Encode time above ~80% of the frame interval caps the frame rate,
+    since the pool can't keep up anyway.
+    """
+
+    LOSS_HIGH = 0.05
+    LOSS_LOW = 0.01
+
+    def __init__(self, quality: int, fps: float, min_quality: int = 30, min_fps: float = 5):
+        self.max_quality = quality
+        self.max_fps = fps
+        self.min_quality = min_quality
+        self.min_fps = min_fps
+        self.quality = quality
+        self.fps = fps
+        self.encode_time = 0.0
+        self.loss = 0.0
+
+    def on_encode(self, seconds: float):
+        self.encode_time = seconds if not self.encode_time else 0.9 * self.encode_time + 0.1 * seconds
+        if self.encode_time > 0.8 / self.fps:
+            self.fps = max(self.min_fps, min(self.fps, 0.8 / self.encode_time))
+
+    def on_report(self, loss: float):
+        self.loss = loss
+        if loss > self.LOSS_HIGH:
+            self.quality = max(self.min_quality, int(self.quality * 0.8))
+            self.fps = max(self.min_fps, self.fps * 0.8)
+        elif loss < self.LOSS_LOW:
+            self.quality = min(self.max_quality, self.quality + 5)
+            if self.encode_time < 0.5 / self.fps:
+                self.fps = min(self.max_fps, self.fps + 1)
+
+    def stats(self) -> Dict:
+        return {
+            "quality": self.quality,
+            "fps": round(self.fps, 1),
+            "encode_ms": round(self.encode_time * 1000, 2),
+            "reported_loss": round(self.loss, 4),
+        }
+
+
+# Send and receive paths
+
+class VideoSender:
+    """Captures at a paced frame rate, encodes on a worker pool and sends
+    each frame as numbered slices.
+
+    Capture and encode never run on the event loop. If the previous frame
+    is still encoding when the next tick comes round, the tick is skipped
+    rather than queued, so latency stays bounded when the pool falls behind.
+    With a ``cipher`` the slices of a frame are sealed as one batch.
+    """
+
+    def __init__(self, remote: Tuple[str, int], source, width: int, height: int,
+                 quality: int, fps: float, executor: Optional[Executor] = None,
+                 encoder: Callable[[np.ndarray, int], bytes] = jpeg_encode,
+                 relay_id: Optional[int] = None, cipher=None):
+        self.remote = remote
+        self.source = source
+        # Sending through a MediaRelay: every slice carries our participant id
+        self.prefix = wrap_header(relay_id) if relay_id is not None else b""
+        self.cipher = cipher
+        self.slice_size = SLICE_SIZE - len(self.prefix) - (SEAL_OVERHEAD if cipher else 0)
+        self.width = width
+        self.height = height
+        self.adapter = VideoAdapter(quality, fps)
+        self.tuner = None
+        self.send_log = SendLog()
+        self.last_rtt: Optional[float] = None
+        self.executor = executor
+        self._own_executor = executor is None
+        self.encoder = encoder
+        self.frame_id = 0
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.task: Optional[asyncio.Task] = None
+        self.counters = {"frames": 0, "slices": 0, "bytes": 0, "skipped": 0, "dropped": 0, "errors": 0}
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="video-encode")
+        await loop.run_in_executor(self.executor, self.source.open)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        socket_tuning.tune(sock, "media", f"video_send:{self.remote[0]}:{self.remote[1]}")
+        sock.setblocking(False)
+        sock.bind(("0.0.0.0", 0))
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: ReportProtocol(self.on_report), sock=sock)
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        encoding: Optional[asyncio.Future] = None
+        deadline = loop.time()
+        while True:
+            deadline += 1 / self.adapter.fps
+            delay = deadline - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                deadline = loop.time()  # running late: re-anchor instead of bursting
+
+            if encoding is not None and not encoding.done():
+                self.counters["skipped"] += 1
+                continue
+            encoding = asyncio.ensure_future(self._capture_and_send(loop))
+
+    async def _capture_and_send(self, loop):
+        try:
+            frame = await loop.run_in_executor(self.executor, self.source.read)
+            if frame is None:
+                return
+            captured_ms = int(time.time() * 1000) & 0xFFFFFFFF
+            quality = self.adapter.quality
+            data, seconds = await loop.run_in_executor(
+                self.executor, encode_frame, frame, self.width, self.height, quality, self.encoder)
+            self.adapter.on_encode(seconds)
+            self.send_frame(data, quality, captured_ms)
+        except Exception as e:
+            self.counters["errors"] += 1
+            if self.counters["errors"] == 1:
+                log.error("Capture/encode error: %s", e)
+
+    def send_frame(self, data: bytes, quality: int, captured_ms: int):
+        count = -(-len(data) // self.slice_size) or 1
+        if count > MAX_SLICES:
+            self.counters["dropped"] += 1
+            return
+        self.frame_id = (self.frame_id + 1) & 0xFFFFFFFF
+        self.send_log.record(self.frame_id, time.monotonic())
+        view = memoryview(data)
+        slices = (
+            self.prefix + HEADER.pack(MAGIC, VERSION, quality, self.frame_id, index, count, captured_ms)
+            + view[index * self.slice_size:(index + 1) * self.slice_size]
+            for index in range(count)
+        )
+        if self.cipher:
+            slices = self.cipher.seal_each(slices)
+        for packet in slices:
+            self.transport.sendto(packet, self.remote)
+        self.counters["frames"] += 1
+        self.counters["slices"] += count
+        overhead = len(self.prefix) + HEADER.size + (SEAL_OVERHEAD if self.cipher else 0)
+        self.counters["bytes"] += len(data) + count * overhead
+
+    def on_report(self, data: bytes):
+        report = ReceiverReport.unpack(data)
+        if report is None or not report.expected:
+            return
+        self.last_rtt = self.send_log.rtt(report)
+        if self.tuner is not None:
+            # The session tuner retunes us through apply_config()
+            self.adapter.loss = report.loss
+            self.tuner.on_report(report, self.last_rtt)
+        else:
+            self.adapter.on_report(report.loss)
+
+    def apply_config(self, config):
+        """Take resolution, frame rate and quality ceilings from a MediaConfig"""
+        self.width = config.video_width
+        self.height = config.video_height
+        self.adapter.max_quality = self.adapter.quality = config.quality
+        # The encode-time cap is re-applied after the next encode
+        self.adapter.max_fps = self.adapter.fps = config.video_fps
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        self.source.close()
+        if self._own_executor and self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            **self.adapter.stats(),
+            "size": f"{self.width}x{self.height}",
+            "rtt_ms": round(self.last_rtt, 1) if self.last_rtt is not None else None,
+        }
+
+
+class VideoStream:
+    """Reassembly, jitter and report state for one incoming video source"""
+
+    def __init__(self, key, report_to: Tuple[str, int], report_prefix: bytes = b""):
+        self.key = key
+        self.report_to = report_to
+        self.report_prefix = report_prefix
+        self.partials: Dict[int, Dict] = {}
+        self.last_completed: Optional[int] = None
+        self.highest_seen: Optional[int] = None
+        self.window = ReportWindow(KIND_VIDEO)
+        self.jitter = 0.0
+        self._last_transit: Optional[float] = None
+        self.decoding = False
+        self.waiting: Optional[bytes] = None
+        self.last_seen = time.monotonic()
+
+    def update_jitter(self, captured_ms: int):
+        # RFC 3550 interarrival jitter over frame capture times (clock offset cancels out)
+        transit = time.time() * 1000 - captured_ms
+        if self._last_transit is not None:
+            self.jitter += (abs(transit - self._last_transit) - self.jitter) / 16
+        self._last_transit = transit
+
+    def build_report(self, now: Optional[float] = None) -> Optional[bytes]:
+        report = self.window.build(self.jitter, now)
+        return self.report_prefix + report if report else None
+
+
+class VideoReceiver:
+    """Reassembles sliced frames, drops stale ones and decodes off the loop.
+
+    Each source (a direct sender, or a participant behind a forwarding
+    MediaRelay) gets its own ``VideoStream``. Only frames newer than the
+    source's last completed one are kept; partial frames are abandoned once
+    a newer frame completes, once they are older than ``FRAME_TIMEOUT``, or
+    when more than ``MAX_PARTIAL_FRAMES`` are open. Decoding is latest-wins
+    per source: a frame that completes while the decoder is busy replaces
+    any frame still waiting for it. ``on_frame(frame, source)`` gets the
+    decoded image and a printable source name.
+    """
+
+    def __init__(self, port: int, on_frame: Callable[[np.ndarray, str], None],
+                 executor: Optional[Executor] = None,
+                 decoder: Callable[[bytes], Optional[np.ndarray]] = jpeg_decode, keyring=None):
+        self.port = port
+        self.on_frame = on_frame
+        self.keyring = keyring
+        self.executor = executor
+        self._own_executor = executor is None
+        self.decoder = decoder
+        self.streams: Dict[Tuple, VideoStream] = {}
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.report_task: Optional[asyncio.Task] = None
+        self.counters = {
+            "slices": 0,
+            "completed": 0,
+            "decoded": 0,
+            "stale": 0,
+            "abandoned": 0,
+            "superseded": 0,
+            "rejected": 0,
+        }
+
+    async def start(self, host: str = "0.0.0.0"):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="video-decode")
+        self.transport, _ = await open_udp_endpoint(self.port, self.on_batch, host,
+                                                    profile="media", role=f"video_recv:{self.port}")
+        self.report_task = asyncio.create_task(self._report_loop())
+
+    @staticmethod
+    def source_name(key) -> str:
+        (ip, port), source = key
+        return f"{ip}:{port}" + (f"#{source}" if source is not None else "")
+
+    def on_batch(self, batch: List[Datagram]):
+        now = time.monotonic()
+        for data, addr in batch:
+            source_id = None
+            if self.keyring and is_sealed(data):
+                data = self.keyring.open(data)
+                if data is None:
+                    self.counters["rejected"] += 1
+                    continue
+            if is_relayed(data):
+                unwrapped = unwrap(data)
+                if unwrapped is None:
+                    self.counters["rejected"] += 1
+                    continue
+                source_id, data = unwrapped
+            if len(data) < HEADER.size:
+                self.counters["rejected"] += 1
+                continue
+            magic, version, quality, frame_id, index, count, captured_ms = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION or not 0 < count <= MAX_SLICES or index >= count:
+                self.counters["rejected"] += 1
+                continue
+
+            key = (addr, source_id)
+            stream = self.streams.get(key)
+            if stream is None:
+                # New sender (or the old one restarted on a new port): frame ids start over
+                prefix = wrap_header(source_id) if source_id is not None else b""
+                stream = self.streams[key] = VideoStream(key, addr, prefix)
+            stream.last_seen = now
+            stream.window.on_packet(len(data), frame_id, now)
+            self._add_slice(stream, frame_id, index, count, captured_ms, data[HEADER.size:], now)
+        self._expire(now)
+
+    def _add_slice(self, stream: VideoStream, frame_id: int, index: int, count: int,
+                   captured_ms: int, chunk: bytes, now: float):
+        self.counters["slices"] += 1
+        if stream.last_completed is not None and frame_id <= stream.last_completed:
+            self.counters["stale"] += 1
+            return
+
+        entry = stream.partials.get(frame_id)
+        if entry is None:
+            entry = stream.partials[frame_id] = {"parts": [None] * count, "received": 0, "first": now}
+            stream.window.expected += count
+            if stream.highest_seen is not None and frame_id > stream.highest_seen + 1:
+                # Whole frames never seen: assume they were about this size
+                stream.window.expected += (frame_id - stream.highest_seen - 1) * count
+            stream.highest_seen = max(frame_id, stream.highest_seen or 0)
+            stream.update_jitter(captured_ms)
+            if len(stream.partials) > MAX_PARTIAL_FRAMES:
+                self._abandon(stream, min(stream.partials))
+        if len(entry["parts"]) != count or entry["parts"][index] is not None:
+            return
+        entry["parts"][index] = chunk
+        entry["received"] += 1
+        if entry["received"] < count:
+            return
+
+        del stream.partials[frame_id]
+        stream.last_completed = frame_id
+        self.counters["completed"] += 1
+        for older in [f for f in stream.partials if f < frame_id]:
+            self._abandon(stream, older)
+        self._decode(stream, b"".join(entry["parts"]))
+
+    def _abandon(self, stream: VideoStream, frame_id: int):
+        if stream.partials.pop(frame_id, None) is not None:
+            self.counters["abandoned"] += 1
+
+    def _expire(self, now: float):
+        for stream in self.streams.values():
+            for frame_id in [f for f, e in stream.partials.items() if now - e["first"] > FRAME_TIMEOUT]:
+                self._abandon(stream, frame_id)
+
+    def _decode(self, stream: VideoStream, data: bytes):
+        if stream.decoding:
+            if stream.waiting is not None:
+                self.counters["superseded"] += 1
+            stream.waiting = data
+            return
+        stream.decoding = True
+        future = asyncio.get_running_loop().run_in_executor(self.executor, self.decoder, data)
+        future.add_done_callback(lambda f: self._decoded(stream, f))
+
+    def _decoded(self, stream: VideoStream, future: asyncio.Future):
+        stream.decoding = False
+        try:
+            frame = future.result()
+        except Exception as e:
+            log.warning("Decode error: %s", e)
+            frame = None
+        if frame is not None:
+            self.counters["decoded"] += 1
+            self.on_frame(frame, self.source_name(stream.key))
+        if stream.waiting is not None:
+            data, stream.waiting = stream.waiting, None
+            self._decode(stream, data)
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            now = time.monotonic()
+            for key, stream in list(self.streams.items()):
+                if now - stream.last_seen > STREAM_TIMEOUT:
+                    del self.streams[key]
+                    continue
+                report = stream.build_report(now)
+                if report:
+                    self.transport.sendto(report, stream.report_to)
+
+    def stop(self):
+        if self.report_task:
+            self.report_task.cancel()
+            self.report_task = None
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        if self._own_executor and self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "streams": {
+                self.source_name(key): {
+                    "partial_frames": len(stream.partials),
+                    "jitter_ms": round(stream.jitter, 2),
+                    "last_frame": stream.last_completed,
+                }
+                for key, stream in list(self.streams.items())
+            },
+        }
@@ -1,19 +1,37 @@
 # services/websocket_manager.py
 
-from fastapi import WebSocket, WebSocketDisconnect
+from typing import Any, Optional
 
-connected_websockets = set()
+from fastapi import WebSocket
 
-async def broadcast(message: str):
-    for ws in connected_websockets.copy():
-        try:
-            await ws.send_text(message)
-        except:
-            connected_websockets.discard(ws)
+from .chat_history import RECORDED_TYPES, ChatHistory
+from .fanout import FanoutHub
+
+# Shared by main.py and the TCP/UDP helpers so every WebSocket sees every event
+hub = FanoutHub()
+connected_websockets = hub.connections
+history: Optional[ChatHistory] = None  # set by main.py at startup
+bus = None  # ipc_bus server or client when running under several workers
+
+def publish(message: Any) -> int:
+    """Fan ``message`` out to every WebSocket, recording chat messages
+    (which gain a ``seq``) in history first"""
+    if bus is not None and not bus.owner:
+        # The owner records it and sends it back to this worker's clients
+        bus.publish(message)
+        return 0
+    if history is not None and isinstance(message, dict) and message.get("type") in RECORDED_TYPES:
+        message = history.record(message)
+    if bus is not None:
+        bus.publish(message)
+    return hub.publish(message)
+
+async def broadcast(message: Any):
+    publish(message)
 
 async def register(websocket: WebSocket):
     await websocket.accept()
-    connected_websockets.add(websocket)
+    hub.add(websocket, websocket)
 
 def unregister(websocket: WebSocket):
-    connected_websockets.discard(websocket)
\ No newline at end of file
+    hub.remove(websocket)
@@ -0,0 +1,122 @@
+# services/wire.py
+import json
+import struct
+import time
+import zlib
+from typing import Dict, Optional
+
+# Frame layout (network byte order):
+#   magic(2) version(1) type(1) flags(1) node_id(4) origin(8)
+#   udp_port(2) web_port(2) seq(4) mono_ms(4) | payload
+# The payload is compact JSON of the remaining fields, zlib-compressed when
+# that actually makes it smaller.
+MAGIC = b"M5"
+VERSION = 1
+HEADER = struct.Struct("!2sBBBI8sHHII")
+
+FLAG_COMPRESSED = 0x01
+COMPRESS_THRESHOLD = 256
+
+# Capability advertised in heartbeats by nodes that can decode these frames
+CAPABILITY = "bin1"
+
+MESSAGE_TYPES = {
+    "heartbeat": 1,
+    "chat": 2,
+    "call_request": 3,
+    "webrtc_signal": 4,
+    "ack": 5,
+}
+TYPE_NAMES = {code: name for name, code in MESSAGE_TYPES.items()}
+TYPE_GENERIC = 0  # the type name travels in the payload instead
+
+HEADER_FIELDS = ("type", "from_node", "origin", "udp_port", "web_port", "timestamp")
+
+
+class WireError(ValueError):
+    pass
+
+
+def is_binary_frame(data: bytes) -> bool:
+    """Magic, version and a full header: legacy text that merely starts with "M5" is not a frame"""
+    return len(data) >= HEADER.size and data[:2] == MAGIC and data[2] == VERSION
+
+
+def monotonic_ms() -> int:
+    return (time.monotonic_ns() // 1_000_000) & 0xFFFFFFFF
+
+
+class WireCodec:
+    """Encodes this node's messages into binary frames and decodes peers' frames"""
+
+    def __init__(self, node_id: int, origin: str, udp_port: int, web_port: int):
+        self.node_id = node_id
+        self.origin = bytes.fromhex(origin)[:8].ljust(8, b"\0")
+        self.udp_port = udp_port
+        self.web_port = web_port
+        self.seq = 0
+
+    def encode(self, message: Dict) -> bytes:
+        msg_type = message.get("type", "")
+        type_code = MESSAGE_TYPES.get(msg_type, TYPE_GENERIC)
+
+        body = {k: v for k, v in message.items() if k not in HEADER_FIELDS}
+        if type_code == TYPE_GENERIC:
+            body["type"] = msg_type
+
+        flags = 0
+        payload = json.dumps(body, separators=(",", ":")).encode("utf-8") if body else b""
+        if len(payload) > COMPRESS_THRESHOLD:
+            compressed = zlib.compress(payload, 1)
+            if len(compressed) < len(payload):
+                payload = compressed
+                flags |= FLAG_COMPRESSED
+
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        header = HEADER.pack(
+            MAGIC, VERSION, type_code, flags, self.node_id & 0xFFFFFFFF, self.origin,
+            self.udp_port, self.web_port, self.seq, monotonic_ms()
+        )
+        return header + payload
+
+
+def decode(data: bytes, max_payload: int = 1 << 20) -> Dict:
+    """Decode a binary frame into the same dict shape the JSON path produces"""
+    if len(data) < HEADER.size:
+        raise WireError("Frame shorter than header")
+    (magic, version, type_code, flags, node_id, origin,
+     udp_port, web_port, seq, mono_ms) = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise WireError("Bad magic")
+    if version != VERSION:
+        raise WireError(f"Unsupported wire version {version}")
+
+    payload = memoryview(data)[HEADER.size:]
+    if flags & FLAG_COMPRESSED:
+        decompressor = zlib.decompressobj()
+        try:
+            payload = decompressor.decompress(payload, max_payload)
+        except zlib.error as e:
+            raise WireError(f"Corrupt payload: {e}") from e
+        if decompressor.unconsumed_tail:
+            raise WireError("Decompressed payload too large")
+
+    message = json.loads(bytes(payload)) if len(payload) else {}
+    if not isinstance(message, dict):
+        raise WireError("Payload is not an object")
+
+    if type_code != TYPE_GENERIC:
+        message["type"] = TYPE_NAMES.get(type_code, f"unknown_{type_code}")
+    message.update({
+        "from_node": node_id,
+        "origin": origin.hex(),
+        "udp_port": udp_port,
+        "web_port": web_port,
+        "seq": seq,
+        "mono_ms": mono_ms,
+    })
+    return message
+
+
+def supports_binary(peer: Optional[Dict]) -> bool:
+    return bool(peer) and CAPABILITY in peer.get("caps", ())
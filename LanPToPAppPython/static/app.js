@@ -6,6 +6,7 @@ class Metal52App {
         this.peers = new Map();
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 5;
+        this.lastSeq = null;  // newest history seq shown; sent on reconnect to replay only what was missed
         this.init();
     }
 
@@ -24,7 +25,8 @@ class Metal52App {
 
     connectWebSocket() {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.host}/ws/chat`;
+        const since = this.lastSeq !== null ? `?since=${this.lastSeq}` : '';
+        const wsUrl = `${protocol}//${window.location.host}/ws/chat${since}`;
 
         this.websocket = new WebSocket(wsUrl);
 
@@ -57,39 +59,63 @@ class Metal52App {
 
     handleWebSocketMessage(data) {
         try {
-            const message = JSON.parse(data);
-            
-            switch (message.type) {
-                case 'chat':
-                    this.addChatMessage(message.sender, message.message, message.timestamp);
-                    break;
-                case 'udp_message':
-                    this.addChatMessage(message.sender, message.message, message.timestamp);
-                    break;
-                case 'system':
-                    this.addSystemMessage(message.message);
-                    break;
-                case 'call_request':
-                    console.log('[WS] Call request received:', message);
-                    if (window.webrtcManager) {
-                        window.webrtcManager.handleIncomingCall(message);
-                    }
-                    break;
-                case 'webrtc_signal':
-                    console.log('[WS] WebRTC signal received:', message.signal?.type);
-                    if (window.webrtcManager) {
-                        window.webrtcManager.handleWebRTCSignaling(message.signal);
-                    }
-                    break;
-                default:
-                    this.addChatMessage('Network', data, new Date().toISOString());
-            }
+            this.handleMessage(JSON.parse(data), data);
         } catch (error) {
             console.error('[WS] Message parse error:', error);
             this.addChatMessage('Network', data, new Date().toISOString());
         }
     }
 
+    handleMessage(message, data) {
+        if (typeof message.seq === 'number') {
+            if (this.lastSeq !== null && message.seq <= this.lastSeq) return;  // already shown
+            this.lastSeq = message.seq;
+        }
+
+        switch (message.type) {
+            case 'chat':
+                this.addChatMessage(message.sender, message.message, message.timestamp);
+                break;
+            case 'udp_message':
+                this.addChatMessage(message.sender, message.message, message.timestamp);
+                break;
+            case 'system':
+                this.addSystemMessage(message.message);
+                break;
+            case 'call_request':
+                console.log('[WS] Call request received:', message);
+                if (window.webrtcManager) {
+                    window.webrtcManager.handleIncomingCall(message);
+                }
+                break;
+            case 'webrtc_signal':
+                console.log('[WS] WebRTC signal received:', message.signal?.type);
+                if (window.webrtcManager) {
+                    window.webrtcManager.handleWebRTCSignaling(message.signal);
+                }
+                break;
+            case 'file_received':
+                this.addSystemMessage(`📁 Received ${message.file.name} (${message.file.size} bytes) from ${message.sender_ip}: ${message.url}`);
+                break;
+            case 'batch':
+                // Several events coalesced into one frame by the server
+                message.messages.forEach((m) => this.handleMessage(m, JSON.stringify(m)));
+                break;
+            case 'ping':
+                this.sendMessage(JSON.stringify({ type: 'pong', t: message.t }));
+                break;
+            case 'history':
+                if (message.reset) this.lastSeq = null;
+                if (message.truncated) {
+                    this.addSystemMessage('Some missed messages are not shown; use Export for the full history');
+                }
+                message.messages.forEach((m) => this.handleMessage(m, JSON.stringify(m)));
+                break;
+            default:
+                this.addChatMessage('Network', data, new Date().toISOString());
+        }
+    }
+
     sendMessage(message) {
         if (this.websocket && this.websocket.readyState === WebSocket.OPEN) {
             this.websocket.send(message);
@@ -270,10 +296,34 @@ function clearChat() {
     }
 }
 
-function exportChat() {
-    const messages = document.getElementById('chatMessages');
-    if (messages) {
-        const chatData = messages.innerText;
+async function fetchHistory() {
+    // Page backwards through the server's history, oldest page last
+    const pages = [];
+    let before = '';
+    for (;;) {
+        const res = await fetch(`/api/history?limit=200${before}`);
+        if (!res.ok) throw new Error(`history failed (${res.status})`);
+        const page = await res.json();
+        pages.unshift(page.messages);
+        if (!page.has_more) break;
+        before = `&before=${page.messages[0].seq}`;
+    }
+    return pages.flat();
+}
+
+async function exportChat() {
+    let chatData;
+    try {
+        const messages = await fetchHistory();
+        chatData = messages.map((m) => {
+            const text = m.type === 'file_received' ? `📁 ${m.file.name}: ${m.url}` : m.message;
+            return `[${m.timestamp}] ${m.sender || m.sender_ip || 'Network'}: ${text}`;
+        }).join('\n');
+    } catch (error) {
+        console.warn('[APP] History unavailable, exporting the visible chat:', error);
+        chatData = document.getElementById('chatMessages')?.innerText;
+    }
+    if (chatData) {
         const blob = new Blob([chatData], { type: 'text/plain' });
         const url = URL.createObjectURL(blob);
         const a = document.createElement('a');
@@ -284,13 +334,44 @@ function exportChat() {
     }
 }
 
+async function uploadFile(file) {
+    const created = await fetch(`/api/files?name=${encodeURIComponent(file.name)}&size=${file.size}`, { method: 'POST' });
+    if (!created.ok) throw new Error(`create failed (${created.status})`);
+    let state = await created.json();
+
+    // The body is streamed from disk by the browser; on failure resume from the server's offset
+    for (let attempt = 0; attempt < 3 && !state.complete; attempt++) {
+        try {
+            const res = await fetch(`/api/files/${state.id}?offset=${state.offset}`, {
+                method: 'PUT',
+                body: file.slice(state.offset)
+            });
+            if (res.ok) {
+                state = await res.json();
+                continue;
+            }
+        } catch (error) {
+            console.warn('[FILE] Upload interrupted, resuming:', error);
+        }
+        state = await (await fetch(`/api/files/${state.id}/status`)).json();
+    }
+    if (!state.complete) throw new Error('upload incomplete');
+    return state;
+}
+
 function attachFile() {
     const input = document.createElement('input');
     input.type = 'file';
-    input.onchange = (e) => {
+    input.onchange = async (e) => {
         const file = e.target.files[0];
         if (file) {
-            window.app.addSystemMessage(`File selected: ${file.name} (${file.size} bytes)`);
+            window.app.addSystemMessage(`Uploading ${file.name} (${file.size} bytes)...`);
+            try {
+                const state = await uploadFile(file);
+                window.app.sendMessage(`📎 ${file.name} (${file.size} bytes): ${window.location.origin}/api/files/${state.id}`);
+            } catch (error) {
+                window.app.addSystemMessage(`❌ Upload failed: ${error.message}`);
+            }
         }
     };
     input.click();
@@ -315,7 +396,7 @@ document.addEventListener('DOMContentLoaded', () => {
         window.nodeConfig = {
             node_id: 1,
             local_ip: '127.0.0.1',
-            ports: { web: 8001, udp: 9002, audio: 5061, video: 5057 }
+            ports: { web: 8001, udp: 9002, audio: 5104, video: 5105 }
         };
     }
     
@@ -1,43 +1,68 @@
 # test_launcher.py
+import argparse
 import subprocess
 import sys
 import time
 import os
 
-def start_test_node(node_id: int):
+def node_ports(node_id: int) -> dict:
+    """Ports a test node uses, offset by its id; each node's media ports get
+    a block of four so no two nodes overlap however many are started"""
+    media = 5100 + 4 * node_id
+    return {
+        'web': 8000 + node_id,
+        'udp': 9001 + node_id,
+        'tcp': 9100 + node_id,
+        'audio': media,
+        'video': media + 1,
+        'relay_audio': media + 2,
+        'relay_video': media + 3,
+    }
+
+def start_test_node(node_id: int, reload: bool = True, extra_env: dict = None, **popen_kwargs):
     """Start a test node with specific ports"""
+    ports = node_ports(node_id)
     env = os.environ.copy()
     env.update({
         'NODE_ID': str(node_id),
-        'WEB_PORT': str(8000 + node_id),
-        'UDP_PORT': str(9001 + node_id),
-        'AUDIO_PORT': str(5060 + node_id),
-        'VIDEO_PORT': str(5056 + node_id)
+        'WEB_PORT': str(ports['web']),
+        'UDP_PORT': str(ports['udp']),
+        'TCP_PORT': str(ports['tcp']),
+        'AUDIO_PORT': str(ports['audio']),
+        'VIDEO_PORT': str(ports['video']),
+        'RELAY_AUDIO_PORT': str(ports['relay_audio']),
+        'RELAY_VIDEO_PORT': str(ports['relay_video'])
     })
+    env.update(extra_env or {})
     
     cmd = [
         sys.executable, "-m", "uvicorn", 
         "main:app", 
         "--host", "127.0.0.1", 
-        "--port", str(8000 + node_id),
-        "--reload"
+        "--port", str(ports['web'])
     ]
+    if reload:
+        cmd.append("--reload")
     
-    print(f"Starting Node {node_id} on ports: Web={8000+node_id}, UDP={9001+node_id}, Audio={5060+node_id}, Video={5056+node_id}")
-    return subprocess.Popen(cmd, env=env)
+    print(f"Starting Node {node_id} on ports: Web={ports['web']}, UDP={ports['udp']}, TCP={ports['tcp']}, Audio={ports['audio']}, Video={ports['video']}")
+    return subprocess.Popen(cmd, env=env, cwd=os.path.dirname(os.path.abspath(__file__)), **popen_kwargs)
 
 def main():
+    parser = argparse.ArgumentParser(description="Start local test nodes")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--no-reload", action="store_true", help="run without uvicorn --reload")
+    args = parser.parse_args()
+    
     processes = []
     try:
-        for node_id in [1, 2, 3]:
-            proc = start_test_node(node_id)
+        for node_id in range(1, args.nodes + 1):
+            proc = start_test_node(node_id, reload=not args.no_reload)
             processes.append(proc)
             time.sleep(2)  # Stagger startup
         
         print("\n=== Test Nodes Started ===")
-        print("Node 1: http://localhost:8001")
-        print("Node 2: http://localhost:8002") 
-        print("Node 3: http://localhost:8003")
+        for node_id in range(1, args.nodes + 1):
+            print(f"Node {node_id}: http://localhost:{node_ports(node_id)['web']}")
         print("\nPress Ctrl+C to stop all nodes")
         
         # Wait for all processes
@@ -0,0 +1,73 @@
+import os
+
+from services.chat_history import INDEX_INTERVAL, ChatHistory
+
+
+def fill(history, count, start=0):
+    return [history.record({"type": "chat", "text": f"message {n:04d}"}) for n in range(start, start + count)]
+
+
+def texts(entries):
+    return [entry["text"] for entry in entries]
+
+
+def test_seqs_are_assigned_in_order(tmp_path):
+    history = ChatHistory(str(tmp_path))
+    try:
+        entries = fill(history, 3)
+        assert [e["seq"] for e in entries] == [1, 2, 3]
+        assert texts(history.since(1)) == ["message 0001", "message 0002"]
+        assert texts(history.page(before=3, limit=1)) == ["message 0001"]
+    finally:
+        history.close()
+
+
+def test_segments_roll_over_and_old_ones_are_deleted(tmp_path):
+    history = ChatHistory(str(tmp_path), ring_size=10, segment_bytes=2048, max_segments=3)
+    fill(history, 300)
+    history.close()
+    assert len(history.segments) == 3
+    assert len(os.listdir(tmp_path)) == 6
+    assert history.first_seq == history.segments[0].base > 1
+    assert history.last_seq == 300
+
+
+def test_reload_replays_from_disk_through_the_index(tmp_path):
+    history = ChatHistory(str(tmp_path), segment_bytes=16 * 1024)
+    fill(history, 500)
+    history.close()
+
+    reloaded = ChatHistory(str(tmp_path), ring_size=10, segment_bytes=16 * 1024)
+    try:
+        assert len(reloaded.segments) > 1
+        assert all(s.index for s in reloaded.segments)
+        assert reloaded.last_seq == 500
+        assert [e["seq"] for e in reloaded.ring] == list(range(491, 501))
+        # Older than the ring: read from the segments, across a boundary
+        boundary = reloaded.segments[1].base
+        entries = reloaded.since(boundary - 5, limit=INDEX_INTERVAL)
+        assert [e["seq"] for e in entries] == list(range(boundary - 4, boundary - 4 + INDEX_INTERVAL))
+        assert texts(reloaded.page(before=101, limit=3)) == ["message 0097", "message 0098", "message 0099"]
+        assert reloaded.record({"type": "chat"})["seq"] == 501
+    finally:
+        reloaded.close()
+
+
+def test_torn_last_line_is_truncated_on_reload(tmp_path):
+    history = ChatHistory(str(tmp_path))
+    fill(history, 5)
+    history.close()
+    with open(history.segments[-1].log_path, "ab") as f:
+        f.write(b'{"seq": 6, "te')
+
+    reloaded = ChatHistory(str(tmp_path))
+    try:
+        assert reloaded.last_seq == 5
+        assert reloaded.record({"type": "chat"})["seq"] == 6
+    finally:
+        reloaded.close()
+    again = ChatHistory(str(tmp_path))
+    try:
+        assert [e["seq"] for e in again.since(0)] == [1, 2, 3, 4, 5, 6]
+    finally:
+        again.close()
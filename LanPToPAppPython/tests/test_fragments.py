@@ -0,0 +1,95 @@
+import pytest
+
+from services.fragments import HEADER, MAX_FRAGMENTS, Fragmenter, Reassembler, is_fragment
+
+ORIGIN = "0123456789abcdef"
+
+
+def reassemble(reassembler, frames, peer="10.0.0.2", now=0.0):
+    out = None
+    for frame in frames:
+        out = reassembler.add(frame, peer, now=now) or out
+    return out
+
+
+def test_split_and_reassemble_out_of_order():
+    payload = bytes(range(256)) * 20
+    frames = Fragmenter(ORIGIN, mtu=200).split(payload)
+    assert len(frames) > 1 and all(len(f) <= 200 for f in frames)
+    assert all(is_fragment(f) for f in frames)
+    r = Reassembler()
+    assert reassemble(r, reversed(frames)) == payload
+    assert r.stats()["completed"] == 1
+    assert r.stats()["pending"] == 0 and r.total_bytes == 0
+
+
+def test_duplicates_and_late_copies_are_dropped():
+    frames = Fragmenter(ORIGIN, mtu=100).split(b"x" * 300)
+    r = Reassembler()
+    r.add(frames[0], "p", now=0)
+    assert r.add(frames[0], "p", now=0) is None
+    assert reassemble(r, frames[1:], "p") == b"x" * 300
+    assert r.add(frames[1], "p", now=0) is None  # after completion
+    assert r.stats()["duplicates"] == 2
+
+
+def test_expired_message_ignores_stragglers():
+    frames = Fragmenter(ORIGIN, mtu=100).split(b"x" * 300)
+    r = Reassembler(ttl=5)
+    r.add(frames[0], "p", now=0)
+    r.expire(10)
+    assert r.stats()["expired"] == 1
+    assert r.add(frames[1], "p", now=10) is None
+    assert not r.buffers
+
+
+def test_sealed_and_plaintext_fragments_never_mix():
+    payload = b"x" * (100 - HEADER.size) * 2
+    frames = Fragmenter(ORIGIN, mtu=100).split(payload)
+    assert len(frames) == 2
+    r = Reassembler()
+    assert r.add(frames[0], "p", now=0, sealed=True) is None
+    assert r.add(frames[1], "p", now=0, sealed=False) is None
+    assert r.add(frames[1], "p", now=0, sealed=True) == payload
+
+
+def test_other_peer_cannot_complete_a_message():
+    frames = Fragmenter(ORIGIN, mtu=100).split(b"x" * 300)
+    r = Reassembler()
+    r.add(frames[0], "a", now=0)
+    assert r.add(frames[1], "b", now=0) is None
+    assert r.stats()["rejected"] == 1
+
+
+def test_per_peer_cap_evicts_oldest_partial():
+    fragmenter = Fragmenter(ORIGIN, mtu=100)
+    chunk = 100 - HEADER.size
+    first, second = fragmenter.split(b"a" * chunk * 3), fragmenter.split(b"b" * chunk * 3)
+    r = Reassembler(max_per_peer=chunk * 2)
+    r.add(first[0], "p", now=0)
+    r.add(second[0], "p", now=0)
+    r.add(second[1], "p", now=0)  # needs the room the first message held
+    assert r.stats()["evicted"] == 1
+    assert r.peer_bytes["p"] <= chunk * 2
+    assert r.add(first[1], "p", now=0) is None  # its stragglers are ignored
+    assert len(r.buffers) == 1
+
+
+def test_total_cap_spans_peers():
+    fragmenter = Fragmenter(ORIGIN, mtu=100)
+    chunk = 100 - HEADER.size
+    r = Reassembler(max_total=chunk * 2)
+    for peer in ("a", "b", "c"):
+        r.add(fragmenter.split(b"z" * chunk * 2)[0], peer, now=0)
+    assert r.total_bytes <= chunk * 2
+    assert r.stats()["evicted"] == 1
+
+
+def test_oversized_payload_is_refused():
+    with pytest.raises(ValueError):
+        Fragmenter(ORIGIN, mtu=HEADER.size + 1).split(b"x" * (MAX_FRAGMENTS + 1))
+
+
+@pytest.mark.parametrize("data", [b"MFoo", b"MF" + b"x" * 40, b"hello"])
+def test_legacy_text_is_not_a_fragment(data):
+    assert not is_fragment(data)
@@ -0,0 +1,66 @@
+from services.gossip import GossipRelay, SeenCache
+from services.peers import PeerTable
+
+
+def test_seen_cache_reports_repeats():
+    seen = SeenCache()
+    assert seen.add("a", now=0)
+    assert not seen.add("a", now=1)
+    assert seen.add("b", now=1)
+
+
+def test_seen_cache_forgets_after_the_window():
+    seen = SeenCache(window=10)
+    seen.add("a", now=0)
+    seen.add("b", now=5)
+    assert not seen.add("a", now=10)  # a repeat refreshes the entry
+    seen.expire(15.5)
+    assert len(seen) == 1
+    assert seen.add("b", now=15.5)
+
+
+def test_seen_cache_evicts_least_recently_seen():
+    seen = SeenCache(capacity=2)
+    seen.add("a", now=0)
+    seen.add("b", now=0)
+    seen.add("a", now=1)
+    seen.add("c", now=1)
+    assert len(seen) == 2
+    assert not seen.add("a", now=1)
+    assert seen.add("b", now=1)
+
+
+def relay_with(peers, fanout=3, ttl=4):
+    table = PeerTable()
+    for n in range(peers):
+        table.add("10.0.0.%d" % (n + 1), 8000, 9000, n + 1, "online")
+    sent = []
+    relay = GossipRelay(0, "self", table, lambda m, keys: sent.append((m, keys)), fanout, ttl)
+    return relay, sent
+
+
+def test_relay_forwards_new_messages_once_within_fanout():
+    relay, sent = relay_with(peers=6, fanout=2)
+    message = {"type": "chat", "gossip": {"id": "other:1", "ttl": 3, "node": 7}}
+    assert relay.accept(message, "10.0.0.1:8000")
+    assert not relay.accept(message, "10.0.0.2:8000")
+    (forwarded, keys), = sent
+    assert forwarded["gossip"]["ttl"] == 2
+    assert len(keys) == 2 and "10.0.0.1:8000" not in keys
+    assert relay.counters["duplicates"] == 1
+
+
+def test_relay_stops_at_zero_ttl_and_caps_inflated_ttl():
+    relay, sent = relay_with(peers=2, ttl=2)
+    assert relay.accept({"gossip": {"id": "x:1", "ttl": 0}}, None)
+    assert not sent and relay.counters["expired"] == 1
+    relay.accept({"gossip": {"id": "x:2", "ttl": 99}}, None)
+    assert sent[0][0]["gossip"]["ttl"] == 1
+
+
+def test_originated_messages_are_not_relayed_back():
+    relay, sent = relay_with(peers=2)
+    message = relay.originate({"type": "chat"})
+    assert message["gossip"]["node"] == 0
+    assert not relay.accept(message, "10.0.0.1:8000")
+    assert not sent
@@ -0,0 +1,124 @@
+import time
+
+from services.reliable import (HOLE_TIMEOUT, INITIAL_RTO, MAX_RETRIES, MAX_RTO, MIN_RTO,
+                               ReliabilityLayer, ReliableChannel)
+
+
+class Link:
+    """Two layers wired back to back; ``drop`` swallows matching frames"""
+
+    def __init__(self):
+        self.wire = []
+        self.delivered = []
+        self.sender = ReliabilityLayer(lambda m, peer: self.wire.append(m), lambda peer, m: None)
+        self.receiver = ReliabilityLayer(lambda m, peer: self.wire.append(m),
+                                         lambda peer, m: self.delivered.append(m["n"]))
+
+    def send(self, n):
+        self.sender.send({"type": "chat", "n": n}, "b")
+        return self.wire.pop()
+
+    def receive(self, message):
+        self.receiver.receive("a", message)
+        return self.wire.pop()["ack"]
+
+
+def test_in_order_delivery_and_ack():
+    link = Link()
+    for n in range(3):
+        ack = link.receive(link.send(n))
+    assert link.delivered == [0, 1, 2]
+    assert ack["c"] == 3 and "sack" not in ack
+    link.sender.on_ack("b", ack)
+    assert not link.sender.channels["b"].pending
+
+
+def test_holdback_reorders_and_drops_duplicates():
+    link = Link()
+    first, second, third = (link.send(n) for n in range(3))
+    ack = link.receive(third)
+    assert ack == {"s": first["rel"]["s"], "c": 0, "sack": [3]}
+    link.receive(second)
+    link.receive(second)
+    assert link.delivered == []
+    link.receive(first)
+    assert link.delivered == [0, 1, 2]
+    assert link.receiver.counters["duplicates"] == 1
+    assert link.receiver.receivers["a"].hole_since is None
+
+
+def test_sack_retransmits_holes_early():
+    link = Link()
+    first, second = link.send(0), link.send(1)
+    link.sender.channels["b"].pending[1]["sent_at"] -= INITIAL_RTO
+    link.sender.on_ack("b", link.receive(second))
+    assert link.wire == [first]
+    assert link.sender.counters["retransmits"] == 1
+
+
+def test_rto_backs_off_then_abandons():
+    link = Link()
+    link.send(0)
+    now = time.monotonic()
+    link.sender.check_timers(now)
+    assert not link.wire
+    for _ in range(MAX_RETRIES):
+        now += MAX_RTO
+        link.sender.check_timers(now)
+    assert len(link.wire) == MAX_RETRIES
+    link.sender.check_timers(now + MAX_RTO)
+    assert link.sender.counters["abandoned"] == 1
+    assert not link.sender.channels["b"].pending
+
+
+def test_retransmitted_messages_are_not_sampled():
+    link = Link()
+    message = link.send(0)
+    link.sender.check_timers(time.monotonic() + INITIAL_RTO)
+    link.sender.on_ack("b", link.receive(message))
+    assert link.sender.channels["b"].srtt is None
+
+
+def test_rto_stays_within_bounds():
+    channel = ReliableChannel()
+    channel.sample_rtt(0.0001)
+    assert channel.rto == MIN_RTO
+    channel.sample_rtt(30)
+    assert channel.rto == MAX_RTO
+
+
+def test_receiver_skips_a_hole_the_sender_gave_up_on():
+    link = Link()
+    link.send(0)
+    link.receive(link.send(1))
+    hole_since = link.receiver.receivers["a"].hole_since
+    link.receiver.check_timers(hole_since + HOLE_TIMEOUT / 2)
+    assert link.delivered == []
+    link.receiver.check_timers(hole_since + HOLE_TIMEOUT + 0.1)
+    assert link.delivered == [1]
+    assert link.receiver.counters["skipped"] == 1
+
+
+def test_new_session_restarts_the_stream():
+    link = Link()
+    link.receive(link.send(0))
+    link.sender.forget("b")
+    assert link.receive(link.send(1))["c"] == 1
+    assert link.delivered == [0, 1]
+
+
+def test_stale_session_ack_is_ignored():
+    link = Link()
+    message = link.send(0)
+    link.sender.on_ack("b", {"s": "other", "c": 1})
+    assert link.sender.channels["b"].pending
+    link.sender.on_ack("b", link.receive(message))
+    assert not link.sender.channels["b"].pending
+
+
+def test_forget_drops_both_directions():
+    link = Link()
+    link.receive(link.send(0))
+    link.receiver.send({"type": "chat", "n": 0}, "a")
+    link.receiver.forget("a")
+    assert "a" not in link.receiver.receivers and "a" not in link.receiver.channels
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from services import wire
+from services.transport import Transport
+from services.wire import CAPABILITY, WireCodec, WireError, is_binary_frame, supports_binary
+
+ORIGIN = "0123456789abcdef"
+
+
+def codec():
+    return WireCodec(7, ORIGIN, 9002, 8001)
+
+
+def node_message(msg_type, **fields):
+    return {"type": msg_type, **fields, "from_node": 7, "origin": ORIGIN,
+            "udp_port": 9002, "web_port": 8001, "timestamp": "2024-01-01T00:00:00"}
+
+
+def test_known_type_round_trip():
+    frame = codec().encode(node_message("webrtc_signal", signal={"type": "offer", "sdp": "v=0"}))
+    assert is_binary_frame(frame)
+    message = wire.decode(frame)
+    assert message["type"] == "webrtc_signal"
+    assert message["signal"] == {"type": "offer", "sdp": "v=0"}
+    assert (message["from_node"], message["origin"], message["udp_port"], message["web_port"]) == (7, ORIGIN, 9002, 8001)
+    assert message["seq"] == 1
+
+
+def test_unknown_type_travels_in_payload():
+    message = wire.decode(codec().encode(node_message("announce", every=2.0)))
+    assert message["type"] == "announce"
+    assert message["every"] == 2.0
+
+
+def test_large_payload_is_compressed():
+    c = codec()
+    frame = c.encode(node_message("chat", message="hello " * 200))
+    assert frame[4] & wire.FLAG_COMPRESSED  # magic(2) version(1) type(1) flags(1)
+    assert len(frame) < 600
+    assert wire.decode(frame)["message"] == "hello " * 200
+
+
+def test_sequence_numbers_advance():
+    c = codec()
+    seqs = [wire.decode(c.encode(node_message("heartbeat")))["seq"] for _ in range(3)]
+    assert seqs == [1, 2, 3]
+
+
+@pytest.mark.parametrize("frame", [
+    b"M5",
+    wire.MAGIC + bytes([wire.VERSION + 1]) + bytes(wire.HEADER.size),
+])
+def test_bad_frames_raise(frame):
+    with pytest.raises(WireError):
+        wire.decode(frame)
+
+
+def test_decompression_is_bounded():
+    frame = codec().encode(node_message("chat", message="x" * 5000))
+    with pytest.raises(WireError):
+        wire.decode(frame, max_payload=1000)
+
+
+def test_legacy_text_is_not_a_frame():
+    assert not is_binary_frame(b"M5 hello")
+    assert not is_binary_frame(b"M5" + b"y" * 60)
+
+
+def test_caps_fallback():
+    assert supports_binary({"caps": [CAPABILITY, "frag1"]})
+    assert not supports_binary({"caps": ["frag1"]})
+    assert not supports_binary({})
+    assert not supports_binary(None)
+
+
+def test_json_and_binary_decode_alike():
+    transport = Transport(0, lambda event: None)
+    message = node_message("chat", message="hi")
+    binary = transport.decode(codec().encode(message), ("10.0.0.2", 9002)).message
+    text = transport.decode(json.dumps(message).encode(), ("10.0.0.2", 9002)).message
+    for key in ("type", "message", "from_node", "origin", "udp_port", "web_port"):
+        assert binary[key] == text[key]